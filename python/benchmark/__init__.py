@@ -0,0 +1,5 @@
+""" Benchmarks of multi-secret sharing algorithms.
+
+    Run from the python/ directory:
+        python3 -m benchmark --output results.json
+"""
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+""" Run split and combine of all schemes over a grid of problem sizes
+    and report per-phase timings as JSON. """
+
+import argparse
+import itertools
+import json
+import platform
+import sys
+import time
+
+from benchmark.schemes import SCHEMES, PHASES, skip_reason
+import multisecret.primeRegistry as primeregistry
+from multisecret.accessPlan import compile_access_structures
+
+PRIMES = {
+    # large prime from NIST P-256 elliptic curve
+    'p256': primeregistry.P256,
+    'p15487469': 15487469,
+}
+
+
+def make_secrets(secret_count):
+    """ small distinct secrets, valid in every benchmarked field """
+    return [7 + 13 * i for i in range(secret_count)]
+
+
+def make_access_structures(n_participants, secret_count, group_size):
+    """ one access group per secret, groups rotate over participants """
+    access_structures = []
+    for i in range(secret_count):
+        group = sorted((i + j) % n_participants + 1 for j in range(group_size))
+        access_structures.append([group])
+    return access_structures
+
+
+def run_configuration(scheme, prime_name, n_participants, secret_count,
+                      group_size, repeat):
+    prime = PRIMES[prime_name]
+    result = {'scheme': scheme,
+              'prime': prime_name,
+              'prime_bits': prime.bit_length(),
+              'participants': n_participants,
+              'secrets': secret_count,
+              'group_size': group_size}
+
+    reason = skip_reason(scheme, prime)
+    if reason:
+        result['skipped'] = reason
+        return result
+
+    secrets = make_secrets(secret_count)
+    # compiled once, reused by dealers of all repeats
+    access_structures = compile_access_structures(
+        make_access_structures(n_participants, secret_count, group_size))
+    # best of repeats for each phase
+    best = {}
+    for _ in range(repeat):
+        phases = SCHEMES[scheme](prime, n_participants, secrets,
+                                 access_structures)
+        for phase in PHASES:
+            best[phase] = min(best.get(phase, phases[phase]), phases[phase])
+
+    result['phases'] = best
+    result['split'] = sum(best[phase] for phase in PHASES if phase != 'combine')
+    return result
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python3 -m benchmark',
+                                     description=__doc__)
+    parser.add_argument('--schemes', nargs='+', default=list(SCHEMES),
+                        choices=list(SCHEMES))
+    parser.add_argument('--primes', nargs='+', default=list(PRIMES),
+                        choices=list(PRIMES))
+    parser.add_argument('--participants', nargs='+', type=int,
+                        default=[4, 8, 32])
+    parser.add_argument('--secrets', nargs='+', type=int, default=[1, 6, 24])
+    parser.add_argument('--group-sizes', nargs='+', type=int,
+                        default=[2, 4, 8, 32],
+                        help='sizes larger than participant count are skipped')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help='JSON file, stdout by default')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    results = []
+    grid = itertools.product(args.schemes, args.primes, args.participants,
+                             args.secrets, args.group_sizes)
+    for scheme, prime_name, n_participants, secret_count, group_size in grid:
+        if group_size < 2 or group_size > n_participants:
+            continue
+        results.append(run_configuration(scheme, prime_name, n_participants,
+                                         secret_count, group_size,
+                                         args.repeat))
+
+    report = {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime()),
+              'python': platform.python_version(),
+              'platform': platform.platform(),
+              'results': results}
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+# Per-phase timing of split and combine for all implemented schemes
+
+import timeit
+
+import multisecret.MultiSecretRoyAdhikari as RA
+import multisecret.MultiSecretLinYeh as LY
+import multisecret.MultiSecretHerranzRuizSaez as HRS
+import multisecret.MultiSecretCommon as common
+
+# Phases reported for every scheme. In Herranz-Ruiz-Saez there are no pseudo
+# shares, 'pseudo_shares' measures encryption of secrets and 'public_shares'
+# measures Shamir shares of encryption keys.
+PHASES = ('ids', 'coefficients', 'pseudo_shares', 'public_shares', 'combine')
+
+
+class Timer:
+    """ collects durations of consecutive phases """
+
+    def __init__(self):
+        self.phases = {}
+
+    def measure(self, phase, function, *args):
+        start = timeit.default_timer()
+        result = function(*args)
+        self.phases[phase] = timeit.default_timer() - start
+        return result
+
+
+def _combine_all_with_first_group(dealer, timer, secrets):
+    def combine():
+        for i_secret in range(dealer.k):
+            combined = dealer.combine_secret(i_secret, 0,
+                                             dealer.pseudo_shares[i_secret][0])
+            assert combined == secrets[i_secret]
+
+    timer.measure('combine', combine)
+
+
+def run_roy_adhikari(prime, n_participants, secrets, access_structures):
+    timer = Timer()
+    dealer = RA.Dealer(prime, n_participants, secrets, access_structures)
+
+    def ids():
+        dealer.random_id = common.provide_id(dealer.n, dealer.hash_len, dealer.p)
+        dealer.master_shares_x = dealer.choose_distinct_master_shares_x()
+
+    timer.measure('ids', ids)
+    timer.measure('coefficients', dealer.access_group_polynomial_coeffs)
+    timer.measure('pseudo_shares', dealer.compute_all_pseudo_shares)
+    timer.measure('public_shares', dealer.compute_all_public_shares_M)
+    _combine_all_with_first_group(dealer, timer, secrets)
+    return timer.phases
+
+
+def run_lin_yeh(prime, n_participants, secrets, access_structures):
+    timer = Timer()
+    dealer = LY.Dealer(prime, n_participants, secrets, access_structures)
+
+    def ids():
+        dealer.random_id = common.provide_id(dealer.n, dealer.hash_len, dealer.p)
+        dealer.master_shares_x = common.list_of_random_in_modulo_p(
+            dealer.n, dealer.hash_len, dealer.p)
+
+    timer.measure('ids', ids)
+    timer.measure('coefficients', dealer.access_group_polynomial_coeffs)
+    timer.measure('pseudo_shares', dealer.compute_all_pseudo_shares)
+    timer.measure('public_shares', dealer.compute_all_public_shares_M)
+    _combine_all_with_first_group(dealer, timer, secrets)
+    return timer.phases
+
+
+def run_herranz_ruiz_saez(prime, n_participants, secrets, access_structures):
+    timer = Timer()
+    dealer = HRS.Dealer(prime, n_participants, secrets, access_structures)
+
+    def ids():
+        dealer.random_id = common.provide_id(dealer.n, dealer.hash_len, dealer.p)
+
+    def coefficients():
+        dealer.cipher_generate_keys()
+        dealer.access_group_polynomial_coeffs()
+
+    timer.measure('ids', ids)
+    timer.measure('coefficients', coefficients)
+    timer.measure('pseudo_shares', dealer.cipher_encrypt_all_secrets)
+    timer.measure('public_shares', dealer.compute_all_key_shares)
+
+    def combine():
+        for i_secret in range(dealer.k):
+            combined = dealer.combine_secret(i_secret, 0, dealer.key_shares)
+            assert combined == secrets[i_secret]
+
+    timer.measure('combine', combine)
+    return timer.phases
+
+
+def skip_reason(scheme, prime):
+    """ returns why a configuration cannot run, or None """
+    if scheme == 'Herranz-Ruiz-Saez' and \
+            prime.bit_length() <= 8 * HRS.Dealer.AES_KEY_LEN:
+        return 'prime too small to share a %d-bit AES key' % (
+            8 * HRS.Dealer.AES_KEY_LEN)
+    return None
+
+
+SCHEMES = {
+    'Roy-Adhikari': run_roy_adhikari,
+    'Lin-Yeh': run_lin_yeh,
+    'Herranz-Ruiz-Saez': run_herranz_ruiz_saez,
+}
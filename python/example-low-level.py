@@ -37,9 +37,7 @@ def main():
     dealer.compute_all_public_shares_M()
     
     print('obtained shares', dealer.pseudo_shares[0][0])   
-    obtained_shares = []
-    for share in dealer.pseudo_shares[0][0]:
-        obtained_shares.append(int.from_bytes(share, byteorder='big'))
+    obtained_shares = list(dealer.pseudo_shares[0][0])
     
     print('obtained shares', obtained_shares) 
     combined_secret = dealer.combine_secret(0, 0, obtained_shares)
@@ -1,16 +1,19 @@
 #!/usr/bin/env python3
 
 import multisecret.MultiSecretRoyAdhikari
+import multisecret.primeGenerator as primegenerator
 
 if __name__ == "__main__":
     
     """ This example shows how to use high level secret splitting functionality """
     
-    prime = 15487469
-
     # multi secret sharing parameters
     secrets = [15002900, 313, 501]
     n_participants = 3
+
+    # the smallest secure prime field for these secrets and participants
+    prime = primegenerator.field_prime(
+        secrets, n_participants, minimum=primegenerator.SECURITY_MINIMUM)
     access_structures = [[[1,2,3]], [[1,2,3]], [[1,2,3]]]
 
     # initialize Roy-Adhikari secret sharing algorithm
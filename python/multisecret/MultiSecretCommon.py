@@ -1,16 +1,170 @@
 # Functions common for implemented multi-secret sharing algorithms
 # Filip Kubicz 2016-2017
 
+import hashlib
+import logging
+import os
+import threading
 from os import urandom
-from math import log2, floor
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import islice
 
-# import SHA256
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives import hashes
 # import AES-CTR
+from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 
 import multisecret.byteHelper as bytehelper
+from multisecret.accessPlan import compile_access_structures
+from multisecret.accessPlan import group_cost, group_members_needed
+from multisecret.accessPlan import group_threshold
+
+# number of access groups for which Lagrange coefficients are remembered
+LAGRANGE_CACHE_SIZE = 256
+
+# a master share exported alone is a whole user share, a smaller field
+# leaves it too little entropy
+MASTER_SHARE_MIN_BITS = 128
+
+
+def check_master_share_field(prime):
+    """ raise ValueError if master shares in Zp are too short to export """
+    if prime.bit_length() < MASTER_SHARE_MIN_BITS:
+        raise ValueError('Master shares of a %d-bit field are too short to '
+                         'export, at least %d bits are needed!'
+                         % (prime.bit_length(), MASTER_SHARE_MIN_BITS))
+
+# Debug output of all multisecret modules goes through this logger hierarchy.
+# It is silent unless enabled with set_debug_logging() or by the application.
+logger = logging.getLogger(__name__)
+
+
+def set_debug_logging(enabled=True, handler=None):
+    """ Turn debug output of all Dealers on (to stderr by default) or off.
+        Silent mode is the default: no debug message is formatted then.
+        Enabling it again does not add another handler.
+    """
+    package_logger = logging.getLogger('multisecret')
+    if enabled:
+        if handler is None:
+            handlers = [old_handler for old_handler in package_logger.handlers
+                        if not isinstance(old_handler, logging.NullHandler)]
+            handler = handlers[0] if handlers else logging.StreamHandler()
+        if handler not in package_logger.handlers:
+            package_logger.addHandler(handler)
+        package_logger.setLevel(logging.DEBUG)
+    else:
+        package_logger.setLevel(logging.NOTSET)
+        for old_handler in list(package_logger.handlers):
+            if not isinstance(old_handler, logging.NullHandler):
+                package_logger.removeHandler(old_handler)
+
+
+# random bytes are read from the OS (or from DRBG) in blocks of this size
+RANDOM_POOL_SIZE = 64 * 1024
+
+
+class RandomSource:
+    """ Buffered source of random bytes and uniform elements of Zp.
+
+        Bytes are taken from os.urandom() in large blocks, or, in test mode
+        with a seed, from AES-CTR keyed with SHA256 of the seed, so all
+        splits are repeatable. Elements of Zp are drawn by rejection
+        sampling, so they are not biased toward small residues.
+        The pool is locked, so threads never get the same bytes.
+    """
+
+    def __init__(self, seed=None, pool_size=RANDOM_POOL_SIZE):
+        self.pool_size = pool_size
+        self.seeded = seed is not None
+        self._pool = b''
+        self._offset = 0
+        self._lock = threading.Lock()
+        if self.seeded:
+            if isinstance(seed, int):
+                seed = seed.to_bytes(bytehelper.bytelen(seed), byteorder='big')
+            key = hashlib.sha256(seed).digest()
+            self._drbg = Cipher(algorithms.AES(key), modes.CTR(bytes(16)),
+                                backend=default_backend()).encryptor()
+
+    def _generate(self, size):
+        if self.seeded:
+            return self._drbg.update(bytes(size))
+        return urandom(size)
+
+    def read(self, size):
+        """ size random bytes """
+        with self._lock:
+            if size > len(self._pool) - self._offset:
+                self._pool = (self._pool[self._offset:]
+                              + self._generate(max(self.pool_size, size)))
+                self._offset = 0
+            data = self._pool[self._offset:self._offset + size]
+            self._offset += size
+            return data
+
+    def field_elements(self, prime, minimum=0):
+        """ endless generator of uniform random ints in [minimum, prime) """
+        bits = (prime - 1).bit_length()
+        size = (bits + 7) // 8
+        mask = (1 << bits) - 1
+        read = self.read
+        while True:
+            # at least half of the candidates is accepted
+            candidate = int.from_bytes(read(size), byteorder='big') & mask
+            if minimum <= candidate < prime:
+                yield candidate
+
+    def list_of_field_elements(self, prime, count, distinct=False, minimum=0):
+        """ count random elements of Zp, optionally all different """
+        if not distinct:
+            return list(islice(self.field_elements(prime, minimum), count))
+        if count > prime - minimum:
+            raise ValueError('Field too small for %d distinct elements' % count)
+        elements = []
+        seen = set()
+        for element in self.field_elements(prime, minimum):
+            if len(elements) == count:
+                break
+            if element not in seen:
+                seen.add(element)
+                elements.append(element)
+        return elements
+
+
+_random_source = RandomSource()
+
+
+def random_source():
+    """ random source shared by all Dealers """
+    return _random_source
+
+
+def set_random_seed(seed=None):
+    """ Test mode: with a seed all random values come from a deterministic
+        generator. With None random values come from the OS again. """
+    global _random_source
+    _random_source = RandomSource(seed)
+
+
+def _reset_random_source_in_child():
+    # a forked process (e.g. a split worker) must not reuse buffered bytes
+    # of its parent. Split workers in test mode are seeded again
+    # by parallel_split_secrets().
+    global _random_source
+    _random_source = RandomSource()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_random_source_in_child)
+
+
+def random_field_elements(prime, count=None):
+    """ stream of uniform random elements of Zp, endless if count is None """
+    elements = _random_source.field_elements(prime)
+    if count is None:
+        return elements
+    return islice(elements, count)
 
 
 # --- common functions, extracted from class Dealer ---
@@ -18,7 +172,6 @@ def user_count_from_access_structure(access_structure):
     """ Returns maximal user number found in access structure,
         which does not have to be equal to a total number of users.
         The users over this returned number are irrelevant during reconstruction.
-        TODO: reconstruct for subsets of shares to solve the problem
     """
     max_user_count = 0
     for secret in access_structure:
@@ -36,98 +189,446 @@ def hash(message, hash_len, aes_nonce):
         at "cryptography" library - but to bytes, not bits resolution - unsuitable)
     - option 3 (chosen, implemented here): use the first [log2(p)]+1 bits
                 of AES-CTR(SHA256(m))"""
+    return hash_many([message], hash_len, aes_nonce)[0]
 
-    # SHA256 of message
-    digest = hashes.Hash(hashes.SHA256(), backend=default_backend())
-    digest.update(message)
-    hashed_message = digest.finalize()
 
-    # AES-CTR of the hash
-    aes_key = hashed_message
-    cipher = Cipher(algorithms.AES(aes_key), modes.CTR(aes_nonce), backend=default_backend())
-    encryptor = cipher.encryptor()
-    input = b'wwwwwwwwwwwwwwwwwwwwwwwwwwwwwwww'
-    #print(input.hex())
-    ciphertext = encryptor.update(input) + encryptor.finalize()
+def hash_many(messages, hash_len, aes_nonce):
+    """ Bulk version of hash(): returns a list of digests of all messages,
+        bit-identical to calling hash() for each message with the same nonce.
+        The backend, CTR mode and AES input block are set up once,
+        SHA256 is computed with hashlib.
+    """
+    backend = default_backend()
+    ctr_mode = modes.CTR(aes_nonce)
+    # AES-CTR input, at least 256 bits (more only for hash_len > 256)
+    input = b'w' * max(32, (hash_len + 7) // 8)
+
+    digests = []
+    for message in messages:
+        # AES-CTR of SHA256 of the message
+        aes_key = hashlib.sha256(message).digest()
+        encryptor = Cipher(algorithms.AES(aes_key), ctr_mode,
+                           backend=backend).encryptor()
+        ciphertext = encryptor.update(input) + encryptor.finalize()
 
-    # take demanded numer of bits
-    varlen_hash = bytehelper.take_first_bits(ciphertext, hash_len)
-    #print('Hash is ', varlen_hash.hex())
-    return varlen_hash
+        # take demanded numer of bits
+        digests.append(bytehelper.take_first_bits(ciphertext, hash_len))
+    return digests
 
 
 def modulo_p(prime, number):
     """ modulo which works for:
     - int type
-    - bytes type
+    - bytes type (result is bytes of element_width(p), like all
+      field elements serialized)
     """
-    return_bytes = False
-
     # if input is bytes, convert it to int, but return bytes object
-    if (isinstance(number, bytes)):
-        return_bytes = True
-        number = int.from_bytes(number, byteorder='big')
+    if isinstance(number, bytes):
+        return bytehelper.element_to_bytes(
+            bytehelper.to_int(number) % prime, bytehelper.element_width(prime))
 
-    if (number >= prime or number < 0):
-        number = number % prime
-
-    if (return_bytes):
-        if number == 0:
-            byte_len = 1
-        else:
-            bit_len = floor(log2(number)) + 1
-            byte_len = bit_len // 8 + 1
-        # print('bit_len, byte_len', bit_len, byte_len)
-        modulo_number = number.to_bytes(byte_len, byteorder='big')
-    else:
-        modulo_number = number
-
-    return modulo_number
+    return number % prime
 
 
 def list_of_random_in_modulo_p(listlen, bytelen, prime):
-    """helper function returning list of random numbers less than p prime"""
-    randoms = []
-    bytelen_of_randoms_generated = bytelen  # TODO: write bytelenOfInt() method in byteHelper
-
-    for i in range(listlen):
-        generated = urandom(bytelen_of_randoms_generated)
-        randoms.append(modulo_p(prime, generated))
-
-    return randoms  # TODO: yield generator for bigger problem sizes
+    """helper function returning list of uniform random ints less than p prime,
+       bytelen is not used anymore - just enough bytes for p are drawn"""
+    return _random_source.list_of_field_elements(prime, listlen)
 
 
 def print_list_of_hex(list_to_print, description):
-    """helper to print list of bytes objects with string description"""
-    for i in range(len(list_to_print)):
-        print('%s%d = %s' % (description, i, list_to_print[i].hex()))
+    """helper to log list of ints or bytes objects with string description,
+       does nothing unless debug logging is enabled"""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    for i, value in enumerate(list_to_print):
+        if isinstance(value, int):
+            value = format(value, 'x')
+        else:
+            value = value.hex()
+        logger.debug('%s%d = %s', description, i, value)
 
 
 def provide_id(participants_num, hash_len, prime):
-    """for each participant provide ID in p modulo field"""
-    random_id = list_of_random_in_modulo_p(participants_num,
-                                                  hash_len,
-                                                  prime)
+    """for each participant provide distinct, nonzero ID in p modulo field"""
+    random_id = _random_source.list_of_field_elements(prime, participants_num,
+                                                      distinct=True, minimum=1)
     print_list_of_hex(random_id, 'Participant ID ')
     return random_id
 
 
+def participant_share_index(access_structures):
+    """ Inverted access structure: {participant: [(i, q, b), ...]}
+        with positions of all shares of each participant.
+        Built in a single pass over all group members. """
+    index = {}
+    for i, gamma in enumerate(access_structures):
+        for q, A in enumerate(gamma):
+            for b, Pb in enumerate(A):
+                index.setdefault(Pb, []).append((i, q, b))
+    return index
+
+
+def share_for_group(user_shares, secret, group):
+    """ Get share from a {(secret, group): share} dictionary of a user.
+        Keys written as '(secret, group)' strings by older JSON files
+        are accepted too. """
+    try:
+        return user_shares[(secret, group)]
+    except KeyError:
+        return user_shares['({}, {})'.format(secret, group)]
+
+
+def _coeffs_to_int(coeffs):
+    return [bytehelper.to_int(coeff) for coeff in coeffs]
+
+
 def shamir_polynomial_compute(argument, coeffs, secret_value, prime):
     """ compute f_q(x) for q-th access group in access structure """
+    return shamir_polynomial_compute_many([argument], coeffs, secret_value,
+                                          prime)[0]
+
+
+def id_powers(power_table, argument, degree, prime):
+    """ [x, x^2, ... x^degree] mod p for ID x, taken from power_table
+        {x: powers} and extended there if needed. A table shared by all
+        groups and secrets computes powers of each ID only once. """
+    powers = power_table.setdefault(argument, [])
+    power = powers[-1] if powers else 1
+    while len(powers) < degree:
+        power = (power * argument) % prime
+        powers.append(power)
+    return powers
+
+
+def shamir_polynomial_compute_many(arguments, coeffs, secret_value, prime,
+                                   power_table=None):
+    """ compute f_q(x) = s + d0*x + d1*x^2 + ... for all arguments
+        (IDs of group members) in one call, coefficients are decoded
+        only once for the whole group. The polynomial is a dot product
+        with powers of x, reduced mod p once. Powers are taken from
+        power_table {x: [x, x^2, ...]} shared by all groups if given. """
+    int_coeffs = _coeffs_to_int(coeffs)
+    if power_table is None:
+        power_table = {}
+
+    values = []
+    for argument in arguments:
+        argument = bytehelper.to_int(argument) % prime
+        powers = id_powers(power_table, argument, len(int_coeffs), prime)
+        poly_value = secret_value
+        for coeff, power in zip(int_coeffs, powers):
+            poly_value += coeff * power
+        values.append(poly_value % prime)
+    return values
+
+
+def batch_inverse_modulo_p(values, prime):
+    """ Montgomery's batch inversion: invert all values in Zp using
+        a single modular inversion and 3(n-1) multiplications.
+        Raises ValueError if any value is 0 modulo p.
+    """
+    values = [value % prime for value in values]
+
+    # prefix[j] = values[0] * ... * values[j-1]
+    prefix_products = []
+    accumulated = 1
+    for value in values:
+        if value == 0:
+            raise ValueError('0 has no multiplicative inverse modulo p')
+        prefix_products.append(accumulated)
+        accumulated = (accumulated * value) % prime
+
+    accumulated_inverse = bytehelper.inverse_modulo_p(accumulated, prime)
 
-    poly_value = 0
-    if isinstance(argument, bytes):
-        argument = int.from_bytes(argument, byteorder='big')
+    # walk back, peeling off one value at a time
+    inverses = [0] * len(values)
+    for j in range(len(values) - 1, -1, -1):
+        inverses[j] = (accumulated_inverse * prefix_products[j]) % prime
+        accumulated_inverse = (accumulated_inverse * values[j]) % prime
 
-    for degree, coeff in enumerate(coeffs):
-        if isinstance(coeff, bytes):
-            coeff = int.from_bytes(coeff, byteorder='big')
+    return inverses
 
-        print('+ %d * %d^%d' % (coeff, argument, degree + 1))
-        poly_value += coeff * argument ** (degree + 1)
 
-    poly_value += secret_value
-    print('+ secret ({})'.format(secret_value))
-    poly_value = modulo_p(prime, poly_value)
-    # print('poly_value', poly_value)
-    return poly_value
+def lagrange_coefficients_at_zero(ids, prime):
+    """ Lagrange basis polynomials of a group evaluated at x = 0:
+        c_b = prod_{r != b} ID_r / (ID_r - ID_b)
+
+        All denominators are inverted at once with batch_inverse_modulo_p(),
+        so the cost is O(m^2) multiplications and a single inversion.
+        Raises ValueError if two IDs are equal modulo p.
+    """
+    ids = [participant_id % prime for participant_id in ids]
+    m = len(ids)
+
+    # numerator of c_b is a product of all IDs except ID_b,
+    # use prefix and suffix products to avoid division
+    suffix_products = [1] * (m + 1)
+    for j in range(m - 1, -1, -1):
+        suffix_products[j] = (suffix_products[j + 1] * ids[j]) % prime
+
+    numerators = []
+    denominators = []
+    prefix_product = 1
+    for b, id_b in enumerate(ids):
+        numerators.append((prefix_product * suffix_products[b + 1]) % prime)
+        prefix_product = (prefix_product * id_b) % prime
+
+        denominator = 1
+        for r, id_r in enumerate(ids):
+            if r != b:
+                denominator = (denominator * (id_r - id_b)) % prime
+        denominators.append(denominator)
+
+    try:
+        den_inverses = batch_inverse_modulo_p(denominators, prime)
+    except ValueError:
+        raise ValueError('Participant IDs in a group must be distinct!')
+
+    return [(numerator * den_inverse) % prime
+            for numerator, den_inverse in zip(numerators, den_inverses)]
+
+
+@lru_cache(maxsize=LAGRANGE_CACHE_SIZE)
+def _lagrange_coefficients_cached(prime, ids):
+    return tuple(lagrange_coefficients_at_zero(ids, prime))
+
+
+def cached_lagrange_coefficients(ids, prime):
+    """ Lagrange coefficients at 0 for a group, remembered across calls
+        in a bounded LRU cache keyed by (prime, ordered tuple of IDs).
+        Repeated combines with the same group cost only a dot product.
+    """
+    return _lagrange_coefficients_cached(prime, tuple(ids))
+
+
+def lagrange_cache_info():
+    """ hits, misses, maxsize and currsize of the Lagrange coefficient cache """
+    return _lagrange_coefficients_cached.cache_info()
+
+
+def lagrange_cache_clear():
+    """ forget all cached Lagrange coefficients and reset the counters """
+    _lagrange_coefficients_cached.cache_clear()
+
+
+def lagrange_interpolate_at_zero(values, coefficients, prime):
+    """ combine polynomial values with Lagrange coefficients,
+        returns f(0) as int """
+    combine_sum = 0
+    for value, coefficient in zip(values, coefficients):
+        combine_sum += value * coefficient
+    return combine_sum % prime
+
+
+class LagrangeCoefficientTable:
+    """ Lagrange coefficients at 0 of groups, computed once for each
+        member set while many secrets are combined. IDs of participants
+        are decoded once too. table[group] gives coefficients of a group,
+        table.for_group(group, members) of members of any group.
+    """
+
+    def __init__(self, get_id_int, prime):
+        self.get_id_int = get_id_int
+        self.prime = prime
+        self.ids = {}
+        self.coefficients = {}
+
+    def participant_id(self, participant):
+        if participant not in self.ids:
+            self.ids[participant] = self.get_id_int(participant)
+        return self.ids[participant]
+
+    def __getitem__(self, group):
+        group = tuple(group)
+        if group not in self.coefficients:
+            self.coefficients[group] = lagrange_coefficients_at_zero(
+                [self.participant_id(Pb) for Pb in group], self.prime)
+        return self.coefficients[group]
+
+    def for_group(self, group, members):
+        """ coefficients of shares of members used to combine a group,
+            policy groups have their own """
+        if not hasattr(group, 'policy'):
+            return self[members]
+        key = (group, tuple(members))
+        if key not in self.coefficients:
+            self.coefficients[key] = group.reconstruction_coefficients(
+                members, self.prime)
+        return self.coefficients[key]
+
+
+def reconstruction_coefficients(group, members, get_id_int, prime):
+    """ coefficients c_b of shares B_b of members used to combine a group,
+        the secret is sum c_b * B_b. Lagrange coefficients at 0 for IDs
+        of members, or coefficients from the formula of a policy group. """
+    if hasattr(group, 'policy'):
+        return group.reconstruction_coefficients(members, prime)
+    return cached_lagrange_coefficients([get_id_int(Pb) for Pb in members],
+                                        prime)
+
+
+def group_share_values(group, ids, coeffs, secret_value, prime,
+                       power_table=None):
+    """ shares B of all members of a group: the group polynomial at IDs
+        of members, or leaf values of the formula of a policy group """
+    if hasattr(group, 'policy'):
+        return group.leaf_values(secret_value, coeffs, prime)
+    return shamir_polynomial_compute_many(ids, coeffs, secret_value, prime,
+                                          power_table)
+
+
+def group_accumulator(group, prime):
+    """ accumulator for shares of a group arriving one at a time """
+    if hasattr(group, 'policy'):
+        return group.accumulator(prime)
+    return LagrangeAccumulator(prime, len(group), group_threshold(group))
+
+
+def complete_groups(access_structures, obtained_shares):
+    """ {secret: group} with the cheapest group of each secret for which
+        enough shares were obtained (all, threshold of a ThresholdGroup,
+        or satisfying a policy). Missing shares in obtained_shares[i][q][b]
+        are None. Secrets without a complete group are left out. """
+    access_plan = compile_access_structures(access_structures)
+    plan = {}
+    for i, gamma in enumerate(access_plan):
+        complete = []
+        for q, A in enumerate(gamma):
+            present = access_plan.participants_mask(
+                Pb for Pb, share in zip(A, obtained_shares[i][q])
+                if share is not None)
+            if access_plan.is_qualified(i, q, present):
+                complete.append(q)
+        if complete:
+            plan[i] = min(complete, key=lambda q: group_cost(gamma[q]))
+    return plan
+
+
+def _members_with_shares(group, obtained_group_shares):
+    """ {Pb: (b, share)} of members who gave their shares """
+    return {Pb: (b, share)
+            for b, (Pb, share) in enumerate(zip(group, obtained_group_shares))
+            if share is not None}
+
+
+def select_shares(group, obtained_group_shares):
+    """ [(b, Pb, share)] of members of a group who gave their shares,
+        as many as needed: all members of a plain group, the first
+        threshold of them, or fewest satisfying a policy.
+        Missing shares are None. """
+    present = _members_with_shares(group, obtained_group_shares)
+    members = group_members_needed(group, present)
+    if members is None:
+        raise ValueError('%d shares obtained are not enough to combine %r'
+                         % (len(present), group))
+    return [(present[Pb][0], Pb, present[Pb][1]) for Pb in members]
+
+
+class LagrangeAccumulator:
+    """ Interpolation at 0 from points of a group arriving one at a time.
+
+        f(0) = X * sum_b y_b / (ID_b * D_b), where X is the product of all
+        IDs and D_b = prod_{r != b} (ID_r - ID_b). X and all D_b are updated
+        with O(k) multiplications when the k-th point arrives. Once the group
+        is complete, result() needs one batch inversion, O(m) in total.
+    """
+
+    def __init__(self, prime, group_size, threshold=None):
+        """ shares of any threshold members (all by default) of a group
+            complete it """
+        self.prime = prime
+        self.group_size = group_size
+        self.threshold = group_size if threshold is None else threshold
+        self.ids = {}
+        self.values = {}
+        self.denominators = {}
+        self.id_product = 1
+
+    def add(self, b, participant_id, value):
+        """ take value y_b = f(ID_b) of the b-th member of the group """
+        if not 0 <= b < self.group_size:
+            raise IndexError('member index out of range')
+        if b in self.ids:
+            raise ValueError('Share of member %d was already added' % b)
+        if self.complete:
+            raise ValueError('Group is complete, no more shares needed')
+
+        participant_id %= self.prime
+        denominator = 1
+        for r, id_r in self.ids.items():
+            difference = (participant_id - id_r) % self.prime
+            self.denominators[r] = (self.denominators[r] * difference) % self.prime
+            denominator = (denominator * -difference) % self.prime
+
+        self.ids[b] = participant_id
+        self.values[b] = value % self.prime
+        self.denominators[b] = denominator
+        self.id_product = (self.id_product * participant_id) % self.prime
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def complete(self):
+        return len(self.ids) == self.threshold
+
+    def result(self):
+        """ f(0) as int, raises ValueError if a share is missing
+            or IDs are not distinct """
+        if not self.complete:
+            raise ValueError('%d of %d shares obtained'
+                             % (len(self.ids), self.threshold))
+        members = sorted(self.ids)
+        try:
+            inverses = batch_inverse_modulo_p(
+                [self.ids[b] * self.denominators[b] for b in members],
+                self.prime)
+        except ValueError:
+            raise ValueError('Participant IDs in a group must be distinct!')
+
+        combine_sum = 0
+        for b, inverse in zip(members, inverses):
+            combine_sum += self.values[b] * inverse
+        return (self.id_product * combine_sum) % self.prime
+
+
+# Dealer copied once to every process of the parallel split pool
+_split_worker_dealer = None
+# seed of the parent in test mode, None otherwise
+_split_worker_seed = None
+
+
+def _init_split_worker(dealer, seed):
+    global _split_worker_dealer, _split_worker_seed
+    _split_worker_dealer = dealer
+    _split_worker_seed = seed
+
+
+def _split_secret_in_worker(i_secret):
+    if _split_worker_seed is not None:
+        # each secret gets its own seed, so the split does not depend
+        # on which worker takes which secret
+        set_random_seed(_split_worker_seed + i_secret.to_bytes(4, 'big'))
+    return _split_worker_dealer.split_single_secret(i_secret)
+
+
+def parallel_split_secrets(dealer, max_workers=None):
+    """ Run dealer.split_single_secret(i) for all secrets in a process pool.
+        Secrets are independent once participant IDs and master shares
+        are fixed, so the dealer is sent to each worker only once.
+        Returns results in the order of secrets.
+        In test mode (set_random_seed) workers draw from seeds derived
+        from the parent's generator, so the split is repeatable.
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    # a few chunks per worker to balance uneven access structures
+    chunksize = max(1, dealer.k // (4 * max_workers))
+    seed = _random_source.read(32) if _random_source.seeded else None
+
+    with ProcessPoolExecutor(max_workers=max_workers,
+                             initializer=_init_split_worker,
+                             initargs=(dealer, seed)) as executor:
+        return list(executor.map(_split_secret_in_worker, range(dealer.k),
+                                 chunksize=chunksize))
@@ -1,18 +1,21 @@
 # Prototype of Omega 1 Multi Secret Sharing Scheme by Herranz, Ruiz & Saez
 # Filip Kubicz 2017
 
-import os
-import math
-import copy
+import logging
 
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 from cryptography.hazmat.primitives import padding
 
 import multisecret.MultiSecretCommon as common
-from multisecret.primality import is_probable_prime
+from multisecret.accessLayout import ShareStore
+from multisecret.accessPlan import compile_access_structures
+from multisecret.accessPlan import group_coefficient_count
+from multisecret.primeRegistry import is_verified_prime
 import multisecret.byteHelper as bytehelper
 
+logger = logging.getLogger(__name__)
+
 
 class Dealer:
 
@@ -21,6 +24,8 @@ class Dealer:
     # All AES variants use 128 bit blocks and IV in CBC mode must have the same size as a block
     AES_BLOCK_SIZE = 16
     AES_IV_VALUE = bytes(AES_BLOCK_SIZE)
+    # Streamed secrets are read in chunks of this size (a multiple of a block)
+    STREAM_CHUNK_SIZE = 64 * 1024
 
     def __init__(self, p, n_participants, s_secrets, access_structures):
         """ In Omega 1 scheme symmetric encryption in used to protect
@@ -29,7 +34,7 @@ class Dealer:
         """
 
         # check sanity of p
-        if is_probable_prime(p) and p > n_participants and p > max(s_secrets):
+        if is_verified_prime(p) and p > n_participants and p > max(s_secrets):
             self.p = p
         else:
             raise ValueError('Wrong p selected!')
@@ -40,32 +45,34 @@ class Dealer:
             self.n = n_participants
         self.k = len(s_secrets)  # number of secrets
         self.s_secrets = s_secrets
-        if isinstance(access_structures[0], list):
-            for group in access_structures:
-                assert(len(group) == 1) # only one access group per secret (threshold scheme)
-                if len(group[0]) < 2:
-                    raise ValueError(
-                        'Less than 2 participants in one of the access groups!')
-            self.access_structures = access_structures
+        # validated once, a compiled plan is reused as is
+        self.plan = compile_access_structures(access_structures)
+        for group in self.plan:
+            assert(len(group) == 1) # only one access group per secret (threshold scheme)
+        self.access_structures = self.plan
         self.random_id = []
         self.d = []
+        self.participant_index = self.plan.participant_index
+        self.layout = self.plan.layout
+        # powers of participant IDs, shared by groups of all secrets
+        self.id_power_table = {}
 
-        self.hash_len = math.floor(math.log2(self.p)) + 1
+        self.hash_len = bytehelper.bitlen(self.p)
 
         # Setup for symmetric encryption scheme.
         # The initialization vector iv must be available to combiner.
         self.cipher_keys = []
         self.iv = Dealer.AES_IV_VALUE
 
-        print('Dealer created for Herranz-Ruiz-Saez sharing of %d secrets'
-              ' among %d participants' % (self.k, self.n))
-        print('Access structure:', self.access_structures)
+        logger.debug('Dealer created for Herranz-Ruiz-Saez sharing of %d secrets'
+                     ' among %d participants', self.k, self.n)
+        logger.debug('Access structure: %r', self.access_structures)
 
     def cipher_generate_keys(self):
         """ Generate a key K for each secret. The key will be used to
             encrypt all secrets. Key is later split among users. """
         for secret in range(self.k):
-            key = os.urandom(Dealer.AES_KEY_LEN)
+            key = common.random_source().read(Dealer.AES_KEY_LEN)
             self.cipher_keys.append(key)
 
     def cipher_encrypt(self, input, key):
@@ -81,18 +88,16 @@ class Dealer:
         # Perform padding if the input is not a multiple of a block
         padder = padding.PKCS7(Dealer.AES_BLOCK_SIZE*8).padder()
         padded_input = padder.update(input) + padder.finalize()
-        print(padded_input, len(padded_input))
-
         iv = Dealer.AES_IV_VALUE
 
         cipher = Cipher(algorithms.AES(key), modes.CBC(iv),
                         backend=default_backend())
         encryptor = cipher.encryptor()
         ciphertext = encryptor.update(padded_input) + encryptor.finalize()
-        print('Plaintext\t{}\n'
-              'Key\t\t{}\n'
-              'IV\t\t{}\n'
-              'Ciphertext:\t{}'.format(padded_input, key, iv, ciphertext))
+        logger.debug('Plaintext\t%r\n'
+                     'Key\t\t%r\n'
+                     'IV\t\t%r\n'
+                     'Ciphertext:\t%r', padded_input, key, iv, ciphertext)
         return ciphertext
 
     def cipher_decrypt(self, ciphertext, key):
@@ -102,7 +107,6 @@ class Dealer:
             key = int.to_bytes(key, Dealer.AES_KEY_LEN, byteorder='big')
 
         assert len(key) == Dealer.AES_KEY_LEN
-        print('--- key ---', key)
         iv = Dealer.AES_IV_VALUE
 
         cipher = Cipher(algorithms.AES(key), modes.CBC(iv),
@@ -110,19 +114,53 @@ class Dealer:
         decryptor = cipher.decryptor()
         plaintext_padded = decryptor.update(ciphertext) + decryptor.finalize()
 
-        print('Ciphertext\t\t{}\n'
-              'Key\t\t\t{}\n'
-              'IV\t\t\t{}\n'
-              'Plaintext padded:\t{}\n'.format(
-               ciphertext, key, iv, plaintext_padded))
+        logger.debug('Ciphertext\t\t%r\n'
+                     'Key\t\t\t%r\n'
+                     'IV\t\t\t%r\n'
+                     'Plaintext padded:\t%r',
+                     ciphertext, key, iv, plaintext_padded)
 
         # remove padding
         unpadder = padding.PKCS7(Dealer.AES_BLOCK_SIZE*8).unpadder()
         plaintext = unpadder.update(plaintext_padded) + unpadder.finalize()
 
-        print('Plaintext:\t\t{}'.format(plaintext))
+        logger.debug('Plaintext:\t\t%r', plaintext)
         return plaintext
 
+    def cipher_encrypt_stream(self, source, key, chunk_size=STREAM_CHUNK_SIZE):
+        """ Generator of ciphertext chunks of a secret read from a file object
+            or an iterable of bytes chunks. Memory use does not depend on
+            the secret size. The concatenated output is equal to
+            cipher_encrypt() of the whole secret. """
+        padder = padding.PKCS7(Dealer.AES_BLOCK_SIZE*8).padder()
+        cipher = Cipher(algorithms.AES(key), modes.CBC(Dealer.AES_IV_VALUE),
+                        backend=default_backend())
+        encryptor = cipher.encryptor()
+
+        for chunk in read_chunks(source, chunk_size):
+            ciphertext = encryptor.update(padder.update(chunk))
+            if ciphertext:
+                yield ciphertext
+
+        yield encryptor.update(padder.finalize()) + encryptor.finalize()
+
+    def cipher_decrypt_stream(self, source, key, chunk_size=STREAM_CHUNK_SIZE):
+        """ Generator of plaintext chunks, reverse of cipher_encrypt_stream() """
+        if isinstance(key, int):
+            key = int.to_bytes(key, Dealer.AES_KEY_LEN, byteorder='big')
+
+        unpadder = padding.PKCS7(Dealer.AES_BLOCK_SIZE*8).unpadder()
+        cipher = Cipher(algorithms.AES(key), modes.CBC(Dealer.AES_IV_VALUE),
+                        backend=default_backend())
+        decryptor = cipher.decryptor()
+
+        for chunk in read_chunks(source, chunk_size):
+            plaintext = unpadder.update(decryptor.update(chunk))
+            if plaintext:
+                yield plaintext
+
+        yield unpadder.update(decryptor.finalize()) + unpadder.finalize()
+
     def cipher_encrypt_all_secrets(self):
         assert self.k == len(self.s_secrets)
 
@@ -131,36 +169,61 @@ class Dealer:
             # compute c_j = Enc(s_j, K_j)
             encrypted_secret = self.cipher_encrypt(secret, self.cipher_keys[j])
             self.public_shares_M.append(encrypted_secret)
-            #print()
 
         return self.public_shares_M
 
     def compute_all_key_shares(self):
 
-        self.key_shares = copy.deepcopy(self.access_structures)
-        print(self.access_structures)
-
-        for i, gamma in enumerate(self.access_structures):
-            for q, A in enumerate(self.access_structures[i]):
-                for b, Pb in enumerate(self.access_structures[i][q]):
-
-                    print('secret_value (cipher_key)', self.cipher_keys[i])
-                    secret_value = int.from_bytes(self.cipher_keys[i],
-                                                  byteorder='big')
-                    self.key_shares[i][q][b] = \
-                        common.shamir_polynomial_compute(self.random_id[b],
-                                                     self.d[i][q],
-                                                     secret_value,
-                                                     self.p)
-                    print('Key share = {} for user {} (index {}) and secret {}'.format(
-                        self.key_shares[i][q][b], Pb, b, i))
+        logger.debug('access structures: %r', self.access_structures)
+        self.key_shares = self.new_share_store()
+        for i, _ in enumerate(self.access_structures):
+            self.key_shares_for_secret(i, self.cipher_keys[i], self.d[i],
+                                       self.key_shares)
 
         return self.key_shares
 
-    def split_secrets(self):
+    def key_shares_for_secret(self, i_secret, cipher_key, coeffs, store=None):
+        """ Shamir shares of a single encryption key for all groups
+            of the secret, written to store group by group, or returned
+            as [q][b] nested list """
+        debug = logger.isEnabledFor(logging.DEBUG)
+        secret_value = int.from_bytes(cipher_key, byteorder='big')
+
+        key_shares = []
+        for q, A in enumerate(self.access_structures[i_secret]):
+            # evaluate the polynomial at IDs of all group members at once,
+            # a policy group is shared down its formula instead
+            ids = [self.get_id_int(Pb) for Pb in A]
+            group = common.group_share_values(A, ids, coeffs[q], secret_value,
+                                              self.p, self.id_power_table)
+            if debug:
+                for b, Pb in enumerate(A):
+                    logger.debug('Key share = %d for user %d (index %d) and secret %d',
+                                 group[b], Pb, b, i_secret)
+            if store is None:
+                key_shares.append(group)
+            else:
+                store.set_group(i_secret, q, group)
+        return key_shares
+
+    def split_secrets(self, parallel=False, max_workers=None):
         """ High-level interface function.
             Use Shamir's scheme to share the keys used
-            to encrypt secrets. """
+            to encrypt secrets.
+            With parallel=True secrets are split independently in a pool
+            of max_workers processes (all CPUs by default). """
+
+        if parallel:
+            # ID for each participant
+            self.random_id = common.provide_id(self.n, self.hash_len, self.p)
+            self.id_power_table = {}
+
+            blocks = common.parallel_split_secrets(self, max_workers)
+            self.cipher_keys, self.d, self.public_shares_M, key_shares = \
+                [list(column) for column in zip(*blocks)]
+            self.key_shares = self.new_share_store(key_shares)
+            return self.key_shares
+
         self.cipher_generate_keys()
         assert self.cipher_keys
 
@@ -170,12 +233,45 @@ class Dealer:
 
         # ID for each participant
         self.random_id = common.provide_id(self.n, self.hash_len, self.p)
+        self.id_power_table = {}
 
         self.cipher_encrypt_all_secrets()
 
         return self.compute_all_key_shares()
         #self.get_user_key_share(1)
 
+    def split_secret_streams(self, sources, sinks,
+                             chunk_size=STREAM_CHUNK_SIZE):
+        """ Like split_secrets(), for secrets too large to be held in memory.
+            Secret i is read from sources[i] (a file object or an iterable
+            of bytes) and its ciphertext is written to sinks[i] (an object
+            with write() method) chunk by chunk. s_secrets passed to the
+            constructor are not used. Only the keys are Shamir-shared. """
+        assert len(sources) == len(sinks) == self.k
+
+        self.cipher_generate_keys()
+        self.access_group_polynomial_coeffs()
+        self.random_id = common.provide_id(self.n, self.hash_len, self.p)
+        self.id_power_table = {}
+
+        for j, (source, sink) in enumerate(zip(sources, sinks)):
+            for ciphertext in self.cipher_encrypt_stream(source,
+                                                         self.cipher_keys[j],
+                                                         chunk_size):
+                sink.write(ciphertext)
+
+        return self.compute_all_key_shares()
+
+    def split_single_secret(self, i_secret):
+        """ Key, polynomial coefficients, encrypted secret and key shares
+            of one secret. Participant IDs must be chosen before. """
+        cipher_key = common.random_source().read(Dealer.AES_KEY_LEN)
+        coeffs = self.polynomial_coeffs_for_secret(i_secret)
+        encrypted_secret = self.cipher_encrypt(self.s_secrets[i_secret],
+                                               cipher_key)
+        key_shares = self.key_shares_for_secret(i_secret, cipher_key, coeffs)
+        return cipher_key, coeffs, encrypted_secret, key_shares
+
     def get_user_key_share(self, user):
         assert self.key_shares
         assert user != 0
@@ -188,26 +284,37 @@ class Dealer:
 
         return user_shares
 
+    def access_layout(self):
+        """ Flat layout of access structures, compiled with the plan """
+        return self.layout
+
+    def new_share_store(self, secrets=(), as_bytes=False):
+        """ Store for a field element of each group member, optionally
+            filled with [q][b] nested values of each secret """
+        return ShareStore.from_secrets(self.access_layout(),
+                                       bytehelper.element_width(self.p),
+                                       secrets, as_bytes)
+
+    def share_positions(self, participant):
+        """ Positions (i, q, b) of all shares of a participant,
+            from the index compiled with the plan """
+        return self.participant_index.get(participant, ())
+
     def get_pseudo_shares_for_participant(self, participant):
         """
             Named for compatibility with other algorithms.
 
-            Scan for pseudo shares specific to a chosen participant.
+            Look up pseudo shares specific to a chosen participant.
             Returns a dictionary {(secret number, access group) : pseudo_share}
         """
 
         my_shares = {}
-        access_group = 0 # Herranz scheme does not use groups
 
         assert self.key_shares
         assert participant != 0
 
-        for i, gamma in enumerate(self.access_structures):
-            for q, A in enumerate(self.access_structures[i]):
-                for b, Pb in enumerate(self.access_structures[i][q]):
-                    if Pb == participant:
-
-                        my_shares[(i, access_group)] = self.key_shares[i][access_group][b]
+        for i, q, b in self.share_positions(participant):
+            my_shares[(i, q)] = self.key_shares[i][q][b]
 
         return my_shares
 
@@ -216,18 +323,18 @@ class Dealer:
             into right places in the dealer's pseudo_shares nested list.
             (Reverse of get_pseudo_shares_for_participant() )
         """
-
-        for i, _ in enumerate(self.access_structures):
-            for q, _ in enumerate(self.access_structures[i]):
-                for b, Pb in enumerate(self.access_structures[i][q]):
-                    if Pb == participant:
-                        self.key_shares[i][q][b] = my_pseudo_shares[
-                            '({}, {})'.format(i, q)]
-                        print('set_pseudo_shares_from_participant:\n'
-                              '\tsecret {}'
-                              '\tuser Pb {}'
-                              '\tuser index b = {}'
-                              '\tkey_share = {}'.format(i, Pb, b, self.key_shares[i][q][b]))
+        debug = logger.isEnabledFor(logging.DEBUG)
+
+        for i, q, b in self.share_positions(participant):
+            self.key_shares[i][q][b] = common.share_for_group(
+                my_pseudo_shares, i, q)
+            if debug:
+                logger.debug('set_pseudo_shares_from_participant:\n'
+                             '\tsecret %d'
+                             '\tuser Pb %d'
+                             '\tuser index b = %d'
+                             '\tkey_share = %r', i, participant, b,
+                             self.key_shares[i][q][b])
 
     def get_share_from_user_for_secret(self, key_shares, secret_index):
         return key_shares[secret_index]
@@ -243,67 +350,52 @@ class Dealer:
             note: d0 corresponds to x^1, d1 corresponds to x^2
         """
         for gindex, gamma in enumerate(self.access_structures):
-            print('gamma%d for secret s%d:' % (gindex, gindex))
-            coeffs_for_A = []
-            self.d.append([])
-
-            for index, A in enumerate(gamma):
-                coeffs_for_A = common.list_of_random_in_modulo_p(len(A) - 1,
-                                                                 self.hash_len,
-                                                                 self.p)
-                print('A%d: %r' % (index, A))
-                common.print_list_of_hex(coeffs_for_A, 'polynomial coeff d')
-
-                self.d[gindex].append(coeffs_for_A)
+            logger.debug('gamma%d for secret s%d:', gindex, gindex)
+            self.d.append(self.polynomial_coeffs_for_secret(gindex))
         return self.d
 
+    def polynomial_coeffs_for_secret(self, i_secret):
+        """ random coefficients d of polynomials for all access groups
+            of a single secret """
+        coeffs_for_gamma = []
+        for index, A in enumerate(self.access_structures[i_secret]):
+            coeffs_for_A = common.list_of_random_in_modulo_p(group_coefficient_count(A),
+                                                             self.hash_len,
+                                                             self.p)
+            logger.debug('A%d: %r', index, A)
+            common.print_list_of_hex(coeffs_for_A, 'polynomial coeff d')
+
+            coeffs_for_gamma.append(coeffs_for_A)
+        return coeffs_for_gamma
+
     def get_id_int(self, participant):
         """ returns ID as an integer, with indexing from 1 """
-        return int.from_bytes(self.random_id[participant-1], byteorder='big')
+        return bytehelper.to_int(self.random_id[participant-1])
 
 
     def combine_secret_key(self, i_secret, obtained_shares):
         """
         combine a single key in Herraz-Ruiz-Saez algorithm
         """
-        print('Obtained pseudo shares:', obtained_shares)
+        logger.debug('Obtained pseudo shares: %r', obtained_shares)
         q_group = 0
 
-        combine_sum = 0
-
-        print('combine_secret_key for access structure {}', self.access_structures)
-
-        for b, Pb in enumerate(self.access_structures[i_secret][q_group]):
+        logger.debug('combine_secret_key for access structure %r', self.access_structures)
 
-            print('\tcurrent user {} with index {} ='.format(Pb, b))
-            part_sum = obtained_shares[b] % self.p
+        group = self.access_structures[i_secret][q_group]
+        # all members, or threshold of them for a ThresholdGroup
+        selected = common.select_shares(group, obtained_shares)
+        key_shares = [bytehelper.to_int(share) % self.p
+                      for _, _, share in selected]
 
-            combine_product = 1
-            for r, Pr in enumerate(self.access_structures[i_secret][q_group]):
-                if r != b:
-                    print('\t\tr =', r)
-                    print('\t\tID_(b=%d) : %d, ID_(r=%d) : %d'
-                          %  (Pb, self.get_id_int(Pb), Pr, self.get_id_int(Pr)))
+        coefficients = common.reconstruction_coefficients(
+            group, [Pb for _, Pb, _ in selected], self.get_id_int, self.p)
+        logger.debug('\tLagrange coefficients: %r', coefficients)
 
-                    denominator = (self.get_id_int(Pr) - self.get_id_int(
-                        Pb)) % self.p
-                    den_inverse = bytehelper.inverse_modulo_p(denominator,
-                                                              self.p)
-                    print('\t\tdenominator = %d\n its inverse = %d'
-                          % (denominator, den_inverse))
+        combine_sum = common.lagrange_interpolate_at_zero(key_shares,
+                                                          coefficients, self.p)
 
-                    part_product = ((self.get_id_int(
-                        Pr)) % self.p * den_inverse) % self.p
-                    combine_product *= part_product
-
-                    print('\t\tpart_product', part_product)
-                    print('\t\tcombine_product', combine_product)
-
-            combine_sum += (part_sum * combine_product) % self.p
-            print('\tcomb prod=%d, part_sum_B=%d, combined_sum=%d'
-                  % (combine_product, part_sum, combine_sum))
-
-        print("Combined sum, s%d = %d" % (i_secret, combine_sum % self.p))
+        logger.debug('Combined sum, s%d = %d', i_secret, combine_sum)
 
         return common.modulo_p(self.p, combine_sum)
 
@@ -311,14 +403,77 @@ class Dealer:
         """ combine secret keys and use them to decipher secrets.
             High-level function. """
 
-        print('Obtained: {}'.format(obtained_pseudo_shares))
-        print('i_secret: {}'.format(i_secret))
+        logger.debug('Obtained: %r', obtained_pseudo_shares)
+        logger.debug('i_secret: %d', i_secret)
         secret_key = self.combine_secret_key(i_secret, obtained_pseudo_shares[i_secret][q_group])
-        secret_key = secret_key.to_bytes(bytehelper.bytelen(secret_key) , byteorder='big')
-        print('Secret key: {}'.format(secret_key))
-        assert len(secret_key) == Dealer.AES_KEY_LEN
+        return self.decrypt_secret(i_secret, secret_key)
+
+    def decrypt_secret(self, i_secret, secret_key):
+        """ decipher secret i with a combined key (int) """
+        # keys are random, a key may begin with zero bytes
+        secret_key = secret_key.to_bytes(Dealer.AES_KEY_LEN, byteorder='big')
+        logger.debug('Secret key: %r', secret_key)
 
         secret_bytes = self.cipher_decrypt(self.public_shares_M[i_secret],
                                               secret_key)
         secret = int.from_bytes(secret_bytes, byteorder='big')
         return secret
+
+    def combine_all_secrets(self, obtained_key_shares):
+        """ Combine keys and decipher every secret the obtained key shares
+            allow. Missing shares are None. IDs and Lagrange coefficients
+            of a member set are computed once for all secrets.
+            Returns a dictionary {secret number: secret}
+        """
+        coefficient_table = common.LagrangeCoefficientTable(self.get_id_int,
+                                                            self.p)
+        secrets = {}
+        for i, q in common.complete_groups(self.access_structures,
+                                           obtained_key_shares).items():
+            selected = common.select_shares(self.access_structures[i][q],
+                                            obtained_key_shares[i][q])
+            key_shares = [bytehelper.to_int(share) for _, _, share in selected]
+            members = [Pb for _, Pb, _ in selected]
+            secret_key = common.lagrange_interpolate_at_zero(
+                key_shares, coefficient_table.for_group(
+                    self.access_structures[i][q], members), self.p)
+            secrets[i] = self.decrypt_secret(i, secret_key)
+        return secrets
+
+    def new_accumulator(self, i_secret, q_group):
+        """ accumulator for key shares of group A_q of secret i arriving
+            one at a time """
+        group = self.access_structures[i_secret][q_group]
+        return common.group_accumulator(group, self.p)
+
+    def accumulate_share(self, accumulator, i_secret, q_group, participant,
+                         obtained_key_share):
+        """ add key share of a participant """
+        b = self.plan.member_index(i_secret, q_group, participant)
+        accumulator.add(b, self.get_id_int(participant),
+                        bytehelper.to_int(obtained_key_share))
+
+    def combine_accumulated(self, i_secret, accumulator):
+        """ secret deciphered with a key combined from an accumulator
+            holding shares of the whole group """
+        return self.decrypt_secret(i_secret, accumulator.result())
+
+    def combine_secret_stream(self, i_secret, q_group, obtained_pseudo_shares,
+                              source, sink, chunk_size=STREAM_CHUNK_SIZE):
+        """ combine a secret key and use it to decipher a streamed secret.
+            Ciphertext is read from source and the secret is written
+            to sink chunk by chunk. """
+        secret_key = self.combine_secret_key(
+            i_secret, obtained_pseudo_shares[i_secret][q_group])
+
+        for plaintext in self.cipher_decrypt_stream(source, secret_key,
+                                                    chunk_size):
+            sink.write(plaintext)
+
+
+def read_chunks(source, chunk_size):
+    """ yield bytes chunks from a file object (read in chunk_size pieces)
+        or from any iterable of bytes """
+    if hasattr(source, 'read'):
+        return iter(lambda: source.read(chunk_size), b'')
+    return iter(source)
@@ -1,14 +1,18 @@
 # Prototype of "Dynamic Multi Secret Sharing Scheme" by Lin & Yeh
 # Filip Kubicz 2016-2017
 
-import os
-import math
-import copy
+import logging
 
 import multisecret.MultiSecretCommon as common
-from multisecret.primality import is_probable_prime
+from multisecret.accessLayout import ShareStore
+from multisecret.accessPlan import compile_access_structures
+from multisecret.accessPlan import group_coefficient_count
+from multisecret.primeRegistry import is_verified_prime
 import multisecret.byteHelper as bytehelper
 
+logger = logging.getLogger(__name__)
+
+
 class Dealer:
 
     def __init__(self, p, n_participants, s_secrets, access_structures):
@@ -18,7 +22,7 @@ class Dealer:
         """
 
         # check sanity of p
-        if is_probable_prime(p) and p > n_participants and p > max(s_secrets):
+        if is_verified_prime(p) and p > n_participants and p > max(s_secrets):
             self.p = p
         else:
             raise ValueError('Wrong p selected!')
@@ -29,21 +33,22 @@ class Dealer:
             self.n = n_participants
         self.k = len(s_secrets)  # number of secrets
         self.s_secrets = s_secrets
-        if isinstance(access_structures[0], list):
-            for group in access_structures:
-                if len(group[0]) < 2:
-                    raise ValueError(
-                        'Less than 2 participants in one of the access groups!')
-            self.access_structures = access_structures
+        # validated once, a compiled plan is reused as is
+        self.plan = compile_access_structures(access_structures)
+        self.access_structures = self.plan
         self.random_id = []
-        self.hash_len = math.floor(math.log2(self.p)) + 1
-        self.hash_aes_nonce = os.urandom(16)
+        self.hash_len = bytehelper.bitlen(self.p)
+        self.hash_aes_nonce = common.random_source().read(16)
         self.d = []
+        self.participant_index = self.plan.participant_index
+        self.layout = self.plan.layout
+        # powers of participant IDs, shared by groups of all secrets
+        self.id_power_table = {}
 
-        print('hash_len:', self.hash_len)
-        print(
-            'Dealer created for Lin-Yeh sharing of %d secrets among %d participants' % (
-            self.k, self.n))
+        logger.debug('hash_len: %d', self.hash_len)
+        logger.debug(
+            'Dealer created for Lin-Yeh sharing of %d secrets among %d participants',
+            self.k, self.n)
 
     def access_group_polynomial_coeffs(self):
         """ for the qth qualified set of access group,
@@ -54,35 +59,39 @@ class Dealer:
             note: d0 corresponds to x^1, d1 corresponds to x^2
         """
         for gindex, gamma in enumerate(self.access_structures):
-            print('gamma%d for secret s%d:' % (gindex, gindex))
-            coeffs_for_A = []
-            self.d.append([])
+            logger.debug('gamma%d for secret s%d:', gindex, gindex)
+            self.d.append(self.polynomial_coeffs_for_secret(gindex))
+        return self.d
 
-            for index, A in enumerate(gamma):
-                coeffs_for_A = common.list_of_random_in_modulo_p(len(A) - 1,
-                                                                 self.hash_len,
-                                                                 self.p)
-                print('A%d: %r' % (index, A))
-                common.print_list_of_hex(coeffs_for_A, 'polynomial coeff d')
+    def polynomial_coeffs_for_secret(self, i_secret):
+        """ random coefficients d of polynomials for all access groups
+            of a single secret """
+        coeffs_for_gamma = []
+        for index, A in enumerate(self.access_structures[i_secret]):
+            coeffs_for_A = common.list_of_random_in_modulo_p(group_coefficient_count(A),
+                                                             self.hash_len,
+                                                             self.p)
+            logger.debug('A%d: %r', index, A)
+            common.print_list_of_hex(coeffs_for_A, 'polynomial coeff d')
 
-                self.d[gindex].append(coeffs_for_A)
-        return self.d
+            coeffs_for_gamma.append(coeffs_for_A)
+        return coeffs_for_gamma
 
     def get_id_int(self, participant):
         """ returns ID as an integer, with indexing from 1 """
-        return int.from_bytes(self.random_id[participant-1], byteorder='big')
+        return bytehelper.to_int(self.random_id[participant-1])
 
     def get_d_polynomial_coeffs(self, secret, group):
         return self.d[secret][group]
 
     def user_polynomial_value_B(self, i_secret, q_group, participant):
-        assert (participant in self.access_structures[i_secret][q_group])
+        assert (self.plan.is_member(i_secret, q_group, participant))
 
-        print('user_polynomial_value_B for secret %d, group A %d '.format(
-            i_secret, q_group))
+        logger.debug('user_polynomial_value_B for secret %d, group A %d',
+                     i_secret, q_group)
         participant_id = self.random_id[participant - 1]
-        print('B value for user %d with ID %d'.format(participant,
-                                                      participant_id))
+        logger.debug('B value for user %d with ID %r', participant,
+                     participant_id)
 
         coeffs = self.get_d_polynomial_coeffs(i_secret, q_group)
         secret_value = self.s_secrets[i_secret]
@@ -95,51 +104,56 @@ class Dealer:
         """ In Lin-Yeh algorithm, pseudo shares are created as follows:
             U = hash(master_share_x) XOR master_share_x
         """
-        self.pseudo_shares = copy.deepcopy(self.access_structures)
-        print(self.access_structures)
-
-        for i, gamma in enumerate(self.access_structures):
-            for q, A in enumerate(self.access_structures[i]):
-                for b, Pb in enumerate(self.access_structures[i][q]):
-                    print('[i=%d][q=%d], participant=%r' % (i, q, Pb))
-                    # it's important to call with Pb - Participant number, not b - index
-                    # e.g when A = (2,3) we should call function with 2 and 3, not 0 and 1
-                    # but we store in in a list under indexes [i][q][0], [i][q][1]
-                    self.pseudo_shares[i][q][b] = self.pseudo_share_participant(
-                        i, q, Pb)
-                    print('[i={}][q={}][b={}][Pb={}], pseudo_share={!r}'.format(
-                        i, q, b, Pb, self.pseudo_shares[i][q][b]))
+        logger.debug('access structures: %r', self.access_structures)
+        self.pseudo_shares = self.new_share_store()
+        for i, _ in enumerate(self.access_structures):
+            self.pseudo_shares_for_secret(i, self.pseudo_shares)
+
+    def pseudo_shares_for_secret(self, i_secret, store=None):
+        """ pseudo shares of all groups of a single secret, written to
+            store group by group, or returned as [q][b] nested list """
+        debug = logger.isEnabledFor(logging.DEBUG)
+        gamma = self.access_structures[i_secret]
+        pseudo_shares = []
+
+        for q, A in enumerate(gamma):
+            # it's important to call with Pb - Participant number, not b - index
+            # e.g when A = (2,3) we should call function with 2 and 3, not 0 and 1
+            # but we store in in a list under indexes [i][q][0], [i][q][1]
+            group = [self.pseudo_share_participant(i_secret, q, Pb)
+                     for Pb in A]
+            if debug:
+                for b, Pb in enumerate(A):
+                    logger.debug('[i=%d][q=%d][b=%d][Pb=%d], pseudo_share=%r',
+                                 i_secret, q, b, Pb, group[b])
+            if store is None:
+                pseudo_shares.append(group)
+            else:
+                store.set_group(i_secret, q, group)
+        return pseudo_shares
 
     def pseudo_share_participant(self, i_secret, q_group, participant):
         """ pseudo share generation for a single participant
             U = hash(master_share_x) XOR master_share_x
         """
-        print('Pseudo share computation for secret s%r, access group A%r,'
-              'participant P%r' % (i_secret, q_group, participant))
+        logger.debug('Pseudo share computation for secret s%r, access group A%r, '
+                     'participant P%r', i_secret, q_group, participant)
 
-        # convert master share to bytes
-        if isinstance(self.master_shares_x[participant - 1], bytes):
-            bytes_x = self.master_shares_x[participant - 1]
-            int_x = int.from_bytes(self.master_shares_x[participant - 1], byteorder='big')
-        else:
-            bytes_x = bytes([self.master_shares_x[participant - 1]])
-            int_x = self.master_shares_x[participant - 1]
+        # master share in canonical fixed-width form is hashed
+        int_x = bytehelper.to_int(self.master_shares_x[participant - 1])
+        bytes_x = bytehelper.element_to_bytes(int_x,
+                                              bytehelper.element_width(self.p))
 
         # hash the master share
         hash_of_master_share = common.hash(bytes_x, self.hash_len, self.hash_aes_nonce)
-        hash_of_master_share = common.modulo_p(self.p, hash_of_master_share)
-
-        hash_of_master_share_int = int.from_bytes(hash_of_master_share, byteorder='big')
+        hash_of_master_share_int = int.from_bytes(hash_of_master_share,
+                                                  byteorder='big') % self.p
 
         # XOR hashed value with master share
         int_pseudo_share = hash_of_master_share_int ^ int_x
 
-        print('XOR output =', int_pseudo_share)
-        int_pseudo_share = common.modulo_p(self.p, int_pseudo_share)
-        pseudo_share = int_pseudo_share.to_bytes(bytehelper.bytelen(int_pseudo_share), byteorder='big')
-
-        assert isinstance(pseudo_share, bytes)
-        return pseudo_share
+        logger.debug('XOR output = %d', int_pseudo_share)
+        return int_pseudo_share % self.p
 
     def public_user_share_M(self, i_secret, q_group, participant, B_value):
         """ In Lin-Yeh algorithm, public share M is created as follows:
@@ -147,58 +161,96 @@ class Dealer:
         """
         # assert(participant in self.access_structures[i_secret][q_group])
 
-        U_value = int.from_bytes(
-            self.pseudo_shares[i_secret][q_group][participant], byteorder='big')
+        U_value = bytehelper.to_int(
+            self.pseudo_shares[i_secret][q_group][participant])
         M_public_share = (B_value - U_value) % self.p
-        print('participant %d, U = %d, public M = %d' % (
-        participant, U_value, M_public_share))
+        logger.debug('participant %d, U = %d, public M = %d',
+                     participant, U_value, M_public_share)
         return M_public_share
 
     def compute_all_public_shares_M(self):
-        """ experimental, use nested lists instead of np.array """
+        """ public shares M and values B of all group members, stored flat
+            in the layout of access structures (no empty elements) """
 
-        # duplicate the structure of access_structure
-        self.public_shares_M = copy.deepcopy(self.access_structures)
-        self.B_values = copy.deepcopy(self.access_structures)
+        # flat stores in the layout of access structures
+        self.public_shares_M = self.new_share_store()
+        self.B_values = self.new_share_store()
 
         for i, _ in enumerate(self.access_structures):
-            for q, _ in enumerate(self.access_structures[i]):
-                for b, Pb in enumerate(self.access_structures[i][q]):
-                    print(
-                        'compute_all_public_shares_M, i=%d, q=%d, b=%d, user P%d' % (
-                        i, q, b, Pb))
+            # STORE, for testing store B too
+            self.public_shares_for_secret(i, self.d[i], self.pseudo_shares[i],
+                                          self.public_shares_M, self.B_values)
+
+    def public_shares_for_secret(self, i_secret, coeffs, pseudo_shares,
+                                 M_store=None, B_store=None):
+        """ public shares M = B - U of all groups of a single secret,
+            written to M_store and B_store group by group, or returned
+            as [q][b] nested lists of M and B values """
+        debug = logger.isEnabledFor(logging.DEBUG)
+        gamma = self.access_structures[i_secret]
+        public_shares = []
+        B_values = []
+
+        for q, A in enumerate(gamma):
+            # evaluate f_q at IDs of all group members at once,
+            # a policy group is shared down its formula instead
+            ids = [self.get_id_int(Pb) for Pb in A]
+            B_group = common.group_share_values(
+                A, ids, coeffs[q], self.s_secrets[i_secret], self.p,
+                self.id_power_table)
+
+            U_group = list(pseudo_shares[q])
+            M_group = [(B_value - U_value) % self.p
+                       for B_value, U_value in zip(B_group, U_group)]
+            if debug:
+                for b, Pb in enumerate(A):
+                    logger.debug(
+                        'public share for i=%d, q=%d, b=%d, user P%d: '
+                        'B = %d, U = %d, M = %d', i_secret, q, b, Pb,
+                        B_group[b], U_group[b], M_group[b])
+
+            if M_store is None:
+                public_shares.append(M_group)
+                B_values.append(B_group)
+            else:
+                M_store.set_group(i_secret, q, M_group)
+                B_store.set_group(i_secret, q, B_group)
+        return public_shares, B_values
 
-                    B_value = self.user_polynomial_value_B(i, q, Pb)
-                    print('B_P%d = %d' % (Pb, B_value))
-                    M = self.public_user_share_M(i, q, b, B_value)
+    def get_M_public_user_share(self, i_secret, q_group, participant):
 
-                    # for testing store B in a nested list
-                    self.B_values[i][q][b] = B_value
+        return self.public_shares_M[i_secret][q_group][participant]
 
-                    # STORE in a nested list
-                    self.public_shares_M[i][q][b] = M
+    def access_layout(self):
+        """ Flat layout of access structures, compiled with the plan """
+        return self.layout
 
-    def get_M_public_user_share(self, i_secret, q_group, participant):
+    def new_share_store(self, secrets=(), as_bytes=False):
+        """ Store for a field element of each group member, optionally
+            filled with [q][b] nested values of each secret """
+        return ShareStore.from_secrets(self.access_layout(),
+                                       bytehelper.element_width(self.p),
+                                       secrets, as_bytes)
 
-        return self.public_shares_M[i_secret][q_group][participant]
+    def share_positions(self, participant):
+        """ Positions (i, q, b) of all shares of a participant,
+            from the index compiled with the plan """
+        return self.participant_index.get(participant, ())
 
     def get_pseudo_shares_for_participant(self, participant):
-        """ Scan for pseudo shares specific to a chosen participant.
+        """ Look up pseudo shares specific to a chosen participant.
             Returns a dictionary {(secret number,group) : pseudo_share}
         """
+        debug = logger.isEnabledFor(logging.DEBUG)
         my_pseudo_shares = {}
 
-        for i, _ in enumerate(self.access_structures):
-            for q, _ in enumerate(self.access_structures[i]):
-                for b, Pb in enumerate(self.access_structures[i][q]):
-                    # if we found participant in the access structure,
-                    # copy his pseudo share to a dictionary with tuple key (secret, group)
-                    if Pb == participant:
-                        my_pseudo_shares[(i, q)] = self.pseudo_shares[i][q][b]
-                        print('Pb == participant ==', Pb)
-                        print('my_pseudo_shares[(i=%d,q=%d)]'
-                              '= self.pseudo_shares[%d][%d][b=%d]' % (
-                              i, q, i, q, b))
+        for i, q, b in self.share_positions(participant):
+            # copy his pseudo share to a dictionary with tuple key (secret, group)
+            my_pseudo_shares[(i, q)] = self.pseudo_shares[i][q][b]
+            if debug:
+                logger.debug('my_pseudo_shares[(i=%d,q=%d)]'
+                             '= self.pseudo_shares[%d][%d][b=%d]',
+                             i, q, i, q, b)
         return my_pseudo_shares
 
     def set_pseudo_shares_from_participant(self, participant, my_pseudo_shares):
@@ -207,76 +259,123 @@ class Dealer:
             (Reverse of get_pseudo_shares_for_participant() )
         """
 
-        for i, _ in enumerate(self.access_structures):
-            for q, _ in enumerate(self.access_structures[i]):
-                for b, Pb in enumerate(self.access_structures[i][q]):
-                    if Pb == participant:
-                        self.pseudo_shares[i][q][b] = my_pseudo_shares[
-                            '({}, {})'.format(i, q)]
+        for i, q, b in self.share_positions(participant):
+            self.pseudo_shares[i][q][b] = common.share_for_group(
+                my_pseudo_shares, i, q)
 
-    def split_secrets(self):
-        """ Split secret in one step with Lin-Yeh algorithm """
+    def split_secrets(self, parallel=False, max_workers=None):
+        """ Split secret in one step with Lin-Yeh algorithm.
+            With parallel=True secrets are split independently in a pool
+            of max_workers processes (all CPUs by default).
+        """
 
         self.random_id = common.provide_id(self.n, self.hash_len, self.p)
+
+        self.id_power_table = {}
         self.master_shares_x = common.list_of_random_in_modulo_p(self.n,
                                                                  self.hash_len,
                                                                  self.p)
-        self.access_group_polynomial_coeffs()
-        self.compute_all_pseudo_shares()
-        self.compute_all_public_shares_M()
+        if parallel:
+            blocks = common.parallel_split_secrets(self, max_workers)
+            self.d, pseudo_shares, public_shares, B_values = \
+                [list(column) for column in zip(*blocks)]
+            self.pseudo_shares = self.new_share_store(pseudo_shares)
+            self.public_shares_M = self.new_share_store(public_shares)
+            self.B_values = self.new_share_store(B_values)
+        else:
+            self.access_group_polynomial_coeffs()
+            self.compute_all_pseudo_shares()
+            self.compute_all_public_shares_M()
 
         return self.pseudo_shares
 
+    def split_single_secret(self, i_secret):
+        """ Coefficients, pseudo shares and public shares of one secret.
+            Participant IDs and master shares must be chosen before.
+        """
+        coeffs = self.polynomial_coeffs_for_secret(i_secret)
+        pseudo_shares = self.pseudo_shares_for_secret(i_secret)
+        public_shares, B_values = self.public_shares_for_secret(
+            i_secret, coeffs, pseudo_shares)
+        return coeffs, pseudo_shares, public_shares, B_values
+
     def combine_secret(self, i_secret, q_group, obtained_pseudo_shares):
         """
         combine a single secret in Lin-Yeh algorithm
         """
-        if isinstance(obtained_pseudo_shares[0], bytes):
-            obtained_shares_int = []
-            for obtained_share in obtained_pseudo_shares:
-                obtained_shares_int.append(
-                    int.from_bytes(obtained_share, byteorder='big'))
-            obtained_pseudo_shares = obtained_shares_int
-
-        print('Obtained pseudo shares:', obtained_pseudo_shares)
-
-        print('Access group:', self.access_structures[i_secret])
-        assert (q_group <= len(self.access_structures[i_secret]))
-
-        combine_sum = 0
-
-        for b, Pb in enumerate(self.access_structures[i_secret][q_group]):
-
-            print('\tb =', b)
-            part_sum_B = (obtained_pseudo_shares[b]
-                          + self.public_shares_M[i_secret][q_group][b]) % self.p
-            print('\tB = U+M, B = %d, M=%d'
-                  % (part_sum_B, self.public_shares_M[i_secret][q_group][b]))
-
-            combine_product = 1
-            for r, Pr in enumerate(self.access_structures[i_secret][q_group]):
-                if r != b:
-                    print('\t\tr =', r)
-                    print('\t\tID_(b=%d) : %d, ID_(r=%d) : %d'
-                          % (Pb, self.get_id_int(Pb), Pr, self.get_id_int(Pr)))
-                    denominator = (self.get_id_int(Pr) - self.get_id_int(
-                        Pb)) % self.p
-                    den_inverse = bytehelper.inverse_modulo_p(denominator,
-                                                              self.p)
-                    print('\t\tdenominator = %d\n its inverse = %d'
-                          % (denominator, den_inverse))
-                    part_product = ((self.get_id_int(
-                        Pr)) % self.p * den_inverse) % self.p
-
-                    combine_product *= part_product
-                    print('\t\tpart_product', part_product)
-                    print('\t\tcombine_product', combine_product)
-
-            combine_sum += (part_sum_B * combine_product) % self.p
-            print('\tcomb prod=%d, part_sum_B=%d, combined_sum=%d'
-                  % (combine_product, part_sum_B, combine_sum))
-
-        print("Combined sum, s%d = %d" % (i_secret, combine_sum % self.p))
+        debug = logger.isEnabledFor(logging.DEBUG)
+        logger.debug('Obtained pseudo shares: %r', obtained_pseudo_shares)
+
+        group = self.access_structures[i_secret][q_group]
+        logger.debug('Access group: %r', group)
+
+        # B = U + M for members who gave their shares: all members,
+        # or threshold of them for a ThresholdGroup.
+        # Shares loaded from files may still be bytes.
+        # public shares of the group are read at once
+        M_group = list(self.public_shares_M[i_secret][q_group])
+        B_values = []
+        members = []
+        for b, Pb, U in common.select_shares(group, obtained_pseudo_shares):
+            part_sum_B = (bytehelper.to_int(U) + M_group[b]) % self.p
+            if debug:
+                logger.debug('\tb = %d, B = U+M, B = %d, M=%d',
+                             b, part_sum_B, M_group[b])
+            B_values.append(part_sum_B)
+            members.append(Pb)
+
+        coefficients = common.reconstruction_coefficients(
+            group, members, self.get_id_int, self.p)
+        logger.debug('\tLagrange coefficients: %r', coefficients)
+
+        combine_sum = common.lagrange_interpolate_at_zero(B_values,
+                                                          coefficients, self.p)
+
+        logger.debug('Combined sum, s%d = %d', i_secret, combine_sum)
 
         return common.modulo_p(self.p, combine_sum)
 
+    def combine_all_secrets(self, obtained_pseudo_shares):
+        """ Combine every secret the obtained pseudo shares allow, each from
+            its smallest complete group. Missing shares are None.
+            IDs and Lagrange coefficients of a member set are computed once
+            for all secrets. Returns a dictionary {secret number: secret}
+        """
+        coefficient_table = common.LagrangeCoefficientTable(self.get_id_int,
+                                                            self.p)
+        secrets = {}
+        for i, q in common.complete_groups(self.access_structures,
+                                           obtained_pseudo_shares).items():
+            selected = common.select_shares(self.access_structures[i][q],
+                                            obtained_pseudo_shares[i][q])
+            # B = U + M for each member who gave a share
+            M_group = list(self.public_shares_M[i][q])
+            B_values = [(bytehelper.to_int(U) + M_group[b]) % self.p
+                        for b, _, U in selected]
+            members = [Pb for _, Pb, _ in selected]
+            secrets[i] = common.lagrange_interpolate_at_zero(
+                B_values, coefficient_table.for_group(
+                    self.access_structures[i][q], members), self.p)
+            logger.debug('Combined s%d from group %d', i, q)
+        return secrets
+
+    def new_accumulator(self, i_secret, q_group):
+        """ accumulator for shares of group A_q of secret i arriving
+            one at a time """
+        group = self.access_structures[i_secret][q_group]
+        return common.group_accumulator(group, self.p)
+
+    def accumulate_share(self, accumulator, i_secret, q_group, participant,
+                         obtained_pseudo_share):
+        """ add pseudo share U of a participant, as B = U + M """
+        b = self.plan.member_index(i_secret, q_group, participant)
+        B_value = (bytehelper.to_int(obtained_pseudo_share)
+                   + self.public_shares_M[i_secret][q_group][b]) % self.p
+        accumulator.add(b, self.get_id_int(participant), B_value)
+
+    def combine_accumulated(self, i_secret, accumulator):
+        """ secret from an accumulator holding shares of the whole group """
+        combine_sum = accumulator.result()
+        logger.debug('Combined sum, s%d = %d', i_secret, combine_sum)
+        return combine_sum
+
@@ -0,0 +1,235 @@
+""" Flat (CSR) layout of access structures and share storage.
+
+    Access structure [[A1, A2], [A3]] is kept in three arrays:
+        members         all group members, secret by secret, group by group
+        group_offsets   start of each group in members (and end of the last)
+        secret_offsets  index of the first group of each secret
+
+    A ShareStore keeps one field element per group member, in the same
+    order, in a single bytearray. Its views keep [i][q][b] indexing working,
+    so a store can be used everywhere a nested list of shares was used.
+    Whole groups are written with set_group() and read by iterating
+    a group view, in one pass over the group.
+"""
+
+from array import array
+
+import multisecret.byteHelper as bytehelper
+
+
+class AccessLayout:
+
+    def __init__(self, access_structures):
+        self.members = array('I')
+        self.group_offsets = array('I', [0])
+        self.secret_offsets = array('I', [0])
+
+        for gamma in access_structures:
+            for A in gamma:
+                self.members.extend(A)
+                self.group_offsets.append(len(self.members))
+            self.secret_offsets.append(len(self.group_offsets) - 1)
+
+    def __len__(self):
+        """ number of secrets """
+        return len(self.secret_offsets) - 1
+
+    @property
+    def size(self):
+        """ total number of group members (shares) in the layout """
+        return len(self.members)
+
+    def group_count(self, i_secret):
+        return self.secret_offsets[i_secret + 1] - self.secret_offsets[i_secret]
+
+    def group_range(self, i_secret, q_group):
+        """ (start, stop) of group A_q of secret i in members """
+        if not 0 <= q_group < self.group_count(i_secret):
+            raise IndexError('group index out of range')
+        g = self.secret_offsets[i_secret] + q_group
+        return self.group_offsets[g], self.group_offsets[g + 1]
+
+    def group(self, i_secret, q_group):
+        start, stop = self.group_range(i_secret, q_group)
+        return self.members[start:stop].tolist()
+
+    def position(self, i_secret, q_group, b):
+        """ flat index of b-th member of group A_q of secret i """
+        start, stop = self.group_range(i_secret, q_group)
+        if not 0 <= b < stop - start:
+            raise IndexError('member index out of range')
+        return start + b
+
+    def to_nested(self):
+        return [[self.group(i, q) for q in range(self.group_count(i))]
+                for i in range(len(self))]
+
+
+class ShareStore:
+    """ One value for each member of each group, stored as fixed-width
+        big-endian field elements. Values are returned as int, or as bytes
+        of the element width if as_bytes is set. Shares not set yet are None.
+    """
+
+    def __init__(self, layout, width, as_bytes=False):
+        self.layout = layout
+        self.width = width
+        self.as_bytes = as_bytes
+        self.data = bytearray(width * layout.size)
+        self.present = bytearray(layout.size)
+
+    @classmethod
+    def from_secrets(cls, layout, width, secrets, as_bytes=False):
+        """ store filled with [q][b] nested values of each secret """
+        store = cls(layout, width, as_bytes)
+        for i, values in enumerate(secrets):
+            store.set_secret(i, values)
+        return store
+
+    def get(self, position):
+        if not self.present[position]:
+            return None
+        start = position * self.width
+        value = self.data[start:start + self.width]
+        if self.as_bytes:
+            return bytes(value)
+        return int.from_bytes(value, byteorder='big')
+
+    def get_range(self, start, stop):
+        """ list of values at flat positions from start to stop """
+        width = self.width
+        present = self.present
+        values = []
+        with memoryview(self.data) as data:
+            for position in range(start, stop):
+                if not present[position]:
+                    values.append(None)
+                    continue
+                value = data[position * width:(position + 1) * width]
+                if self.as_bytes:
+                    values.append(value.tobytes())
+                else:
+                    values.append(int.from_bytes(value, byteorder='big'))
+        return values
+
+    def set(self, position, value):
+        if value is None:
+            self.present[position] = 0
+            return
+        start = position * self.width
+        try:
+            self.data[start:start + self.width] = bytehelper.element_to_bytes(
+                value, self.width)
+        except OverflowError:
+            raise ValueError('Share does not fit in %d bytes!' % self.width)
+        self.present[position] = 1
+
+    def set_group(self, i_secret, q_group, values):
+        """ write values of all members of group A_q of secret i at once """
+        start, stop = self.layout.group_range(i_secret, q_group)
+        values = list(values)
+        if len(values) != stop - start:
+            raise ValueError('Wrong number of shares in group %d' % q_group)
+        if None in values:
+            for position, value in zip(range(start, stop), values):
+                self.set(position, value)
+            return
+        width = self.width
+        try:
+            self.data[start * width:stop * width] = b''.join(
+                bytehelper.element_to_bytes(value, width) for value in values)
+        except OverflowError:
+            raise ValueError('Share does not fit in %d bytes!' % width)
+        self.present[start:stop] = b'\x01' * (stop - start)
+
+    def set_secret(self, i_secret, values):
+        """ copy [q][b] nested values of a single secret """
+        for q, group_values in enumerate(values):
+            self.set_group(i_secret, q, group_values)
+
+    def to_nested(self):
+        return [[list(group) for group in secret] for secret in self]
+
+    def __len__(self):
+        return len(self.layout)
+
+    def __getitem__(self, i_secret):
+        if not -len(self) <= i_secret < len(self):
+            raise IndexError('secret index out of range')
+        return _SecretView(self, i_secret % len(self))
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __eq__(self, other):
+        return _nested(self) == _nested(other)
+
+    def __repr__(self):
+        return repr(self.to_nested())
+
+
+class _SecretView:
+
+    def __init__(self, store, i_secret):
+        self.store = store
+        self.i_secret = i_secret
+
+    def __len__(self):
+        return self.store.layout.group_count(self.i_secret)
+
+    def __getitem__(self, q_group):
+        if not -len(self) <= q_group < len(self):
+            raise IndexError('group index out of range')
+        return _GroupView(self.store, *self.store.layout.group_range(
+            self.i_secret, q_group % len(self)))
+
+    def __iter__(self):
+        return (self[q] for q in range(len(self)))
+
+    def __eq__(self, other):
+        return _nested(self) == _nested(other)
+
+    def __repr__(self):
+        return repr([list(group) for group in self])
+
+
+class _GroupView:
+
+    def __init__(self, store, start, stop):
+        self.store = store
+        self.start = start
+        self.stop = stop
+
+    def _position(self, b):
+        if not -len(self) <= b < len(self):
+            raise IndexError('member index out of range')
+        return self.start + b % len(self)
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, b):
+        return self.store.get(self._position(b))
+
+    def __setitem__(self, b, value):
+        self.store.set(self._position(b), value)
+
+    def __iter__(self):
+        return iter(self.store.get_range(self.start, self.stop))
+
+    def __eq__(self, other):
+        return list(self) == _nested(other)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+def _nested(values):
+    """ compare views and nested lists by value """
+    if isinstance(values, ShareStore):
+        return values.to_nested()
+    if isinstance(values, _SecretView):
+        return [list(group) for group in values]
+    if isinstance(values, _GroupView):
+        return list(values)
+    return values
@@ -0,0 +1,335 @@
+""" Compiled, immutable form of access structures.
+
+    compile_access_structures() validates nested access structures once and
+    precomputes what Dealers need for every split and combine:
+        groups              validated groups as nested tuples
+        u, v                bit length of the largest secret index and of
+                            the largest group index, fixed widths of i and q
+                            hashed into Roy-Adhikari pseudo shares
+        group_masks         bitset of members of each group (bit Pb)
+        thresholds          members needed to reconstruct from each group
+        participant_index   {participant: ((i, q, b), ...)}
+        layout              flat AccessLayout for share stores
+
+    A plan can be passed to Dealers instead of access_structures and reused
+    for many splits with the same structure. It behaves as a read-only
+    sequence of secrets, groups and members like the nested lists.
+    Attributes cannot be set, dictionaries in it must not be modified.
+
+    A group can be a ThresholdGroup: any t of its members can reconstruct
+    the secret, e.g. ThresholdGroup(range(1, 11), 3) for 3 of 10 users.
+    It is shared with a single polynomial of degree t - 1, instead of
+    listing all C(n, t) subsets as separate groups. A PolicyGroup
+    (see accessPolicy) is qualified by a formula of AND, OR and threshold
+    gates over its members.
+"""
+
+import multisecret.byteHelper as bytehelper
+from multisecret.accessLayout import AccessLayout
+
+
+class ThresholdGroup(tuple):
+    """ Members of a group, any threshold of them are qualified """
+
+    def __new__(cls, members, threshold):
+        group = super().__new__(cls, members)
+        if not 2 <= threshold <= len(group):
+            raise ValueError('Threshold must be from 2 to %d, not %d!'
+                             % (len(group), threshold))
+        group.threshold = threshold
+        return group
+
+    def __getnewargs__(self):
+        return tuple(self), self.threshold
+
+    def __eq__(self, other):
+        if not isinstance(other, tuple):
+            return NotImplemented
+        return (tuple(self) == tuple(other)
+                and self.threshold == group_threshold(other))
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        if self.threshold == len(self):
+            return hash(tuple(self))
+        return hash((tuple(self), self.threshold))
+
+    def __repr__(self):
+        return 'ThresholdGroup(%r, %d)' % (tuple(self), self.threshold)
+
+
+def group_threshold(A):
+    """ number of members of group A needed to reconstruct - all members
+        of a plain group """
+    return getattr(A, 'threshold', len(A))
+
+
+def group_cost(A):
+    """ fewest shares of group A which can reconstruct """
+    return getattr(A, 'min_shares', group_threshold(A))
+
+
+def group_coefficient_count(A):
+    """ number of random coefficients d to share a secret for group A """
+    return getattr(A, 'coefficient_count', group_threshold(A) - 1)
+
+
+def group_members_needed(A, participants):
+    """ members of group A among participants used to reconstruct (first
+        ones in the order of members), None if participants are not
+        qualified. participants can be any container. """
+    if hasattr(A, 'policy'):
+        return A.select(participants)
+    members = [Pb for Pb in A if Pb in participants]
+    if len(members) < group_threshold(A):
+        return None
+    return members[:group_threshold(A)]
+
+
+def _popcount(mask):
+    return bin(mask).count('1')
+
+
+class AccessPlan:
+
+    def __init__(self, access_structures):
+        groups = []
+        for i, gamma in enumerate(access_structures):
+            if len(gamma) == 0:
+                raise ValueError('No access group for secret %d!' % i)
+            gamma_groups = []
+            for A in gamma:
+                # ThresholdGroup and PolicyGroup are kept as they are
+                if not isinstance(A, tuple):
+                    A = tuple(A)
+                if group_cost(A) < 2:
+                    raise ValueError(
+                        'Less than 2 participants in one of the access groups!')
+                for Pb in A:
+                    if not isinstance(Pb, int) or Pb < 1:
+                        raise ValueError('Participants are numbered from 1, '
+                                         'not %r!' % (Pb,))
+                if len(set(A)) != len(A):
+                    raise ValueError('Participant repeated in access group %r!'
+                                     % (A,))
+                gamma_groups.append(A)
+            groups.append(tuple(gamma_groups))
+        groups = tuple(groups)
+
+        index = {}
+        masks = []
+        positions = []
+        for i, gamma in enumerate(groups):
+            gamma_masks = []
+            gamma_positions = []
+            for q, A in enumerate(gamma):
+                mask = 0
+                for b, Pb in enumerate(A):
+                    mask |= 1 << Pb
+                    index.setdefault(Pb, []).append((i, q, b))
+                gamma_masks.append(mask)
+                gamma_positions.append({Pb: b for b, Pb in enumerate(A)})
+            masks.append(tuple(gamma_masks))
+            positions.append(tuple(gamma_positions))
+
+        set_attribute = super().__setattr__
+        set_attribute('groups', groups)
+        set_attribute('n', max((Pb for Pb in index), default=0))
+        set_attribute('u', bytehelper.bitlen(len(groups) - 1))
+        set_attribute('v', bytehelper.bitlen(
+            max(len(gamma) for gamma in groups) - 1))
+        set_attribute('group_masks', tuple(masks))
+        set_attribute('thresholds', tuple(
+            tuple(group_threshold(A) for A in gamma) for gamma in groups))
+        set_attribute('member_positions', tuple(positions))
+        set_attribute('participant_index',
+                      {Pb: tuple(shares) for Pb, shares in index.items()})
+        set_attribute('layout', AccessLayout(groups))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('AccessPlan is immutable')
+
+    def __len__(self):
+        """ number of secrets """
+        return len(self.groups)
+
+    def __getitem__(self, i_secret):
+        return self.groups[i_secret]
+
+    def __iter__(self):
+        return iter(self.groups)
+
+    def __eq__(self, other):
+        if isinstance(other, AccessPlan):
+            return self.groups == other.groups
+        return self.to_nested() == other
+
+    def __hash__(self):
+        return hash(self.groups)
+
+    def __repr__(self):
+        return 'AccessPlan(%r)' % (self.to_nested(),)
+
+    def to_nested(self):
+        """ access structures as nested lists, threshold and policy
+            groups are kept """
+        return [[_copy_group(A) for A in gamma] for gamma in self.groups]
+
+    def is_member(self, i_secret, q_group, participant):
+        return bool(self.group_masks[i_secret][q_group] >> participant & 1)
+
+    def member_index(self, i_secret, q_group, participant):
+        """ index b of a participant in group A_q of secret i """
+        try:
+            return self.member_positions[i_secret][q_group][participant]
+        except KeyError:
+            raise ValueError('Participant %d is not in group %d of secret %d'
+                             % (participant, q_group, i_secret))
+
+    def share_positions(self, participant):
+        """ positions (i, q, b) of all shares of a participant """
+        return self.participant_index.get(participant, ())
+
+    def participants_mask(self, participants):
+        """ bitset of participants (bit Pb), for is_qualified() """
+        mask = 0
+        for participant in participants:
+            mask |= 1 << participant
+        return mask
+
+    def is_qualified(self, i_secret, q_group, participants_mask):
+        """ True if enough members of group A_q of secret i (all of them,
+            threshold of them, or satisfying the policy) are in the mask """
+        A = self.groups[i_secret][q_group]
+        if hasattr(A, 'policy'):
+            return A.select([Pb for Pb in A
+                             if participants_mask >> Pb & 1]) is not None
+        present = self.group_masks[i_secret][q_group] & participants_mask
+        return _popcount(present) >= self.thresholds[i_secret][q_group]
+
+
+def compile_access_structures(access_structures):
+    """ AccessPlan of nested access structures, a plan is returned as is """
+    if isinstance(access_structures, AccessPlan):
+        return access_structures
+    return AccessPlan(access_structures)
+
+
+class OptimizationReport:
+    """ Work removed by minimize_access_structures() """
+
+    def __init__(self, access_structures, minimal, kept, removed):
+        self.kept = kept
+        self.removed = removed
+        self.groups_before = _group_count(access_structures)
+        self.groups_after = _group_count(minimal)
+        self.shares_before = _share_count(access_structures)
+        self.shares_after = _share_count(minimal)
+        self.coefficients_before = _coefficient_count(access_structures)
+        self.coefficients_after = _coefficient_count(minimal)
+        # Lagrange coefficients are computed once for each member set
+        # shared by groups of many secrets
+        self.member_sets = len({_group_key(A)
+                                for gamma in minimal for A in gamma})
+
+    def __str__(self):
+        return ('groups: {} -> {}, shares: {} -> {}, polynomial coefficients: '
+                '{} -> {}, distinct member sets: {}'.format(
+                    self.groups_before, self.groups_after,
+                    self.shares_before, self.shares_after,
+                    self.coefficients_before, self.coefficients_after,
+                    self.member_sets))
+
+
+def _group_count(access_structures):
+    return sum(len(gamma) for gamma in access_structures)
+
+
+def _share_count(access_structures):
+    return sum(len(A) for gamma in access_structures for A in gamma)
+
+
+def _coefficient_count(access_structures):
+    """ random coefficients d of polynomials, t - 1 for a group
+        with threshold t (t = m for a plain group of m) """
+    return sum(group_coefficient_count(A)
+               for gamma in access_structures for A in gamma)
+
+
+def _group_key(A):
+    """ groups with the same members and threshold have the same key """
+    if hasattr(A, 'policy'):
+        return A
+    if group_threshold(A) == len(A):
+        return tuple(sorted(A))
+    return ThresholdGroup(sorted(A), A.threshold)
+
+
+def _copy_group(A):
+    if isinstance(A, ThresholdGroup) or hasattr(A, 'policy'):
+        return A
+    return list(A)
+
+
+def _covers(mask_r, threshold_r, mask_q, threshold_q):
+    """ True if every qualified subset of group q is qualified in group r:
+        at least threshold_q - |q outside r| members of it are in r """
+    return threshold_q - _popcount(mask_q & ~mask_r) >= threshold_r
+
+
+def _covers_group(A_r, mask_r, A_q, mask_q):
+    if hasattr(A_r, 'policy') or hasattr(A_q, 'policy'):
+        # policy groups are only dropped when repeated
+        return A_r == A_q
+    return _covers(mask_r, group_threshold(A_r), mask_q, group_threshold(A_q))
+
+
+def minimize_access_structures(access_structures):
+    """ Drop groups which are supersets (or repeats) of another group
+        of the same secret - any set of participants qualified by them is
+        qualified by the smaller group anyway. Threshold groups are covered
+        the same way, e.g. [1, 2, 3] by 2 of [1, 2, 3, 4], policy groups
+        are only dropped when repeated.
+        Order of the remaining groups is kept. Returns minimal access
+        structures as nested lists and an OptimizationReport with
+        kept[i] - original indexes q of kept groups and
+        removed - (i, q, covering q) of each dropped group. """
+    minimal = []
+    kept = []
+    removed = []
+    for i, gamma in enumerate(access_structures):
+        masks = [sum(1 << Pb for Pb in set(A)) for A in gamma]
+        # groups needing fewer members first (of these the larger ones),
+        # so a group is only compared with kept ones
+        order = sorted(range(len(gamma)),
+                       key=lambda q: (group_cost(gamma[q]),
+                                      -len(set(gamma[q])), q))
+        kept_q = []
+        for q in order:
+            covering = [r for r in kept_q
+                        if _covers_group(gamma[r], masks[r],
+                                         gamma[q], masks[q])]
+            if covering:
+                removed.append((i, q, covering[0]))
+            else:
+                kept_q.append(q)
+        kept_q.sort()
+        kept.append(kept_q)
+        minimal.append([_copy_group(gamma[q]) for q in kept_q])
+
+    return minimal, OptimizationReport(access_structures, minimal, kept,
+                                       removed)
+
+
+def optimize_access_structures(access_structures):
+    """ AccessPlan of minimal access structures and an OptimizationReport.
+        Dealers compute powers of each participant ID once for groups
+        of all secrets, and combine_all_secrets() computes Lagrange
+        coefficients once for each member set. """
+    if isinstance(access_structures, AccessPlan):
+        access_structures = access_structures.to_nested()
+    minimal, report = minimize_access_structures(access_structures)
+    return AccessPlan(minimal), report
@@ -0,0 +1,246 @@
+""" Access policies as monotone formulas of AND, OR and threshold gates.
+
+    A policy like "(2 of users 1, 2, 3) AND (user 4 OR user 5)" is written
+        PolicyGroup(And(Threshold(2, 1, 2, 3), Or(4, 5)))
+    and used as a single access group, instead of listing all its
+    qualified subsets as separate groups.
+
+    The secret is shared down the formula tree (Benaloh-Leichter): a gate
+    with threshold t and c children shares its value with a polynomial
+    of degree t - 1 evaluated at 1, 2, ... c, each leaf value becomes
+    a share B of the participant in the leaf. Random coefficients of all
+    gates are stored as d[i][q] of the group, so the share count and split
+    work grow with the formula size. Reconstruction is linear, the secret
+    is sum c_b * B_b with coefficients c_b of the members used.
+
+    Formulas must be read-once - each participant is in a single leaf.
+    Members of a PolicyGroup are participants in the order of leaves.
+"""
+
+import multisecret.MultiSecretCommon as common
+
+
+class Gate:
+    """ threshold of children (gates or participants) needed """
+
+    def __init__(self, threshold, children):
+        self.threshold = threshold
+        self.children = tuple(children)
+        if not 1 <= threshold <= len(self.children):
+            raise ValueError('Threshold of a gate must be from 1 to %d, not %d!'
+                             % (len(self.children), threshold))
+        for child in self.children:
+            if not isinstance(child, Gate) and (not isinstance(child, int)
+                                                or child < 1):
+                raise ValueError('Participants are numbered from 1, not %r!'
+                                 % (child,))
+
+    def __eq__(self, other):
+        if not isinstance(other, Gate):
+            return NotImplemented
+        return (self.threshold, self.children) == (other.threshold,
+                                                   other.children)
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        return hash((self.threshold, self.children))
+
+    def __repr__(self):
+        if self.threshold == len(self.children):
+            name = 'And'
+        elif self.threshold == 1:
+            name = 'Or'
+        else:
+            return 'Threshold(%d, %s)' % (
+                self.threshold, ', '.join(repr(c) for c in self.children))
+        return '%s(%s)' % (name, ', '.join(repr(c) for c in self.children))
+
+    def leaves(self):
+        """ participants in leaves, left to right """
+        participants = []
+        for child in self.children:
+            if isinstance(child, Gate):
+                participants.extend(child.leaves())
+            else:
+                participants.append(child)
+        return participants
+
+
+class And(Gate):
+    """ all children are needed """
+
+    def __init__(self, *children):
+        super().__init__(len(children), children)
+
+
+class Or(Gate):
+    """ any one child is enough """
+
+    def __init__(self, *children):
+        super().__init__(1, children)
+
+
+class Threshold(Gate):
+    """ any threshold of children are needed """
+
+    def __init__(self, threshold, *children):
+        super().__init__(threshold, children)
+
+
+def _gates(gate):
+    """ gates of a formula in pre-order """
+    yield gate
+    for child in gate.children:
+        if isinstance(child, Gate):
+            yield from _gates(child)
+
+
+class PolicyGroup(tuple):
+    """ Members of a group qualified by a policy formula of gates """
+
+    def __new__(cls, policy):
+        if not isinstance(policy, Gate):
+            raise ValueError('Policy must be a gate, not %r!' % (policy,))
+        members = policy.leaves()
+        if len(set(members)) != len(members):
+            raise ValueError('Policy must be read-once, participant repeated '
+                             'in %r!' % (policy,))
+        group = super().__new__(cls, members)
+        group.policy = policy
+        group.coefficient_count = sum(gate.threshold - 1
+                                      for gate in _gates(policy))
+        group.min_shares = len(group._select(policy, set(members)))
+        return group
+
+    def __getnewargs__(self):
+        return (self.policy,)
+
+    def __eq__(self, other):
+        if not isinstance(other, PolicyGroup):
+            return False
+        return self.policy == other.policy
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.policy)
+
+    def __repr__(self):
+        return 'PolicyGroup(%r)' % (self.policy,)
+
+    def select(self, participants):
+        """ fewest members among participants which satisfy the policy,
+            in the order of members, or None if the policy is not satisfied """
+        selected = self._select(self.policy, participants)
+        if selected is None:
+            return None
+        selected = set(selected)
+        return [Pb for Pb in self if Pb in selected]
+
+    def _select(self, gate, participants):
+        satisfied = []
+        for child in gate.children:
+            if isinstance(child, Gate):
+                child_selected = self._select(child, participants)
+                if child_selected is not None:
+                    satisfied.append(child_selected)
+            elif child in participants:
+                satisfied.append([child])
+        if len(satisfied) < gate.threshold:
+            return None
+        # subtrees are disjoint, so the smallest children give fewest members
+        satisfied.sort(key=len)
+        return [Pb for child_selected in satisfied[:gate.threshold]
+                for Pb in child_selected]
+
+    def leaf_values(self, secret_value, coeffs, prime):
+        """ shares B of all members, secret shared down the formula
+            with coefficients of gates in pre-order """
+        values = {}
+        coeffs = iter(coeffs)
+
+        def share(gate, value):
+            gate_coeffs = [next(coeffs) for _ in range(gate.threshold - 1)]
+            child_values = common.shamir_polynomial_compute_many(
+                range(1, len(gate.children) + 1), gate_coeffs, value, prime)
+            for child, child_value in zip(gate.children, child_values):
+                if isinstance(child, Gate):
+                    share(child, child_value)
+                else:
+                    values[child] = child_value
+
+        share(self.policy, secret_value % prime)
+        return [values[Pb] for Pb in self]
+
+    def reconstruction_coefficients(self, members, prime):
+        """ coefficients c_b of shares of members (satisfying the policy),
+            the secret is sum c_b * B_b """
+        members = set(members)
+        coefficients = {}
+
+        def combine(gate, factor):
+            used = []
+            for index, child in enumerate(gate.children, start=1):
+                if len(used) == gate.threshold:
+                    break
+                if isinstance(child, Gate):
+                    if self._select(child, members) is not None:
+                        used.append((index, child))
+                elif child in members:
+                    used.append((index, child))
+            if len(used) < gate.threshold:
+                raise ValueError('Members %r do not satisfy %r'
+                                 % (sorted(members), gate))
+            lagrange = common.cached_lagrange_coefficients(
+                [index for index, _ in used], prime)
+            for (_, child), c in zip(used, lagrange):
+                if isinstance(child, Gate):
+                    combine(child, factor * c % prime)
+                else:
+                    coefficients[child] = factor * c % prime
+
+        combine(self.policy, 1)
+        return [coefficients.get(Pb, 0) for Pb in sorted(
+            members, key=self.index)]
+
+    def accumulator(self, prime):
+        return PolicyAccumulator(self, prime)
+
+
+class PolicyAccumulator:
+    """ Shares B of a PolicyGroup arriving one at a time, with the same
+        interface as common.LagrangeAccumulator. Complete as soon as
+        the members who gave shares satisfy the policy. """
+
+    def __init__(self, group, prime):
+        self.group = group
+        self.prime = prime
+        self.values = {}
+
+    @property
+    def complete(self):
+        return self.group.select(self.values) is not None
+
+    def add(self, b, participant_id, value):
+        """ add share B of member b, the ID is not used by policies """
+        if not 0 <= b < len(self.group):
+            raise IndexError('member index out of range')
+        if self.group[b] in self.values:
+            raise ValueError('Share of member %d was already added' % b)
+        if self.complete:
+            raise ValueError('Group is complete, no more shares needed')
+        self.values[self.group[b]] = value % self.prime
+
+    def result(self):
+        members = self.group.select(self.values)
+        if members is None:
+            raise ValueError('Not enough shares to satisfy %r'
+                             % (self.group.policy,))
+        coefficients = self.group.reconstruction_coefficients(members,
+                                                              self.prime)
+        return common.lagrange_interpolate_at_zero(
+            [self.values[Pb] for Pb in members], coefficients, self.prime)
@@ -1,8 +1,10 @@
 """ Helper functions for robust conversion
     - int->bytes
     - bytes->int
+
+    Field elements are kept as int. The canonical bytes form of an element
+    of Zp is big-endian with fixed width of element_width(p) bytes.
 """
-from math import log2, floor
 
 
 def bitlen(number):
@@ -11,7 +13,7 @@ def bitlen(number):
     if number == 0:
         return 1
     else:
-        return floor(log2(number)) + 1
+        return number.bit_length()
 
 
 def bytelen(number):
@@ -19,7 +21,24 @@ def bytelen(number):
     if number == 0:
         return 1
     else:
-        return floor(log2(number) // 8) + 1
+        return (number.bit_length() - 1) // 8 + 1
+
+
+def to_int(value):
+    """ field element as int, accepts int or big-endian bytes """
+    if isinstance(value, (bytes, bytearray)):
+        return int.from_bytes(value, byteorder='big')
+    return value
+
+
+def element_width(prime):
+    """ number of bytes of each field element for prime p """
+    return (prime.bit_length() + 7) // 8
+
+
+def element_to_bytes(value, width):
+    """ canonical fixed-width big-endian bytes of a field element """
+    return to_int(value).to_bytes(width, byteorder='big')
 
 
 def inverse_modulo_p(a, p):
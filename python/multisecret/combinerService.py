@@ -0,0 +1,308 @@
+""" Headless combiner: an asyncio server which reconstructs secrets
+    as participants submit their pseudo shares.
+
+    Public info is loaded once. Clients connect over a Unix or TCP socket
+    and send JSON requests, one per line. Every request gets a JSON
+    response line. Shares of many sessions (reconstructions) can be
+    collected at the same time, from many connections.
+
+    {"op": "submit", "session": "s1", "user": 2, "id": 1234,
+     "shares": [[secret, group, share], ...]}
+        -> {"session": "s1", "reconstructed": {"0": 7}, "failed": {}}
+           secrets which became available after this submission,
+           and secrets whose combine failed so far.
+           In Roy-Adhikari "master_share": x can be sent instead of shares,
+           they are derived with the hash nonce from public info.
+    {"op": "status", "session": "s1"}
+        -> {"session": "s1", "users": [2], "reconstructed": {"0": 7},
+            "failed": {}}
+    {"op": "close", "session": "s1"}
+        -> {"session": "s1", "closed": true}
+
+    Errors are reported as {"error": "description"}.
+    Sessions not used for session_ttl seconds are closed.
+    If a group fails to combine its shares are dropped, and its members
+    can submit again to fill it.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+import multisecret.MultiSecretCommon as common
+import multisecret.shareFile as sharefile
+from multisecret.accessPlan import compile_access_structures
+from multisecret.reconstructionPlanner import create_combiner
+
+logger = logging.getLogger(__name__)
+
+# idle sessions are closed after this many seconds
+SESSION_TTL = 3600
+
+
+def _field_element(value, prime, name):
+    """ int value of an ID or share from a request,
+        ValueError if it is not an element of Zp """
+    if isinstance(value, (bytes, bytearray)):
+        value = int.from_bytes(value, byteorder='big')
+    if (isinstance(value, bool) or not isinstance(value, int)
+            or not 0 <= value < prime):
+        raise ValueError('%s must be an element of Zp, not %r' % (name, value))
+    return value
+
+
+class Session:
+    """ Shares submitted for a single reconstruction """
+
+    def __init__(self, combiner):
+        self.combiner = combiner
+        self.users = set()
+        self.secrets = {}
+        self.pending = set()
+        # {secret: error} of secrets whose combine failed
+        self.failures = {}
+        # Lagrange sums of groups, updated as shares arrive,
+        # and users whose shares they hold
+        self.accumulators = {}
+        self.contributors = {}
+        self.last_used = time.monotonic()
+
+    def accumulator(self, i_secret, q_group):
+        if (i_secret, q_group) not in self.accumulators:
+            self.accumulators[(i_secret, q_group)] = \
+                self.combiner.new_accumulator(i_secret, q_group)
+            self.contributors[(i_secret, q_group)] = set()
+        return self.accumulators[(i_secret, q_group)]
+
+    def discard_accumulator(self, i_secret, q_group):
+        del self.accumulators[(i_secret, q_group)]
+        del self.contributors[(i_secret, q_group)]
+
+
+class CombinerService:
+
+    def __init__(self, public_info, executor=None, session_ttl=SESSION_TTL):
+        """ executor runs combine_secret(), by default the loop's default
+            executor (threads). A ProcessPoolExecutor can be passed
+            to use all CPUs. Sessions idle for session_ttl seconds
+            are closed, never if it is None. """
+        # access structures are compiled once and shared by combiners
+        # of all sessions
+        self.plan = compile_access_structures(public_info['access_structures'])
+        self.public_info = dict(public_info, access_structures=self.plan)
+        self.executor = executor
+        self.session_ttl = session_ttl
+        self.sessions = {}
+        # holds no shares, derives pseudo shares from master shares
+        self.combiner = create_combiner(self.public_info)
+
+    @classmethod
+    def from_file(cls, filename, executor=None):
+        with open(filename, 'rb') as file:
+            return cls(sharefile.read_public_info(file), executor)
+
+    def session(self, name):
+        if name not in self.sessions:
+            self.sessions[name] = Session(create_combiner(self.public_info))
+        return self.sessions[name]
+
+    def close_idle_sessions(self):
+        """ close sessions not used for session_ttl seconds """
+        if self.session_ttl is None:
+            return
+        now = time.monotonic()
+        for name, session in list(self.sessions.items()):
+            if now - session.last_used > self.session_ttl:
+                logger.debug('session %s closed after %d s idle',
+                             name, now - session.last_used)
+                del self.sessions[name]
+
+    def master_share_shares(self, user, master_share):
+        """ shares {(secret, group): share} of a user derived
+            from his master share x, ValueError if x is not in Zp """
+        combiner = self.combiner
+        if not hasattr(combiner, 'pseudo_shares_from_master_share'):
+            raise ValueError('Master shares are not supported by %s'
+                             % self.public_info['algorithm'])
+        master_share = _field_element(master_share, combiner.p,
+                                      'Master share')
+        return combiner.pseudo_shares_from_master_share(user, master_share)
+
+    async def submit(self, name, user, user_id, shares):
+        """ Take ID and shares {(secret, group): share} of a user.
+            Returns {secret: value} of secrets combined after this submission.
+            The ID and shares are validated before the session is changed,
+            secrets whose combine fails are listed in session.failures.
+            A new session is kept only once its first submission is valid.
+            A user can submit again only to fill groups which failed.
+        """
+        self.close_idle_sessions()
+        session = self.sessions.get(name)
+        if session is None:
+            session = Session(create_combiner(self.public_info))
+        combiner = session.combiner
+        if not 1 <= user <= combiner.n:
+            raise ValueError('Unknown user %d' % user)
+
+        user_id = _field_element(user_id, combiner.p, 'ID')
+        if user_id == 0:
+            raise ValueError('ID must not be 0')
+        for other in session.users:
+            if other != user and combiner.get_id_int(other) == user_id:
+                raise ValueError('User %d has the same ID as user %d'
+                                 % (user, other))
+        # shares of secrets not known yet, which no group holds
+        positions = [(i, q, b) for i, q, b in combiner.share_positions(user)
+                     if i not in session.secrets
+                     and user not in session.contributors.get((i, q), ())]
+        if user in session.users:
+            if combiner.get_id_int(user) != user_id:
+                raise ValueError('User %d already submitted another ID'
+                                 % user)
+            if not positions:
+                raise ValueError('User %d already submitted shares' % user)
+        user_shares = {}
+        for i, q, _ in positions:
+            if (i, q) not in shares:
+                raise ValueError('Missing share of user %d for secret %d, '
+                                 'group %d' % (user, i, q))
+            user_shares[(i, q)] = _field_element(
+                common.share_for_group(shares, i, q), combiner.p,
+                'Share for secret %d, group %d' % (i, q))
+
+        self.sessions[name] = session
+        session.last_used = time.monotonic()
+        combiner.random_id[user - 1] = user_id
+        session.users.add(user)
+
+        # add shares to groups of secrets not known yet,
+        # groups which are complete now are combined
+        ready = []
+        for i, q, _ in positions:
+            if i in session.pending:
+                continue
+            accumulator = session.accumulator(i, q)
+            combiner.accumulate_share(accumulator, i, q, user,
+                                      user_shares[(i, q)])
+            session.contributors[(i, q)].add(user)
+            if accumulator.complete:
+                session.pending.add(i)
+                ready.append((i, q))
+
+        loop = asyncio.get_running_loop()
+        combined = await asyncio.gather(*[
+            loop.run_in_executor(self.executor, combiner.combine_accumulated,
+                                 i, session.accumulators[(i, q)])
+            for i, q in ready], return_exceptions=True)
+
+        reconstructed = {}
+        for (i, q), secret in zip(ready, combined):
+            session.pending.discard(i)
+            if isinstance(secret, Exception):
+                logger.warning('session %s: secret %d not combined by '
+                               'group %d: %s', name, i, q, secret)
+                # shares of the group are dropped, its members can submit
+                # them again, other groups of the secret can still complete
+                session.discard_accumulator(i, q)
+                session.failures[i] = str(secret) or secret.__class__.__name__
+                continue
+            logger.debug('session %s: secret %d combined by group %d',
+                         name, i, q)
+            session.failures.pop(i, None)
+            session.secrets[i] = secret
+            # other groups of the secret are not needed any more
+            for key in [key for key in session.accumulators if key[0] == i]:
+                session.discard_accumulator(*key)
+            reconstructed[i] = secret
+        return reconstructed
+
+    async def handle_request(self, request):
+        self.close_idle_sessions()
+        op = request.get('op')
+        name = str(request.get('session'))
+
+        if op == 'submit':
+            user = int(request['user'])
+            if 'master_share' in request:
+                shares = self.master_share_shares(user,
+                                                  request['master_share'])
+            else:
+                shares = {(i, q): share for i, q, share in request['shares']}
+            reconstructed = await self.submit(name, user, request['id'],
+                                              shares)
+            return {'session': name,
+                    'reconstructed': {str(i): secret
+                                      for i, secret in reconstructed.items()},
+                    'failed': self._failures(name)}
+        if op == 'status':
+            session = self.sessions.get(name)
+            if session is None:
+                raise ValueError('Unknown session %s' % name)
+            session.last_used = time.monotonic()
+            return {'session': name,
+                    'users': sorted(session.users),
+                    'reconstructed': {str(i): secret
+                                      for i, secret in session.secrets.items()},
+                    'failed': self._failures(name)}
+        if op == 'close':
+            return {'session': name,
+                    'closed': self.sessions.pop(name, None) is not None}
+        raise ValueError('Unknown operation %r' % op)
+
+    def _failures(self, name):
+        return {str(i): error
+                for i, error in self.sessions[name].failures.items()}
+
+    async def handle_connection(self, reader, writer):
+        """ serve JSON requests of one client, one per line """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = await self.handle_request(json.loads(line))
+                except (ValueError, KeyError, TypeError, IndexError,
+                        ArithmeticError, AssertionError) as e:
+                    response = {'error': str(e) or e.__class__.__name__}
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def start(self, path=None, host='127.0.0.1', port=0):
+        """ listen on Unix socket path, or on TCP host and port """
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle_connection,
+                                                   path)
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+
+async def serve(public_info_file, path=None, host='127.0.0.1', port=0,
+                session_ttl=SESSION_TTL):
+    service = CombinerService.from_file(public_info_file)
+    service.session_ttl = session_ttl
+    server = await service.start(path, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Reconstruct secrets from shares submitted over a socket.')
+    parser.add_argument('public_info', help='public info file, e.g. public_info.mss')
+    parser.add_argument('--unix', help='path of Unix socket to listen on')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7373)
+    parser.add_argument('--session-ttl', type=float, default=SESSION_TTL,
+                        help='close sessions idle for this many seconds')
+    args = parser.parse_args(argv)
+
+    asyncio.run(serve(args.public_info, args.unix, args.host, args.port,
+                      args.session_ttl))
+
+
+if __name__ == "__main__":
+    main()
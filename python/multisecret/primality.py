@@ -2,16 +2,43 @@
 # https://rosettacode.org/wiki/Miller%E2%80%93Rabin_primality_test
 
 import random
- 
-_mrpt_num_trials = 5 # number of bases to test
- 
-def is_probable_prime(n):
+from math import isqrt
+
+_mrpt_num_trials = 5 # number of bases to test above deterministic range
+
+# Miller-Rabin with all prime bases up to 41 is deterministic below this bound
+# (Sorenson, Webster 2015)
+_DETERMINISTIC_BOUND = 3317044064679887385961981
+_DETERMINISTIC_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+
+_SMALL_PRIME_LIMIT = 1000
+
+
+def _small_primes(limit):
+    """ sieve of Eratosthenes, primes less than limit """
+    sieve = bytearray([1]) * limit
+    sieve[0:2] = b'\x00\x00'
+    for i in range(2, isqrt(limit - 1) + 1):
+        if sieve[i]:
+            sieve[i * i::i] = bytes(len(range(i * i, limit, i)))
+    return tuple(i for i, is_prime in enumerate(sieve) if is_prime)
+
+
+SMALL_PRIMES = _small_primes(_SMALL_PRIME_LIMIT)
+
+
+def is_probable_prime(n, baillie_psw=False):
     """
     Miller-Rabin primality test.
- 
+
     A return value of False means n is certainly not prime. A return value of
-    True means n is very likely a prime.
- 
+    True means n is very likely a prime. Trial division by small primes is
+    done first. Below 3.3*10^24 fixed bases make the test deterministic.
+    Above it random bases are used, or Baillie-PSW test if baillie_psw is set.
+    Miller-Rabin rejects Carmichael numbers like any other composite, it is
+    the Baillie-PSW test (no composite passing it is known) which makes
+    the answer for large n reliable, not the choice of bases.
+
     >>> is_probable_prime(1)
     Traceback (most recent call last):
         ...
@@ -26,19 +53,19 @@ def is_probable_prime(n):
     True
     >>> is_probable_prime(123456789)
     False
- 
+
     >>> primes_under_1000 = [i for i in range(2, 1000) if is_probable_prime(i)]
     >>> len(primes_under_1000)
     168
     >>> primes_under_1000[-10:]
     [937, 941, 947, 953, 967, 971, 977, 983, 991, 997]
- 
+
     >>> is_probable_prime(6438080068035544392301298549614926991513861075340134\
 3291807343952413826484237063006136971539473913409092293733259038472039\
 7133335969549256322620979036686633213903952966175107096769180017646161\
 851573147596390153)
     True
- 
+
     >>> is_probable_prime(7438080068035544392301298549614926991513861075340134\
 3291807343952413826484237063006136971539473913409092293733259038472039\
 7133335969549256322620979036686633213903952966175107096769180017646161\
@@ -46,53 +73,124 @@ def is_probable_prime(n):
     False
     """
     assert n >= 2
-    # special case 2
-    if n == 2:
+
+    # trial division, handles 2 and all small primes
+    for prime in SMALL_PRIMES:
+        if n % prime == 0:
+            return n == prime
+    if n < _SMALL_PRIME_LIMIT * _SMALL_PRIME_LIMIT:
         return True
-    # ensure n is odd
-    if n % 2 == 0:
+
+    if n < _DETERMINISTIC_BOUND:
+        return not any(_is_composite_witness(a, n)
+                       for a in _DETERMINISTIC_BASES)
+
+    if baillie_psw:
+        # strong probable prime to base 2 and strong Lucas probable prime
+        return (not _is_composite_witness(2, n)
+                and _is_strong_lucas_probable_prime(n))
+
+    # base 2 first, as it finds most composites
+    if _is_composite_witness(2, n):
         return False
+    for i in range(_mrpt_num_trials - 1):
+        a = random.randrange(3, n - 1)
+        if _is_composite_witness(a, n):
+            return False
+
+    return True # no base tested showed n as composite
+
+
+def _is_composite_witness(a, n):
+    """ test the base a to see whether it is a witness for the compositeness
+        of odd n, n - 1 = 2**s * d """
     # write n-1 as 2**s * d
-    # repeatedly try to divide n-1 by 2
-    s = 0
-    d = n-1
+    d = n - 1
+    s = (d & -d).bit_length() - 1
+    d >>= s
+
+    x = pow(a, d, n)
+    if x == 1 or x == n - 1:
+        return False
+    # a^(2^i * d) by squaring the previous value
+    for _ in range(s - 1):
+        x = x * x % n
+        if x == n - 1:
+            return False
+    return True # n is definitely composite
+
+
+def _jacobi(a, n):
+    """ Jacobi symbol (a/n) for odd n > 0 """
+    a %= n
+    result = 1
+    while a:
+        while a % 2 == 0:
+            a //= 2
+            if n % 8 in (3, 5):
+                result = -result
+        a, n = n, a
+        if a % 4 == 3 and n % 4 == 3:
+            result = -result
+        a %= n
+    return result if n == 1 else 0
+
+
+def _is_strong_lucas_probable_prime(n):
+    """ strong Lucas test with Selfridge parameters, for odd n
+        with no small factors """
+    if isqrt(n) ** 2 == n:
+        return False
+
+    # first D in 5, -7, 9, -11, ... with Jacobi symbol (D/n) = -1
+    D = 5
     while True:
-        quotient, remainder = divmod(d, 2)
-        if remainder == 1:
+        jacobi = _jacobi(D, n)
+        if jacobi == -1:
             break
-        s += 1
-        d = quotient
-    assert(2**s * d == n-1)
- 
-    # test the base a to see whether it is a witness for the compositeness of n
-    def try_composite(a):
-        if pow(a, d, n) == 1:
-            return False
-        for i in range(s):
-            if pow(a, 2**i * d, n) == n-1:
-                return False
-        return True # n is definitely composite
- 
-    for i in range(_mrpt_num_trials):
-        a = random.randrange(2, n)
-        if try_composite(a):
-            return False
- 
-    return True # no base tested showed n as composite
-    
-                  
+        if jacobi == 0:
+            return False # gcd(D, n) > 1
+        D = -D - 2 if D > 0 else -D + 2
+    P = 1
+    Q = (1 - D) // 4
+
+    # write n+1 as 2**s * d
+    d = n + 1
+    s = (d & -d).bit_length() - 1
+    d >>= s
+
+    def half(x):
+        """ x / 2 modulo odd n """
+        return (x + n if x % 2 else x) // 2 % n
+
+    # U_k, V_k and Q^k for k = bits of d, most significant first
+    U, V, Q_k = 1, P, Q % n
+    for bit in bin(d)[3:]:
+        U, V, Q_k = U * V % n, (V * V - 2 * Q_k) % n, Q_k * Q_k % n
+        if bit == '1':
+            U, V = half(P * U + V), half(D * U + P * V)
+            Q_k = Q_k * Q % n
+
+    if U == 0 or V == 0:
+        return True
+    for _ in range(s - 1):
+        V = (V * V - 2 * Q_k) % n
+        if V == 0:
+            return True
+        Q_k = Q_k * Q_k % n
+    return False
+
+
 def is_prime(n):
     """ slow, deterministic prime check, superceded by Rabin-Miller """
     if n == 2 or n == 3: return True
     if n < 2 or n%2 == 0: return False
     if n < 9: return True
     if n%3 == 0: return False
-    r = int(n**0.5)
+    r = isqrt(n)
     f = 5
     while f <= r:
-        print ('\t',f)
         if n%f == 0: return False
         if n%(f+2) == 0: return False
         f +=6
-        return True
-    
\ No newline at end of file
+    return True
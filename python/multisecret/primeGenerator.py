@@ -0,0 +1,111 @@
+""" Generation of primes for the field of a secret sharing scheme.
+
+    Candidates are taken from a window of consecutive odd numbers.
+    Multiples of small primes are sieved out of the whole window at once,
+    only the remaining candidates are tested with Miller-Rabin.
+"""
+
+from secrets import randbits
+from concurrent.futures import ProcessPoolExecutor
+
+from multisecret.primality import is_probable_prime, SMALL_PRIMES
+
+# number of odd candidates in one sieve window
+WINDOW_SIZE = 4096
+
+# participant IDs are random elements of the field, they should collide
+# with probability at most 2^-ID_COLLISION_BITS
+ID_COLLISION_BITS = 40
+
+# master shares, IDs and hash outputs of Roy-Adhikari and Lin-Yeh
+# are elements of the field, a smaller p makes them feasible to brute-force
+SECURITY_MINIMUM = 2 ** 128
+
+
+def _sieve_window(start, size):
+    """ candidates start, start+2, ... start+2*(size-1) (start odd)
+        without a factor from SMALL_PRIMES """
+    candidate = bytearray([1]) * size
+    for prime in SMALL_PRIMES[1:]:
+        # index of the first odd multiple of prime in the window
+        first = (-start) % prime
+        if first % 2:
+            first += prime
+        first //= 2
+        # a small prime itself is not sieved out
+        if start + 2 * first == prime:
+            first += prime
+        candidate[first::prime] = bytes(len(range(first, size, prime)))
+    return [start + 2 * i for i, is_candidate in enumerate(candidate)
+            if is_candidate]
+
+
+def _first_prime_in_window(start, size=WINDOW_SIZE, stop=None):
+    """ smallest prime in a window of odd numbers from odd start,
+        less than stop, or None """
+    for n in _sieve_window(start, size):
+        if stop is not None and n >= stop:
+            return None
+        if is_probable_prime(n):
+            return n
+    return None
+
+
+def next_prime(n):
+    """ smallest prime greater or equal to n """
+    if n <= 2:
+        return 2
+    start = n | 1
+    while True:
+        prime = _first_prime_in_window(start)
+        if prime is not None:
+            return prime
+        start += 2 * WINDOW_SIZE
+
+
+def _random_window_start(bits):
+    """ random odd number with exactly the given bit length """
+    return randbits(bits - 1) | (1 << (bits - 1)) | 1
+
+
+def _search_random_window(bits):
+    return _first_prime_in_window(_random_window_start(bits), stop=1 << bits)
+
+
+def random_prime(bits, max_workers=None):
+    """ random prime with exactly the given bit length.
+        With max_workers, that many windows are searched in parallel
+        processes and the first prime found is returned. """
+    if bits < 2:
+        raise ValueError('A prime has at least 2 bits!')
+    if bits < 12:
+        # too few numbers for windows, choose from a list
+        primes = [p for p in range(1 << (bits - 1), 1 << bits)
+                  if is_probable_prime(p)]
+        return primes[randbits(16) % len(primes)]
+
+    if max_workers is None:
+        while True:
+            prime = _search_random_window(bits)
+            if prime is not None:
+                return prime
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        while True:
+            for prime in executor.map(_search_random_window,
+                                      [bits] * max_workers):
+                if prime is not None:
+                    return prime
+
+
+def field_prime(s_secrets, n_participants, minimum=SECURITY_MINIMUM,
+                id_collision_bits=ID_COLLISION_BITS):
+    """ Smallest prime p for which a split is still correct and secure:
+        - all secrets and participant numbers are less than p,
+        - p > minimum (2^128 by default, also enough for AES-128 keys),
+        - n random IDs in Zp collide with probability at most
+          2^-id_collision_bits (birthday bound n^2 / 2p)
+    """
+    bound = max(max(s_secrets), n_participants, minimum,
+                n_participants * n_participants << max(id_collision_bits - 1, 0))
+    return next_prime(bound + 1)
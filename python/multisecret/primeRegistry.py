@@ -0,0 +1,79 @@
+""" Catalog of well-known primes and cached primality verification.
+
+    Primes in the catalog are trusted without testing. Primes supplied by
+    the user are tested with Miller-Rabin once and remembered, so creating
+    many Dealers with the same p is cheap.
+"""
+
+from functools import lru_cache
+
+from multisecret.primality import is_probable_prime
+
+PRIME_CACHE_SIZE = 128
+
+# NIST elliptic curve primes
+P192 = 2 ** 192 - 2 ** 64 - 1
+P224 = 2 ** 224 - 2 ** 96 + 1
+P256 = 2 ** 256 - 2 ** 224 + 2 ** 192 + 2 ** 96 - 1
+P384 = 2 ** 384 - 2 ** 128 - 2 ** 96 + 2 ** 32 - 1
+P521 = 2 ** 521 - 1
+
+# Mersenne primes
+M61 = 2 ** 61 - 1
+M89 = 2 ** 89 - 1
+M107 = 2 ** 107 - 1
+M127 = 2 ** 127 - 1
+
+# smallest primes above powers of two
+P64_PLUS = 2 ** 64 + 13
+P128_PLUS = 2 ** 128 + 51
+
+KNOWN_PRIMES = {
+    'M61': M61,
+    'P64+': P64_PLUS,
+    'M89': M89,
+    'M107': M107,
+    'M127': M127,
+    'P128+': P128_PLUS,
+    'P-192': P192,
+    'P-224': P224,
+    'P-256': P256,
+    'P-384': P384,
+    'P-521': P521,
+}
+
+_known_prime_values = frozenset(KNOWN_PRIMES.values())
+
+
+def is_known_prime(p):
+    """ True if p is in the catalog of pre-verified primes """
+    return p in _known_prime_values
+
+
+@lru_cache(maxsize=PRIME_CACHE_SIZE)
+def _verify_prime(p):
+    return is_probable_prime(p)
+
+
+def is_verified_prime(p):
+    """ Primality check for a field prime: catalog primes are accepted
+        at once, results for other numbers are cached """
+    if p in _known_prime_values:
+        return True
+    return _verify_prime(p)
+
+
+def verification_cache_info():
+    return _verify_prime.cache_info()
+
+
+def verification_cache_clear():
+    _verify_prime.cache_clear()
+
+
+def smallest_known_prime(bits):
+    """ smallest prime in the catalog with at least the given bit length """
+    candidates = [p for p in _known_prime_values if p.bit_length() >= bits]
+    if not candidates:
+        raise ValueError('No known prime of %d bits or more' % bits)
+    return min(candidates)
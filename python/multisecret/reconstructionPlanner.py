@@ -0,0 +1,163 @@
+""" Reconstruction from the participants who are present.
+
+    For each secret the planner finds the access groups whose members
+    all gave their shares (threshold of them for a ThresholdGroup, or ones
+    satisfying the formula of a PolicyGroup),
+    and picks the cheapest one - the one needing fewest shares, as combine
+    work grows with their number. Only the shares used are touched,
+    other participants may be missing.
+"""
+
+import multisecret.MultiSecretCommon as common
+from multisecret.accessPlan import compile_access_structures
+from multisecret.accessPlan import group_cost, group_members_needed
+import multisecret.MultiSecretRoyAdhikari
+import multisecret.MultiSecretLinYeh
+import multisecret.MultiSecretHerranzRuizSaez
+
+DEALER_CLASSES = {
+    'Roy-Adhikari': multisecret.MultiSecretRoyAdhikari.Dealer,
+    'Lin-Yeh': multisecret.MultiSecretLinYeh.Dealer,
+    'Herranz-Ruiz-Saez': multisecret.MultiSecretHerranzRuizSaez.Dealer,
+}
+
+
+def create_combiner(public_info):
+    """ Dealer of the algorithm from public info, ready to take shares """
+    access_structures = public_info['access_structures']
+    dealer_class = DEALER_CLASSES[public_info['algorithm']]
+    combiner = dealer_class(
+        public_info['prime'],
+        common.user_count_from_access_structure(access_structures),
+        [0] * len(access_structures),
+        access_structures)
+    combiner.public_shares_M = public_info['public_shares_M']
+    combiner.random_id = [None] * combiner.n
+    if hasattr(combiner, 'hash_aes_nonce'):
+        # nonce of the dealer, pseudo shares are derived from master shares
+        # with it. None if not published.
+        combiner.hash_aes_nonce = public_info.get('hash_nonce')
+    return combiner
+
+
+def qualified_groups(access_structures, i_secret, participants):
+    """ indexes q of groups of secret i qualified by participants """
+    access_plan = compile_access_structures(access_structures)
+    return _qualified_groups(access_plan, i_secret,
+                             access_plan.participants_mask(participants))
+
+
+def _qualified_groups(access_plan, i_secret, participants_mask):
+    return [q for q in range(len(access_plan[i_secret]))
+            if access_plan.is_qualified(i_secret, q, participants_mask)]
+
+
+def cheapest_group(access_structures, i_secret, participants):
+    """ index of the qualified group of secret i needing fewest shares,
+        or None """
+    access_plan = compile_access_structures(access_structures)
+    return _cheapest_group(access_plan, i_secret,
+                           access_plan.participants_mask(participants))
+
+
+def _cheapest_group(access_plan, i_secret, participants_mask):
+    groups = _qualified_groups(access_plan, i_secret, participants_mask)
+    if not groups:
+        return None
+    return min(groups, key=lambda q: group_cost(access_plan[i_secret][q]))
+
+
+def plan_reconstruction(access_structures, participants, secrets=None):
+    """ {secret: group} to combine each of secrets (all by default)
+        from shares of participants. Secrets which participants
+        cannot reconstruct are left out. """
+    access_plan = compile_access_structures(access_structures)
+    # participants are checked against bitsets of group members
+    participants_mask = access_plan.participants_mask(participants)
+    if secrets is None:
+        secrets = range(len(access_plan))
+    plan = {}
+    for i in secrets:
+        q = _cheapest_group(access_plan, i, participants_mask)
+        if q is not None:
+            plan[i] = q
+    return plan
+
+
+def participants_needed(access_structures, plan, participants=None):
+    """ sorted list of participants whose shares a plan uses.
+        For a ThresholdGroup or PolicyGroup only members needed
+        among participants (all members by default) are used. """
+    needed = set()
+    for i, q in plan.items():
+        needed.update(_members_used(access_structures[i][q], participants))
+    return sorted(needed)
+
+
+def _members_used(group, participants=None):
+    """ members of a group among participants used to combine it,
+        None if participants are not qualified """
+    if participants is None:
+        participants = group
+    return group_members_needed(group, participants)
+
+
+def obtained_shares(combiner, user_data):
+    """ Put IDs and shares of participants in user_data into combiner.
+        Returns a share store of the algorithm (key shares for HRS,
+        pseudo shares otherwise) with None for shares of missing users. """
+    store = combiner.new_share_store()
+    if isinstance(combiner, multisecret.MultiSecretHerranzRuizSaez.Dealer):
+        combiner.key_shares = store
+    else:
+        combiner.pseudo_shares = store
+    for participant, data in user_data.items():
+        combiner.random_id[participant - 1] = data['id']
+        combiner.set_pseudo_shares_from_participant(
+            participant, participant_shares(combiner, participant, data))
+    return store
+
+
+def participant_shares(combiner, participant, data):
+    """ shares {(secret, group): share} of a participant, derived from
+        his master share if the user file holds only the master share """
+    if data.get('master_share') is not None:
+        return combiner.pseudo_shares_from_master_share(participant,
+                                                        data['master_share'])
+    return data['shares']
+
+
+def _share_for_group(combiner, data, i_secret, q_group):
+    if data.get('master_share') is not None:
+        return combiner.pseudo_share_from_master_share(i_secret, q_group,
+                                                       data['master_share'])
+    return common.share_for_group(data['shares'], i_secret, q_group)
+
+
+def combine_planned(combiner, i_secret, q_group, user_data):
+    """ Combine secret i from group q. user_data maps members of the group
+        to {'id': ID, 'shares': {(secret, group): share}} or
+        {'id': ID, 'master_share': x}, as read from a user share file.
+        All members are needed, threshold of them for a ThresholdGroup,
+        or ones satisfying a policy. Shares are added in any order. """
+    group = combiner.access_structures[i_secret][q_group]
+    members = _members_used(group, user_data)
+    if members is None:
+        missing = [Pb for Pb in group if Pb not in user_data]
+        raise ValueError('No shares of participant %d' % missing[0])
+    accumulator = combiner.new_accumulator(i_secret, q_group)
+    for participant in members:
+        combiner.random_id[participant - 1] = user_data[participant]['id']
+        combiner.accumulate_share(
+            accumulator, i_secret, q_group, participant,
+            _share_for_group(combiner, user_data[participant],
+                             i_secret, q_group))
+    return combiner.combine_accumulated(i_secret, accumulator)
+
+
+def combine_present(combiner, user_data, secrets=None):
+    """ {secret: value} of secrets (all by default) which participants
+        in user_data can reconstruct, each from its cheapest group """
+    plan = plan_reconstruction(combiner.access_structures, user_data, secrets)
+    return {i: combine_planned(combiner, i, q, user_data)
+            for i, q in plan.items()}
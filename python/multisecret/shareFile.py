@@ -0,0 +1,308 @@
+""" Compact binary container for public information and user shares.
+
+    All integers are big-endian. Field elements are stored with a fixed width
+    equal to the byte length of the prime p.
+
+    header:
+        magic       4 bytes   b'MSSF'
+        version     uint8
+        kind        uint8     KIND_PUBLIC_INFO, KIND_USER_SHARES
+                              or KIND_MASTER_SHARE
+        algorithm   uint8     index in ALGORITHMS
+        flags       uint8     FLAG_BYTES_ID, FLAG_BYTES_SHARES,
+                              FLAG_HASH_NONCE
+        width       uint16    field element width in bytes
+        prime       width bytes
+
+    public info body:
+        layout      uint32 secret count,
+                    per secret: uint32 group count,
+                    per group: uint32 member count, uint32 threshold
+                    (equal to member count unless it is a ThresholdGroup,
+                    0 for a PolicyGroup), uint32 each member,
+                    PolicyGroup formula in pre-order: uint32 threshold
+                    and uint32 child count of a gate, uint32 0 for a leaf
+                    (participants of leaves are the members in order)
+        with FLAG_HASH_NONCE: uint8 length and hash nonce
+        Roy-Adhikari, Lin-Yeh: public share M for each [i][q][b] in layout order
+        Herranz-Ruiz-Saez: per secret uint32 length and ciphertext
+
+    user shares body:
+        uint32 user, user ID, uint32 share count,
+        per share: uint32 secret, uint32 group, share
+
+    master share body (Roy-Adhikari, size does not depend on the number
+    of secrets and groups - pseudo shares are derived by the combiner
+    with the hash nonce from public info):
+        uint32 user, user ID, master share x
+"""
+
+import struct
+
+import multisecret.byteHelper as bytehelper
+import multisecret.MultiSecretCommon as common
+from multisecret.accessPlan import ThresholdGroup, group_threshold
+from multisecret.accessPolicy import Gate, PolicyGroup
+from multisecret.byteHelper import element_width
+
+MAGIC = b'MSSF'
+VERSION = 1
+
+KIND_PUBLIC_INFO = 1
+KIND_USER_SHARES = 2
+KIND_MASTER_SHARE = 3
+
+ALGORITHMS = ('Roy-Adhikari', 'Lin-Yeh', 'Herranz-Ruiz-Saez')
+
+# user ID and user shares are returned as bytes if they were saved
+# as bytes objects (like in Roy-Adhikari and Lin-Yeh), otherwise as int
+FLAG_BYTES_ID = 0x01
+FLAG_BYTES_SHARES = 0x02
+# public info holds the nonce of the hash deriving pseudo shares
+FLAG_HASH_NONCE = 0x04
+
+_HEADER = struct.Struct('>4sBBBBH')
+_UINT32 = struct.Struct('>I')
+_SHARE_RECORD = struct.Struct('>II')
+
+
+def _read_exactly(file, size):
+    data = file.read(size)
+    if len(data) != size:
+        raise ValueError('Share file is truncated!')
+    return data
+
+
+def _read_uint32(file):
+    return _UINT32.unpack(_read_exactly(file, _UINT32.size))[0]
+
+
+def _write_header(file, kind, algorithm, prime, flags=0):
+    width = element_width(prime)
+    file.write(_HEADER.pack(MAGIC, VERSION, kind,
+                            ALGORITHMS.index(algorithm), flags, width))
+    file.write(prime.to_bytes(width, byteorder='big'))
+
+
+def _write_layout(file, access_structures):
+    file.write(_UINT32.pack(len(access_structures)))
+    for gamma in access_structures:
+        file.write(_UINT32.pack(len(gamma)))
+        for A in gamma:
+            file.write(_UINT32.pack(len(A)))
+            if hasattr(A, 'policy'):
+                file.write(_UINT32.pack(0))
+            else:
+                file.write(_UINT32.pack(group_threshold(A)))
+            file.write(struct.pack('>%dI' % len(A), *A))
+            if hasattr(A, 'policy'):
+                _write_gate(file, A.policy)
+
+
+def _write_gate(file, gate):
+    file.write(struct.pack('>II', gate.threshold, len(gate.children)))
+    for child in gate.children:
+        if isinstance(child, Gate):
+            _write_gate(file, child)
+        else:
+            file.write(_UINT32.pack(0))
+
+
+def _read_header(file, expected_kinds):
+    magic, version, kind, algorithm, flags, width = _HEADER.unpack(
+        _read_exactly(file, _HEADER.size))
+    if magic != MAGIC:
+        raise ValueError('Not a multi-secret share file!')
+    if version != VERSION:
+        raise ValueError('Unsupported share file version %d' % version)
+    if kind not in expected_kinds:
+        raise ValueError('Wrong kind of share file')
+    if algorithm >= len(ALGORITHMS):
+        raise ValueError('Unknown algorithm %d in share file' % algorithm)
+
+    return {'algorithm': ALGORITHMS[algorithm],
+            'kind': kind,
+            'width': width,
+            'flags': flags,
+            'prime': int.from_bytes(_read_exactly(file, width),
+                                    byteorder='big')}
+
+
+def _read_layout(file):
+    access_structures = []
+    for _ in range(_read_uint32(file)):
+        gamma = []
+        for _ in range(_read_uint32(file)):
+            member_count = _read_uint32(file)
+            threshold = _read_uint32(file)
+            members = list(struct.unpack(
+                '>%dI' % member_count,
+                _read_exactly(file, 4 * member_count)))
+            if threshold == 0:
+                members = _read_policy_group(file, members)
+            elif threshold != member_count:
+                members = ThresholdGroup(members, threshold)
+            gamma.append(members)
+        access_structures.append(gamma)
+    return access_structures
+
+
+def _read_gate(file, leaves):
+    threshold = _read_uint32(file)
+    if threshold == 0:
+        try:
+            return next(leaves)
+        except StopIteration:
+            raise ValueError('Policy has more leaves than group members!')
+    children = [_read_gate(file, leaves) for _ in range(_read_uint32(file))]
+    return Gate(threshold, children)
+
+
+def _read_policy_group(file, members):
+    leaves = iter(members)
+    policy = _read_gate(file, leaves)
+    if not isinstance(policy, Gate):
+        raise ValueError('Policy of a group must be a gate!')
+    group = PolicyGroup(policy)
+    if list(group) != members:
+        raise ValueError('Policy leaves do not match group members!')
+    return group
+
+
+def _decode_element(data, as_bytes):
+    if as_bytes:
+        return bytes(data)
+    return int.from_bytes(data, byteorder='big')
+
+
+def write_public_info(file, prime, algorithm, access_structures,
+                      public_shares_M, hash_nonce=None):
+    """ Write data published by the dealer to a binary file object.
+        hash_nonce is needed to derive pseudo shares from master shares. """
+    hrs = algorithm == 'Herranz-Ruiz-Saez'
+    flags = 0 if hash_nonce is None else FLAG_HASH_NONCE
+    _write_header(file, KIND_PUBLIC_INFO, algorithm, prime, flags)
+    _write_layout(file, access_structures)
+    if hash_nonce is not None:
+        file.write(bytes([len(hash_nonce)]) + hash_nonce)
+
+    if hrs:
+        # public shares are ciphertexts of variable length
+        for ciphertext in public_shares_M:
+            file.write(_UINT32.pack(len(ciphertext)))
+            file.write(ciphertext)
+    else:
+        width = element_width(prime)
+        body = bytearray()
+        for i, gamma in enumerate(access_structures):
+            for q, A in enumerate(gamma):
+                for b, _ in enumerate(A):
+                    body += bytehelper.element_to_bytes(public_shares_M[i][q][b], width)
+        file.write(body)
+
+
+def read_public_info(file):
+    """ Returns a dictionary with prime, algorithm, access_structures,
+        public_shares_M and hash_nonce (None if not saved)
+        read from a binary file object """
+    header = _read_header(file, (KIND_PUBLIC_INFO,))
+    width = header['width']
+    access_structures = _read_layout(file)
+    hash_nonce = None
+    if header['flags'] & FLAG_HASH_NONCE:
+        hash_nonce = _read_exactly(file, _read_exactly(file, 1)[0])
+
+    if header['algorithm'] == 'Herranz-Ruiz-Saez':
+        public_shares_M = [_read_exactly(file, _read_uint32(file))
+                           for _ in access_structures]
+    else:
+        member_count = sum(len(A) for gamma in access_structures for A in gamma)
+        body = memoryview(_read_exactly(file, member_count * width))
+        offset = 0
+        public_shares_M = []
+        for gamma in access_structures:
+            public_gamma = []
+            for A in gamma:
+                public_A = []
+                for _ in A:
+                    public_A.append(int.from_bytes(body[offset:offset + width],
+                                                   byteorder='big'))
+                    offset += width
+                public_gamma.append(public_A)
+            public_shares_M.append(public_gamma)
+
+    return {'prime': header['prime'],
+            'algorithm': header['algorithm'],
+            'access_structures': access_structures,
+            'public_shares_M': public_shares_M,
+            'hash_nonce': hash_nonce}
+
+
+def write_user_shares(file, prime, algorithm, user, user_id, shares):
+    """ Write ID and shares {(secret, group): share} of a single user
+        to a binary file object """
+    width = element_width(prime)
+    flags = 0
+    if isinstance(user_id, (bytes, bytearray)):
+        flags |= FLAG_BYTES_ID
+    if any(isinstance(share, (bytes, bytearray)) for share in shares.values()):
+        flags |= FLAG_BYTES_SHARES
+    _write_header(file, KIND_USER_SHARES, algorithm, prime, flags)
+
+    body = bytearray()
+    body += _UINT32.pack(user)
+    body += bytehelper.element_to_bytes(user_id, width)
+    body += _UINT32.pack(len(shares))
+    for (i_secret, q_group), share in sorted(shares.items()):
+        body += _SHARE_RECORD.pack(i_secret, q_group)
+        body += bytehelper.element_to_bytes(share, width)
+    file.write(body)
+
+
+def write_master_share(file, prime, algorithm, user, user_id, master_share):
+    """ Write ID and master share x of a single user to a binary file
+        object, instead of all his pseudo shares.
+        Raises ValueError if the field is too small for that. """
+    common.check_master_share_field(prime)
+    width = element_width(prime)
+    flags = FLAG_BYTES_ID if isinstance(user_id, (bytes, bytearray)) else 0
+    _write_header(file, KIND_MASTER_SHARE, algorithm, prime, flags)
+    file.write(_UINT32.pack(user)
+               + bytehelper.element_to_bytes(user_id, width)
+               + bytehelper.element_to_bytes(master_share, width))
+
+
+def read_user_shares(file):
+    """ Returns a dictionary with user number, ID and shares
+        {(secret, group): share} read from a binary file object.
+        For a master share file, shares are None and master_share is x,
+        otherwise master_share is None. """
+    header = _read_header(file, (KIND_USER_SHARES, KIND_MASTER_SHARE))
+    width = header['width']
+    flags = header['flags']
+
+    user = _read_uint32(file)
+    user_id = _decode_element(_read_exactly(file, width),
+                              flags & FLAG_BYTES_ID)
+    if header['kind'] == KIND_MASTER_SHARE:
+        return {'user': user,
+                'id': user_id,
+                'shares': None,
+                'master_share': int.from_bytes(_read_exactly(file, width),
+                                               byteorder='big'),
+                'prime': header['prime'],
+                'algorithm': header['algorithm']}
+
+    shares = {}
+    for _ in range(_read_uint32(file)):
+        i_secret, q_group = _SHARE_RECORD.unpack(
+            _read_exactly(file, _SHARE_RECORD.size))
+        shares[(i_secret, q_group)] = _decode_element(
+            _read_exactly(file, width), flags & FLAG_BYTES_SHARES)
+
+    return {'user': user,
+            'id': user_id,
+            'shares': shares,
+            'master_share': None,
+            'prime': header['prime'],
+            'algorithm': header['algorithm']}
@@ -1,8 +1,13 @@
+import os
+import threading
+
 from nose.tools import assert_equal
 from nose.tools import assert_not_equal
 from nose.tools import assert_raises
 from multisecret.MultiSecretRoyAdhikari import Dealer
 import multisecret.MultiSecretCommon as common
+import multisecret.byteHelper as bytehelper
+from multisecret.accessPlan import ThresholdGroup
 
 """ Declare basic params used to initialize Dealer in test cases """
 # large prime from NIST P-256 elliptic curve
@@ -23,6 +28,10 @@ def test_modulo_p():
     p = 1009
     dealer = Dealer(p, n_participants, s_secrets, access_structures)
     assert_equal(common.modulo_p(p, 2011), 1002)
+    # bytes in, bytes out, always as wide as p
+    assert_equal(common.modulo_p(p, (2011).to_bytes(2, 'big')), bytes([3, 0xea]))
+    assert_equal(common.modulo_p(p, bytes([0x03, 0xf1])), bytes([0, 0]))
+    assert_equal(common.modulo_p(p, bytes([0, 0, 7])), bytes([0, 7]))
 
 
 def test_list_of_random_in_modulo_p():
@@ -37,7 +46,8 @@ def test_list_of_random_in_modulo_p():
     # check the length of the list
     assert_equal(len(randomList), n)
     # check the type of object in the list
-    assert_equal(isinstance(randomList[0], bytes), True)
+    assert_equal(isinstance(randomList[0], int), True)
+    assert_equal(all(0 <= r < dealer.p for r in randomList), True)
 
     # dealer_short = Dealer(1009, 2, [13], [[(1,2), ()]])
     # randomListShort = dealer_short.list_of_random_in_modulo_p(n)
@@ -52,7 +62,7 @@ def test_provide_id():
     # check the length of the list
     assert_equal(len(id_list), n_participants)
     # check the type of object in the list
-    assert_equal(isinstance(id_list[0], bytes), True)
+    assert_equal(isinstance(id_list[0], int), True)
 
 
 def test_shamir_polynomial_compute():
@@ -71,3 +81,319 @@ def test_shamir_polynomial_compute():
     value = common.shamir_polynomial_compute(bytes([0x02]), coeffs,
                                              secret_value, dealer.p)
     assert_equal(value, 38 + s_secrets[0])
+
+
+def test_batch_inverse_modulo_p():
+    p = 1009
+    values = [5, 7, 1008, 1, 2011]
+    inverses = common.batch_inverse_modulo_p(values, p)
+
+    assert_equal(len(inverses), len(values))
+    for value, inverse in zip(values, inverses):
+        assert_equal((value * inverse) % p, 1)
+
+    # 0 has no inverse
+    with assert_raises(ValueError):
+        common.batch_inverse_modulo_p([3, 0, 4], p)
+
+
+def test_lagrange_coefficients_at_zero():
+    p = 41
+    ids = [1, 2, 3]
+    coefficients = common.lagrange_coefficients_at_zero(ids, p)
+    # c_b = prod ID_r / (ID_r - ID_b) gives 3, -3, 1
+    assert_equal(coefficients, [3, p - 3, 1])
+
+    # f(x) = 4 + 2x + x^2 interpolated at 0
+    values = [(4 + 2*x + x*x) % p for x in ids]
+    assert_equal(common.lagrange_interpolate_at_zero(values, coefficients, p), 4)
+
+    # duplicated IDs
+    with assert_raises(ValueError):
+        common.lagrange_coefficients_at_zero([5, 7, 5], p)
+
+
+def test_cached_lagrange_coefficients():
+    p = 41
+    common.lagrange_cache_clear()
+
+    first = common.cached_lagrange_coefficients([1, 2, 3], p)
+    second = common.cached_lagrange_coefficients([1, 2, 3], p)
+    assert_equal(list(first), common.lagrange_coefficients_at_zero([1, 2, 3], p))
+    assert_equal(first, second)
+
+    info = common.lagrange_cache_info()
+    assert_equal(info.misses, 1)
+    assert_equal(info.hits, 1)
+
+    # order of IDs and prime are part of the key
+    common.cached_lagrange_coefficients([3, 2, 1], p)
+    common.cached_lagrange_coefficients([1, 2, 3], 43)
+    assert_equal(common.lagrange_cache_info().misses, 3)
+
+
+def test_shamir_polynomial_compute_many():
+    p = 1009
+    coeffs = [bytes([0x05]), 7, 1008]
+    ids = [1, 2, bytes([0x03]), 1000]
+
+    values = common.shamir_polynomial_compute_many(ids, coeffs, 11, p)
+
+    assert_equal(len(values), len(ids))
+    for argument, value in zip(ids, values):
+        assert_equal(value,
+                     common.shamir_polynomial_compute(argument, coeffs, 11, p))
+    # 11 + 5*2 + 7*4 - 8 = 41
+    assert_equal(values[1], 41)
+
+
+def test_silent_by_default():
+    """ split and combine do not write anything to stdout """
+    import io
+    import contextlib
+
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        dealer = Dealer(p256, n_participants, s_secrets,
+                        [[[1, 3]], [[1, 2], [2, 3]], [[1, 2, 3]]])
+        dealer.split_secrets()
+        combined = dealer.combine_secret(2, 0, dealer.pseudo_shares[2][0])
+
+    assert_equal(combined, s_secrets[2])
+    assert_equal(output.getvalue(), '')
+
+
+def test_set_debug_logging():
+    import io
+    import logging
+
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    common.set_debug_logging(True, handler)
+    try:
+        # enabled twice, each line is still written once
+        common.set_debug_logging(True, handler)
+        common.set_debug_logging(True)
+        common.print_list_of_hex([bytes([0xab])], 'test ')
+    finally:
+        common.set_debug_logging(False)
+    common.print_list_of_hex([bytes([0xcd])], 'test ')
+
+    assert_equal(stream.getvalue(), 'test 0 = ab\n')
+
+
+def test_hash_many():
+    """ bulk hashing gives the same digests as AES-CTR(SHA256(m)) per message """
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+    nonce = bytes(range(16))
+    messages = [b'', b'BYTESEQUENCE', bytes([1, 2, 3]) * 50]
+
+    for hash_len in (12, 24, 256):
+        digests = common.hash_many(messages, hash_len, nonce)
+        assert_equal(len(digests), len(messages))
+
+        for message, digest in zip(messages, digests):
+            sha = hashes.Hash(hashes.SHA256(), backend=default_backend())
+            sha.update(message)
+            cipher = Cipher(algorithms.AES(sha.finalize()), modes.CTR(nonce),
+                            backend=default_backend())
+            encryptor = cipher.encryptor()
+            expected = encryptor.update(b'w' * 32) + encryptor.finalize()
+            expected = bytehelper.take_first_bits(expected, hash_len)
+
+            assert_equal(digest, expected)
+            assert_equal(common.hash(message, hash_len, nonce), expected)
+
+
+def test_participant_share_index():
+    access_structures = [[[1, 3]], [[1, 2], [2, 3, 1]]]
+    index = common.participant_share_index(access_structures)
+
+    assert_equal(index[1], [(0, 0, 0), (1, 0, 0), (1, 1, 2)])
+    assert_equal(index[2], [(1, 0, 1), (1, 1, 0)])
+    assert_equal(index[3], [(0, 0, 1), (1, 1, 1)])
+    assert_equal(4 in index, False)
+
+
+def test_random_source_seeded():
+    first = common.RandomSource(seed=2017)
+    second = common.RandomSource(seed=2017, pool_size=16)
+    assert_equal(first.read(100), second.read(100))
+    assert_equal(first.list_of_field_elements(p256, 10),
+                 second.list_of_field_elements(p256, 10))
+    assert_not_equal(common.RandomSource(seed=2018).read(32), first.read(32))
+
+    # large reads and reads crossing the pool boundary
+    assert_equal(len(second.read(1000)), 1000)
+    assert_equal(len(first.read(2 * common.RANDOM_POOL_SIZE)),
+                 2 * common.RANDOM_POOL_SIZE)
+
+
+def test_random_field_elements_uniform():
+    source = common.RandomSource(seed=b'uniform')
+    counts = [0] * 5
+    for element in source.list_of_field_elements(5, 5000):
+        counts[element] += 1
+    # p = 5 is just above a power of two, modulo would favour 0 heavily
+    for count in counts:
+        assert_equal(800 < count < 1200, True)
+
+    elements = source.list_of_field_elements(7, 6, distinct=True, minimum=1)
+    assert_equal(sorted(elements), [1, 2, 3, 4, 5, 6])
+    with assert_raises(ValueError):
+        source.list_of_field_elements(7, 7, distinct=True, minimum=1)
+
+    stream = common.random_field_elements(p256)
+    assert_equal(all(0 <= next(stream) < p256 for _ in range(100)), True)
+    assert_equal(len(list(common.random_field_elements(p256, 3))), 3)
+
+
+def test_set_random_seed_repeats_split():
+    shares = []
+    for _ in range(2):
+        common.set_random_seed(42)
+        dealer = Dealer(p256, n_participants, s_secrets,
+                        [[[1, 3]], [[1, 2], [2, 3]], [[1, 2, 3]]])
+        dealer.split_secrets()
+        shares.append((dealer.random_id, dealer.public_shares_M.to_nested()))
+    common.set_random_seed(None)
+
+    assert_equal(shares[0], shares[1])
+    assert_equal(common.random_source().seeded, False)
+
+
+def test_set_random_seed_repeats_parallel_split():
+    shares = []
+    for _ in range(2):
+        common.set_random_seed(42)
+        dealer = Dealer(p256, n_participants, s_secrets,
+                        [[[1, 3]], [[1, 2], [2, 3]], [[1, 2, 3]]])
+        dealer.split_secrets(parallel=True, max_workers=2)
+        shares.append((dealer.random_id, dealer.public_shares_M.to_nested()))
+    common.set_random_seed(None)
+
+    assert_equal(shares[0], shares[1])
+
+
+def test_random_source_threads_get_different_bytes():
+    source = common.RandomSource(pool_size=64)
+    chunks = []
+
+    def read_many():
+        for _ in range(2000):
+            chunks.append(source.read(16))
+
+    threads = [threading.Thread(target=read_many) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert_equal(len(set(chunks)), len(chunks))
+
+
+def test_random_source_not_shared_with_forked_child():
+    if not hasattr(os, 'fork'):
+        return
+    common.random_source().read(1)  # fill the pool in parent
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.write(write_end, common.random_source().read(32))
+        os._exit(0)
+    os.waitpid(pid, 0)
+    from_child = os.read(read_end, 32)
+    os.close(read_end)
+    os.close(write_end)
+
+    assert_not_equal(from_child, common.random_source().read(32))
+
+
+def test_lagrange_accumulator():
+    p = 41
+    ids = [1, 2, 3]
+    values = [(4 + 2*x + x*x) % p for x in ids]
+
+    # shares arrive in any order
+    accumulator = common.LagrangeAccumulator(p, len(ids))
+    for b in [2, 0, 1]:
+        assert_equal(accumulator.complete, False)
+        with assert_raises(ValueError):
+            accumulator.result()
+        accumulator.add(b, ids[b], values[b])
+    assert_equal(accumulator.complete, True)
+    assert_equal(accumulator.result(), 4)
+
+    with assert_raises(ValueError):
+        accumulator.add(0, ids[0], values[0])
+
+    # duplicated IDs
+    accumulator = common.LagrangeAccumulator(p, 2)
+    accumulator.add(0, 5, 1)
+    accumulator.add(1, 5, 2)
+    with assert_raises(ValueError):
+        accumulator.result()
+
+
+def test_complete_groups():
+    access_structures = [[[1, 2, 3], [1, 3]], [[2, 3]], [[1, 2]]]
+    obtained = [[[5, None, 6], [5, 6]], [[None, 6]], [[5, 7]]]
+    # smallest complete group of each secret, secret 1 is left out
+    assert_equal(common.complete_groups(access_structures, obtained),
+                 {0: 1, 2: 0})
+
+
+def test_lagrange_coefficient_table():
+    p = 41
+    ids = {1: 1, 2: 2, 3: 3}
+    decoded = []
+
+    def get_id_int(participant):
+        decoded.append(participant)
+        return ids[participant]
+
+    table = common.LagrangeCoefficientTable(get_id_int, p)
+    assert_equal(table[[1, 2, 3]], [3, p - 3, 1])
+    table[(1, 2, 3)]
+    table[[1, 3]]
+    # each ID decoded once, each member set computed once
+    assert_equal(sorted(decoded), [1, 2, 3])
+    assert_equal(len(table.coefficients), 2)
+
+
+def test_shamir_polynomial_compute_many_with_powers():
+    p = 1009
+    coeffs = [5, 700, 13]
+    ids = [3, 1000, 77]
+    power_table = {}
+    expected = [(42 + 5 * x + 700 * x ** 2 + 13 * x ** 3) % p for x in ids]
+
+    assert_equal(common.shamir_polynomial_compute_many(ids, coeffs, 42, p,
+                                                       power_table), expected)
+    assert_equal(power_table[3], [3, 9, 27])
+    # powers are extended for a longer polynomial
+    common.id_powers(power_table, 3, 4, p)
+    assert_equal(power_table[3], [3, 9, 27, 81])
+
+
+def test_threshold_accumulator_and_select_shares():
+    p = 41
+    # f(x) = 4 + 2x, any 2 of 3 points
+    group = ThresholdGroup([1, 2, 3], 2)
+    values = [(4 + 2*x) % p for x in group]
+
+    accumulator = common.LagrangeAccumulator(p, len(group), 2)
+    accumulator.add(2, 3, values[2])
+    accumulator.add(0, 1, values[0])
+    assert_equal(accumulator.complete, True)
+    assert_equal(accumulator.result(), 4)
+
+    assert_equal(common.select_shares(group, [None, 8, 10]),
+                 [(1, 2, 8), (2, 3, 10)])
+    with assert_raises(ValueError):
+        common.select_shares(group, [None, 8, None])
+    assert_equal(common.complete_groups([[[1, 2], group]],
+                                        [[[None, 8], [6, None, 10]]]), {0: 1})
@@ -5,6 +5,7 @@ from nose.tools import assert_equal
 from nose.tools import assert_raises
 
 from multisecret.MultiSecretHerranzRuizSaez import Dealer
+from multisecret.accessPlan import ThresholdGroup
 import multisecret.MultiSecretCommon as common
 
 """ Declare basic params used to initialize Dealer in test cases """
@@ -184,3 +185,98 @@ def test_combine_secret_3_users():
     assert_equal(secret0, secrets[0])
 
 
+def test_combine_secret_not_contiguous_group():
+    """ key shares are computed at IDs of group members, not first users """
+    secrets = [7, 9]
+    dealer = Dealer(p256, 3, secrets, [[[1, 3]], [[2, 3]]])
+    dealer.split_secrets()
+
+    for i_secret, secret in enumerate(secrets):
+        shares = dealer.key_shares[i_secret][0]
+        secret_key = dealer.combine_secret_key(i_secret, shares)
+        assert_equal(secret_key.to_bytes(dealer.AES_KEY_LEN, byteorder='big'),
+                     dealer.cipher_keys[i_secret])
+
+
+def test_combine_accumulated():
+    """ key shares added one at a time """
+    secrets = [7, 9]
+    dealer = Dealer(p256, 3, secrets, [[[1, 3]], [[1, 2, 3]]])
+    dealer.split_secrets()
+
+    for i_secret, secret in enumerate(secrets):
+        group = dealer.access_structures[i_secret][0]
+        accumulator = dealer.new_accumulator(i_secret, 0)
+        for b, participant in reversed(list(enumerate(group))):
+            dealer.accumulate_share(accumulator, i_secret, 0, participant,
+                                    dealer.key_shares[i_secret][0][b])
+        assert_equal(dealer.combine_accumulated(i_secret, accumulator), secret)
+
+def test_combine_all_secrets():
+    secrets = [7, 9, 41]
+    dealer = Dealer(p256, 3, secrets, [[[1, 3]], [[2, 3]], [[1, 2, 3]]])
+    dealer.split_secrets()
+    assert_equal(dealer.combine_all_secrets(dealer.key_shares),
+                 dict(enumerate(secrets)))
+
+def test_split_secrets_parallel():
+    secrets = [7, 9, 41]
+    dealer = Dealer(p256, 3, secrets, [[[1, 3]], [[2, 3]], [[1, 2, 3]]])
+    key_shares = dealer.split_secrets(parallel=True, max_workers=2)
+
+    assert_equal(len(dealer.cipher_keys), len(secrets))
+    assert_equal(len(dealer.public_shares_M), len(secrets))
+    for i_secret, secret in enumerate(secrets):
+        assert_equal(dealer.combine_secret(i_secret, 0, key_shares), secret)
+
+
+def test_cipher_encrypt_stream():
+    """ streamed ciphertext is the same as of one-shot encryption """
+    import io
+
+    dealer = Dealer(p256, n_participants, s_secrets, access_structures)
+    dealer.cipher_generate_keys()
+    key = dealer.cipher_keys[0]
+
+    for length in (0, 15, 16, 1000):
+        data = bytes(range(256)) * 4
+        data = data[:length]
+        streamed = b''.join(dealer.cipher_encrypt_stream(io.BytesIO(data), key,
+                                                         chunk_size=32))
+        assert_equal(streamed, dealer.cipher_encrypt(data, key))
+
+        # iterable of unaligned chunks
+        chunks = [data[i:i + 7] for i in range(0, length, 7)]
+        decrypted = b''.join(dealer.cipher_decrypt_stream(
+            iter([streamed[:5], streamed[5:]]), key))
+        assert_equal(b''.join(dealer.cipher_encrypt_stream(chunks, key)),
+                     streamed)
+        assert_equal(decrypted, data)
+
+
+def test_split_secret_streams():
+    import io
+
+    secrets = [bytes([7]) * 100000, b'second secret']
+    dealer = Dealer(p256, 3, [0, 0], [[[1, 3]], [[1, 2, 3]]])
+    sinks = [io.BytesIO(), io.BytesIO()]
+    dealer.split_secret_streams([io.BytesIO(secret) for secret in secrets],
+                                sinks, chunk_size=4096)
+
+    for i_secret, secret in enumerate(secrets):
+        output = io.BytesIO()
+        dealer.combine_secret_stream(i_secret, 0, dealer.key_shares,
+                                     io.BytesIO(sinks[i_secret].getvalue()),
+                                     output)
+        assert_equal(output.getvalue(), secret)
+
+
+def test_threshold_group():
+    structures = [[ThresholdGroup(range(1, 6), 3)], [[1, 2]]]
+    dealer = Dealer(p256, 5, [7, 313], structures)
+    key_shares = dealer.split_secrets()
+
+    obtained = [[[None, key_shares[0][0][1], None, key_shares[0][0][3],
+                  key_shares[0][0][4]]], [[None, None]]]
+    assert_equal(dealer.combine_secret(0, 0, obtained), 7)
+    assert_equal(dealer.combine_all_secrets(obtained), {0: 7})
@@ -6,6 +6,7 @@ from nose.tools import assert_not_equal
 from nose.tools import assert_raises
 
 from multisecret.MultiSecretLinYeh import Dealer
+from multisecret.accessPlan import ThresholdGroup
 import multisecret.MultiSecretCommon as common
 
 
@@ -340,3 +341,51 @@ def test_combine_secret_4_participants_in_3_groups():
     assert_equal(combined_secret_0, s_secrets[0])
 
 
+def test_split_secrets_parallel():
+    """ parallel split gives shares in the same layout as sequential one """
+    secrets = [7, 5, 3]
+    access_structures = [[[1, 3, 4]], [[1, 2, 4], [2, 3, 4]], [[1, 2, 3]]]
+    dealer = Dealer(p256, 4, secrets, access_structures)
+    pseudo_shares = dealer.split_secrets(parallel=True, max_workers=2)
+
+    for i, gamma in enumerate(access_structures):
+        for q, A in enumerate(gamma):
+            assert_equal(len(dealer.public_shares_M[i][q]), len(A))
+            assert_equal(dealer.combine_secret(i, q, pseudo_shares[i][q]),
+                         secrets[i])
+
+
+def test_combine_accumulated():
+    """ shares added one at a time give the same secret as combine_secret """
+    dealer = Dealer(p256, n_participants, s_secrets, access_structures)
+    dealer.split_secrets()
+
+    for i, gamma in enumerate(access_structures):
+        for q, A in enumerate(gamma):
+            accumulator = dealer.new_accumulator(i, q)
+            for b, participant in reversed(list(enumerate(A))):
+                dealer.accumulate_share(accumulator, i, q, participant,
+                                        dealer.pseudo_shares[i][q][b])
+            assert_equal(dealer.combine_accumulated(i, accumulator),
+                         s_secrets[i])
+
+
+def test_combine_all_secrets():
+    dealer = Dealer(p256, n_participants, s_secrets, access_structures)
+    dealer.split_secrets()
+    assert_equal(dealer.combine_all_secrets(dealer.pseudo_shares),
+                 dict(enumerate(s_secrets)))
+
+
+def test_threshold_group():
+    structures = [[ThresholdGroup(range(1, 6), 3)], [[1, 2]]]
+    dealer = Dealer(p256, 5, [7, 313], structures)
+    pseudo_shares = dealer.split_secrets()
+
+    for present in [(0, 1, 2), (1, 3, 4)]:
+        obtained = [share if b in present else None
+                    for b, share in enumerate(pseudo_shares[0][0])]
+        assert_equal(dealer.combine_secret(0, 0, obtained), 7)
+    with assert_raises(ValueError):
+        dealer.combine_secret(0, 0, [pseudo_shares[0][0][0], None, None,
+                                     pseudo_shares[0][0][3], None])
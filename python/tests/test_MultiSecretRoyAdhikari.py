@@ -1,11 +1,14 @@
 # Prototype of Multi-secret sharing scheme by Roy & Adhikari
 # Filip Kubicz 2016-2017
 
+import copy
+
 from nose.tools import assert_equal
 from nose.tools import assert_not_equal
 from nose.tools import assert_raises
 
 from multisecret.MultiSecretRoyAdhikari import Dealer
+from multisecret.accessPlan import ThresholdGroup
 import multisecret.MultiSecretCommon as common
 
 # TODO: test if hash is the same for the same Dealer object and different among separate objects with random AES-CTR nonce
@@ -336,3 +339,144 @@ def test_combine_secret_4_participants_in_3_groups():
     assert_equal(combined_secret_0, s_secrets[0])
 
     
+def test_compute_all_pseudo_shares_bulk():
+    """ bulk hashing gives the same pseudo shares as single participant path """
+    dealer = Dealer(p256, 4, [7, 5, 3],
+                    [[[1, 3, 4]], [[1, 2, 4], [2, 3, 4]], [[1, 2, 3]]])
+    dealer.split_secrets()
+
+    for i, gamma in enumerate(dealer.access_structures):
+        for q, A in enumerate(gamma):
+            for b, Pb in enumerate(A):
+                assert_equal(dealer.pseudo_shares[i][q][b],
+                             dealer.pseudo_share_participant(i, q, Pb))
+
+
+def test_split_secrets_parallel():
+    """ parallel split gives shares in the same layout as sequential one """
+    secrets = [7, 5, 3, 11, 13]
+    access_structures = [[[1, 3, 4]], [[1, 2, 4], [2, 3, 4]], [[1, 2, 3]],
+                         [[2, 4]], [[1, 2, 3, 4]]]
+    dealer = Dealer(p256, 4, secrets, access_structures)
+    pseudo_shares = dealer.split_secrets(parallel=True, max_workers=2)
+
+    assert_equal(len(dealer.d), len(secrets))
+    assert_equal(len(dealer.public_shares_M), len(secrets))
+    for i, gamma in enumerate(access_structures):
+        for q, A in enumerate(gamma):
+            assert_equal(len(pseudo_shares[i][q]), len(A))
+            assert_equal(len(dealer.public_shares_M[i][q]), len(A))
+            assert_equal(dealer.combine_secret(i, q, pseudo_shares[i][q]),
+                         secrets[i])
+
+
+def test_get_set_pseudo_shares_for_participant():
+    """ shares exported per participant are put back in the same places """
+    access_structures = [[[1, 3, 4]], [[1, 2, 4], [2, 3, 4]], [[1, 2, 3]]]
+    dealer = Dealer(p256, 4, [7, 5, 3], access_structures)
+    dealer.split_secrets()
+
+    combiner = Dealer(p256, 4, [0, 0, 0], access_structures)
+    combiner.pseudo_shares = copy.deepcopy(access_structures)
+    for participant in range(1, 5):
+        my_pseudo_shares = dealer.get_pseudo_shares_for_participant(participant)
+        assert_equal(len(my_pseudo_shares),
+                     len(dealer.share_positions(participant)))
+        combiner.set_pseudo_shares_from_participant(participant,
+                                                    my_pseudo_shares)
+
+    assert_equal(combiner.pseudo_shares, dealer.pseudo_shares)
+
+
+def test_combine_accumulated():
+    """ shares added one at a time give the same secret as combine_secret """
+    dealer = Dealer(p256, n_participants, s_secrets, access_structures)
+    dealer.split_secrets()
+
+    for i, gamma in enumerate(access_structures):
+        for q, A in enumerate(gamma):
+            accumulator = dealer.new_accumulator(i, q)
+            for b, participant in reversed(list(enumerate(A))):
+                dealer.accumulate_share(accumulator, i, q, participant,
+                                        dealer.pseudo_shares[i][q][b])
+            assert_equal(dealer.combine_accumulated(i, accumulator),
+                         s_secrets[i])
+
+
+def test_combine_all_secrets():
+    dealer = Dealer(p256, n_participants, s_secrets, access_structures)
+    dealer.split_secrets()
+    assert_equal(dealer.combine_all_secrets(dealer.pseudo_shares),
+                 dict(enumerate(s_secrets)))
+
+    # without shares of user 3 only the second secret can be combined
+    obtained = copy.deepcopy(dealer.pseudo_shares)
+    for i, q, b in dealer.share_positions(3):
+        obtained[i][q][b] = None
+    assert_equal(dealer.combine_all_secrets(obtained), {1: s_secrets[1]})
+
+
+def test_threshold_group():
+    # any 3 of 5 users, one polynomial instead of 10 groups
+    structures = [[ThresholdGroup(range(1, 6), 3)], [[1, 2]]]
+    dealer = Dealer(p256, 5, [7, 313], structures)
+    pseudo_shares = dealer.split_secrets()
+    assert_equal(len(dealer.polynomial_coeffs_for_secret(0)[0]), 2)
+
+    for present in [(0, 1, 2), (1, 3, 4), (0, 2, 4)]:
+        obtained = [share if b in present else None
+                    for b, share in enumerate(pseudo_shares[0][0])]
+        assert_equal(dealer.combine_secret(0, 0, obtained), 7)
+
+    obtained = copy.deepcopy(pseudo_shares)
+    obtained[0][0][1] = obtained[0][0][3] = None
+    assert_equal(dealer.combine_all_secrets(obtained), {0: 7, 1: 313})
+    obtained[0][0][4] = None
+    assert_equal(dealer.combine_all_secrets(obtained), {1: 313})
+    with assert_raises(ValueError):
+        dealer.combine_secret(0, 0, obtained[0][0])
+
+    accumulator = dealer.new_accumulator(0, 0)
+    for participant in [5, 2, 4]:
+        dealer.accumulate_share(accumulator, 0, 0, participant,
+                                pseudo_shares[0][0][participant - 1])
+    assert_equal(dealer.combine_accumulated(0, accumulator), 7)
+
+
+def test_pseudo_shares_from_master_share():
+    dealer = Dealer(p256, n_participants, s_secrets, access_structures)
+    dealer.split_secrets()
+
+    # combiner knows only public information and the hash nonce
+    combiner = Dealer(p256, n_participants, [0] * len(s_secrets),
+                      access_structures)
+    combiner.hash_aes_nonce = dealer.hash_aes_nonce
+    for user in range(1, n_participants + 1):
+        master_share = dealer.get_master_share_for_participant(user)
+        assert_equal(combiner.pseudo_shares_from_master_share(user,
+                                                              master_share),
+                     dealer.get_pseudo_shares_for_participant(user))
+        for i, q, b in dealer.share_positions(user):
+            assert_equal(combiner.pseudo_share_from_master_share(
+                i, q, master_share), dealer.pseudo_shares[i][q][b])
+
+    combiner.hash_aes_nonce = None
+    with assert_raises(ValueError):
+        combiner.pseudo_share_from_master_share(0, 0, 1)
+
+
+def test_pseudo_share_messages_are_distinct():
+    """ i and q have fixed widths, (1, 256) and (257, 0) do not collide """
+    structures = [[[1, 2]] for _ in range(258)]
+    structures[1] = [[1, 2]] * 257
+    dealer = Dealer(p256, 2, list(range(1, 259)), structures)
+    dealer.split_secrets()
+
+    assert_not_equal(dealer.pseudo_share_message(1, 256, 1),
+                     dealer.pseudo_share_message(257, 0, 1))
+    messages = [dealer.pseudo_share_message(i, q, 1)
+                for i, q, _ in dealer.share_positions(1)]
+    assert_equal(len(set(messages)), len(messages))
+    assert_equal(len(set(len(message) for message in messages)), 1)
+    assert_equal(dealer.combine_secret(1, 256, dealer.pseudo_shares[1][256]),
+                 2)
@@ -0,0 +1,84 @@
+# Tests for flat layout of access structures and share storage
+# Filip Kubicz 2017
+
+from nose.tools import assert_equal
+from nose.tools import assert_raises
+
+from multisecret.accessLayout import AccessLayout, ShareStore
+
+access_structures = [[[1, 3]], [[1, 2], [2, 3, 1]], [[1, 2, 3]]]
+
+
+def test_layout_offsets():
+    layout = AccessLayout(access_structures)
+
+    assert_equal(list(layout.members), [1, 3, 1, 2, 2, 3, 1, 1, 2, 3])
+    assert_equal(list(layout.group_offsets), [0, 2, 4, 7, 10])
+    assert_equal(list(layout.secret_offsets), [0, 1, 3, 4])
+    assert_equal(len(layout), 3)
+    assert_equal(layout.size, 10)
+    assert_equal(layout.group_count(1), 2)
+    assert_equal(layout.group(1, 1), [2, 3, 1])
+    assert_equal(layout.position(1, 1, 2), 6)
+    assert_equal(layout.to_nested(), access_structures)
+
+    with assert_raises(IndexError):
+        layout.position(0, 1, 0)
+    with assert_raises(IndexError):
+        layout.position(1, 0, 2)
+
+
+def test_share_store_views():
+    layout = AccessLayout(access_structures)
+    store = ShareStore(layout, 2)
+
+    assert_equal(store[1][1][0], None)
+    store[1][1][0] = 258
+    store[1][1][-1] = b'\x07'
+    assert_equal(store[1][1][0], 258)
+    assert_equal(store[1][1], [258, None, 7])
+    assert_equal(len(store), 3)
+    assert_equal(len(store[1]), 2)
+    assert_equal(len(store[1][1]), 3)
+
+    with assert_raises(IndexError):
+        store[1][1][3]
+    with assert_raises(IndexError):
+        store[3]
+    with assert_raises(ValueError):
+        store[0][0][0] = 2 ** 16
+
+
+def test_share_store_from_secrets():
+    layout = AccessLayout(access_structures)
+    values = [[[5, 6]], [[7, 8], [9, 10, 11]], [[12, 13, 14]]]
+
+    store = ShareStore.from_secrets(layout, 1, values)
+    assert_equal(store, values)
+    assert_equal(store.to_nested(), values)
+    assert_equal(store[2], [[12, 13, 14]])
+
+    bytes_store = ShareStore.from_secrets(layout, 2, values, as_bytes=True)
+    assert_equal(bytes_store[0][0][1], b'\x00\x06')
+
+    with assert_raises(ValueError):
+        store.set_secret(0, [[1, 2, 3]])
+
+
+def test_share_store_groups():
+    layout = AccessLayout(access_structures)
+    store = ShareStore(layout, 2)
+
+    store.set_group(1, 1, [258, b'\x07', 9])
+    store.set_group(1, 0, [None, 3])
+    assert_equal(list(store[1][1]), [258, 7, 9])
+    assert_equal(list(store[1][0]), [None, 3])
+    assert_equal(store.get_range(2, 7), [None, 3, 258, 7, 9])
+    assert_equal(list(ShareStore.from_secrets(layout, 2, [[[1, 2]]],
+                                              as_bytes=True)[0][0]),
+                 [b'\x00\x01', b'\x00\x02'])
+
+    with assert_raises(ValueError):
+        store.set_group(1, 1, [1, 2])
+    with assert_raises(ValueError):
+        store.set_group(1, 1, [1, 2, 2 ** 16])
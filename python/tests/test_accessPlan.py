@@ -0,0 +1,146 @@
+# Tests for compiled access structures
+# Filip Kubicz 2017
+
+import pickle
+
+from nose.tools import assert_equal
+from nose.tools import assert_raises
+from nose.tools import assert_true
+
+from multisecret.accessPlan import AccessPlan, ThresholdGroup
+from multisecret.accessPlan import compile_access_structures
+from multisecret.accessPlan import minimize_access_structures
+from multisecret.accessPlan import optimize_access_structures
+import multisecret.MultiSecretRoyAdhikari
+import multisecret.MultiSecretHerranzRuizSaez
+
+p256 = 2 ** 256 - 2 ** 224 + 2 ** 192 + 2 ** 96 - 1
+access_structures = [[[1, 3]], [[1, 2], [2, 3, 4]], [[1, 2, 3]]]
+
+
+def test_compile():
+    plan = compile_access_structures(access_structures)
+
+    assert_equal(plan, access_structures)
+    assert_equal(plan[1][1], (2, 3, 4))
+    assert_equal(len(plan), 3)
+    assert_equal(plan.n, 4)
+    assert_equal(plan.u, 2)
+    assert_equal(plan.v, 1)
+    assert_equal(plan.group_masks[1][1], 0b11100)
+    assert_equal(plan.share_positions(2), ((1, 0, 1), (1, 1, 0), (2, 0, 1)))
+    assert_equal(plan.share_positions(5), ())
+    assert_equal(plan.layout.to_nested(), access_structures)
+
+    # a plan is compiled only once
+    assert_true(compile_access_structures(plan) is plan)
+
+
+def test_membership():
+    plan = AccessPlan(access_structures)
+
+    assert_true(plan.is_member(1, 1, 4))
+    assert_equal(plan.is_member(1, 0, 4), False)
+    assert_equal(plan.member_index(1, 1, 4), 2)
+    with assert_raises(ValueError):
+        plan.member_index(0, 0, 2)
+
+    present = plan.participants_mask([2, 3, 4])
+    assert_true(plan.is_qualified(1, 1, present))
+    assert_equal(plan.is_qualified(1, 0, present), False)
+
+
+def test_validation():
+    with assert_raises(ValueError):
+        AccessPlan([[[1, 2]], [[3]]])
+    with assert_raises(ValueError):
+        AccessPlan([[[1, 2]], []])
+    with assert_raises(ValueError):
+        AccessPlan([[[1, 1, 2]]])
+    with assert_raises(ValueError):
+        AccessPlan([[[0, 2]]])
+
+
+def test_immutable():
+    plan = AccessPlan(access_structures)
+    with assert_raises(AttributeError):
+        plan.n = 5
+    with assert_raises(TypeError):
+        plan[0][0][0] = 2
+
+    assert_equal(pickle.loads(pickle.dumps(plan)), plan)
+
+
+def test_dealers_share_plan():
+    plan = AccessPlan(access_structures)
+    secrets = [7, 313, 671]
+    for _ in range(2):
+        dealer = multisecret.MultiSecretRoyAdhikari.Dealer(p256, 4, secrets,
+                                                           plan)
+        assert_true(dealer.access_structures is plan)
+        pseudo_shares = dealer.split_secrets()
+        for i, gamma in enumerate(plan):
+            for q, A in enumerate(gamma):
+                assert_equal(dealer.combine_secret(i, q, pseudo_shares[i][q]),
+                             secrets[i])
+
+    hrs_plan = AccessPlan([[[1, 3]], [[2, 3]]])
+    dealer = multisecret.MultiSecretHerranzRuizSaez.Dealer(p256, 3, [7, 9],
+                                                           hrs_plan)
+    key_shares = dealer.split_secrets()
+    assert_equal(dealer.combine_all_secrets(key_shares), {0: 7, 1: 9})
+
+
+def test_minimize_access_structures():
+    structures = [[[1, 2, 3], [1, 3], [3, 1]], [[1, 2], [2, 3]], [[1, 2]]]
+    minimal, report = minimize_access_structures(structures)
+
+    assert_equal(minimal, [[[1, 3]], [[1, 2], [2, 3]], [[1, 2]]])
+    assert_equal(report.kept, [[1], [0, 1], [0]])
+    assert_equal(sorted(report.removed), [(0, 0, 1), (0, 2, 1)])
+    assert_equal(report.groups_before, 6)
+    assert_equal(report.groups_after, 4)
+    assert_equal(report.shares_before, 13)
+    assert_equal(report.shares_after, 8)
+    assert_equal(report.coefficients_before, 7)
+    assert_equal(report.coefficients_after, 4)
+    assert_equal(report.member_sets, 3)
+    assert_true('groups: 6 -> 4' in str(report))
+
+
+def test_optimize_access_structures():
+    plan, report = optimize_access_structures([[[1, 2, 3], [1, 2]],
+                                               [[1, 2]]])
+    assert_equal(plan, [[[1, 2]], [[1, 2]]])
+    assert_equal(report.member_sets, 1)
+
+
+def test_threshold_group():
+    group = ThresholdGroup([1, 2, 3, 4], 2)
+    assert_equal(tuple(group), (1, 2, 3, 4))
+    assert_equal(group.threshold, 2)
+    assert_equal(group == ThresholdGroup([1, 2, 3, 4], 3), False)
+    assert_equal(group == (1, 2, 3, 4), False)
+    assert_equal(ThresholdGroup([1, 2], 2), (1, 2))
+    assert_equal(pickle.loads(pickle.dumps(group)).threshold, 2)
+    with assert_raises(ValueError):
+        ThresholdGroup([1, 2, 3], 4)
+    with assert_raises(ValueError):
+        ThresholdGroup([1, 2, 3], 1)
+
+    plan = AccessPlan([[group], [[1, 2]]])
+    assert_equal(plan.thresholds, ((2,), (2,)))
+    assert_true(plan.is_qualified(0, 0, plan.participants_mask([1, 4])))
+    assert_equal(plan.is_qualified(0, 0, plan.participants_mask([4, 5])),
+                 False)
+    assert_equal(plan.to_nested()[0][0].threshold, 2)
+
+
+def test_minimize_threshold_groups():
+    structures = [[[1, 2, 3], ThresholdGroup([1, 2, 3, 4], 2), [1, 5]]]
+    minimal, report = minimize_access_structures(structures)
+
+    assert_equal(minimal, [[ThresholdGroup([1, 2, 3, 4], 2), [1, 5]]])
+    assert_equal(report.removed, [(0, 0, 1)])
+    assert_equal(report.coefficients_before, 4)
+    assert_equal(report.coefficients_after, 2)
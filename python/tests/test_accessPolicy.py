@@ -0,0 +1,104 @@
+# Tests for access policies of AND, OR and threshold gates
+# Filip Kubicz 2017
+
+import io
+import pickle
+
+from nose.tools import assert_equal
+from nose.tools import assert_raises
+from nose.tools import assert_true
+
+from multisecret.accessPlan import AccessPlan, minimize_access_structures
+from multisecret.accessPolicy import And, Or, Threshold, PolicyGroup
+import multisecret.reconstructionPlanner as planner
+import multisecret.shareFile as sharefile
+
+p256 = 2 ** 256 - 2 ** 224 + 2 ** 192 + 2 ** 96 - 1
+# (2 of users 1, 2, 3) AND (user 4 OR user 5)
+policy = And(Threshold(2, 1, 2, 3), Or(4, 5))
+
+
+def test_policy_group():
+    group = PolicyGroup(policy)
+    assert_equal(tuple(group), (1, 2, 3, 4, 5))
+    assert_equal(group.min_shares, 3)
+    assert_equal(group.coefficient_count, 2)
+    assert_equal(group, PolicyGroup(And(Threshold(2, 1, 2, 3), Or(4, 5))))
+    assert_equal(group == (1, 2, 3, 4, 5), False)
+    assert_equal(pickle.loads(pickle.dumps(group)), group)
+    assert_equal(repr(group),
+                 'PolicyGroup(And(Threshold(2, 1, 2, 3), Or(4, 5)))')
+
+    assert_equal(group.select([1, 3, 5]), [1, 3, 5])
+    assert_equal(group.select([1, 2, 3, 4, 5]), [1, 2, 4])
+    assert_equal(group.select([1, 2, 3]), None)
+
+
+def test_validation():
+    # not read-once
+    with assert_raises(ValueError):
+        PolicyGroup(And(1, Or(1, 2)))
+    with assert_raises(ValueError):
+        Threshold(3, 1, 2)
+    with assert_raises(ValueError):
+        And(1, 0)
+    # a single participant could reconstruct
+    with assert_raises(ValueError):
+        AccessPlan([[PolicyGroup(Or(1, 2))]])
+
+
+def test_split_and_combine():
+    group = PolicyGroup(policy)
+    for algorithm in ['Roy-Adhikari', 'Lin-Yeh', 'Herranz-Ruiz-Saez']:
+        dealer = planner.DEALER_CLASSES[algorithm](p256, 5, [7, 313],
+                                                   [[group], [[1, 2]]])
+        shares = dealer.split_secrets()
+        assert_equal(len(shares[0][0]), 5)
+
+        for present in [[1, 2, 4], [2, 3, 5], [1, 3, 4, 5]]:
+            obtained = dealer.new_share_store()
+            for Pb in present:
+                obtained[0][0][group.index(Pb)] = shares[0][0][group.index(Pb)]
+            assert_equal(dealer.combine_all_secrets(obtained), {0: 7})
+
+        accumulator = dealer.new_accumulator(0, 0)
+        for Pb in [5, 2]:
+            dealer.accumulate_share(accumulator, 0, 0, Pb,
+                                    shares[0][0][group.index(Pb)])
+            assert_equal(accumulator.complete, False)
+        dealer.accumulate_share(accumulator, 0, 0, 1, shares[0][0][0])
+        assert_true(accumulator.complete)
+        assert_equal(dealer.combine_accumulated(0, accumulator), 7)
+
+
+def test_plan_and_minimize():
+    group = PolicyGroup(policy)
+    plan = AccessPlan([[group, [1, 2, 4]]])
+    assert_true(plan.is_qualified(0, 0, plan.participants_mask([2, 3, 5])))
+    assert_equal(plan.is_qualified(0, 0, plan.participants_mask([1, 4])),
+                 False)
+    assert_equal(planner.plan_reconstruction(plan, [1, 3, 5]), {0: 0})
+
+    minimal, report = minimize_access_structures([[group, [1, 2], group]])
+    assert_equal(minimal, [[group, [1, 2]]])
+    assert_equal(report.removed, [(0, 2, 0)])
+
+
+def test_share_file():
+    group = PolicyGroup(policy)
+    dealer = planner.DEALER_CLASSES['Roy-Adhikari'](p256, 5, [7],
+                                                    [[group, [1, 2]]])
+    dealer.split_secrets()
+    public_file = io.BytesIO()
+    sharefile.write_public_info(public_file, dealer.p, 'Roy-Adhikari',
+                                dealer.access_structures,
+                                dealer.public_shares_M)
+    public_file.seek(0)
+    public_info = sharefile.read_public_info(public_file)
+    assert_equal(public_info['access_structures'], [[group, [1, 2]]])
+
+    combiner = planner.create_combiner(public_info)
+    user_data = {Pb: {'id': dealer.random_id[Pb - 1],
+                      'shares': dealer.get_pseudo_shares_for_participant(Pb)}
+                 for Pb in [2, 3, 4]}
+    assert_equal(planner.combine_present(combiner, user_data), {0: 7})
@@ -8,7 +8,11 @@ from multisecret.MultiSecretRoyAdhikari import Dealer
 p256 = 2**256 - 2**224 + 2**192 + 2**96 - 1
 
 def test_bitlen():
-    pass
+    assert_equal(bytehelper.bitlen(0), 1)
+    assert_equal(bytehelper.bitlen(255), 8)
+    assert_equal(bytehelper.bitlen(p256), 256)
+    # float log2 rounds 2^127 - 1 up to 127.0
+    assert_equal(bytehelper.bitlen(2**127 - 1), 127)
 
 
 def test_bytelen():
@@ -25,10 +29,16 @@ def test_bytelen():
     assert_equal(length, 4)
 
 def test_int_to_bytes():
-    pass
+    assert_equal(bytehelper.element_width(13), 1)
+    assert_equal(bytehelper.element_width(65537), 3)
+    assert_equal(bytehelper.element_width(p256), 32)
+    assert_equal(bytehelper.element_to_bytes(258, 3), bytes([0, 1, 2]))
+    assert_equal(bytehelper.element_to_bytes(bytes([1, 2]), 3), bytes([0, 1, 2]))
     
 def test_bytes_to_int():
-    pass
+    assert_equal(bytehelper.to_int(bytes([1, 2])), 258)
+    assert_equal(bytehelper.to_int(bytearray([0, 1, 2])), 258)
+    assert_equal(bytehelper.to_int(258), 258)
     
 def test_take_first_bits_exceptions():
 
@@ -0,0 +1,271 @@
+# Tests for asyncio combiner service
+# Filip Kubicz 2017
+
+import asyncio
+import io
+import json
+import os
+import tempfile
+
+from nose.tools import assert_equal
+from nose.tools import assert_raises
+from nose.tools import assert_true
+
+import multisecret.combinerService as combinerservice
+import multisecret.reconstructionPlanner as planner
+import multisecret.shareFile as sharefile
+
+p256 = 2 ** 256 - 2 ** 224 + 2 ** 192 + 2 ** 96 - 1
+secrets = [7, 313, 671]
+n_participants = 3
+access_structures = [[[1, 2, 3], [1, 3]], [[1, 2]], [[1, 2, 3]]]
+hrs_access_structures = [[[1, 3]], [[1, 2]], [[1, 2, 3]]]
+
+
+def split(algorithm, structures):
+    dealer = planner.DEALER_CLASSES[algorithm](
+        p256, n_participants, secrets, structures)
+    dealer.split_secrets()
+    public_file = io.BytesIO()
+    sharefile.write_public_info(public_file, dealer.p, algorithm,
+                                dealer.access_structures,
+                                dealer.public_shares_M)
+    public_file.seek(0)
+    return dealer, sharefile.read_public_info(public_file)
+
+
+def submit_request(dealer, session, user):
+    shares = dealer.get_pseudo_shares_for_participant(user)
+    return {'op': 'submit', 'session': session, 'user': user,
+            'id': dealer.get_id_int(user),
+            'shares': [[i, q, share] for (i, q), share in shares.items()]}
+
+
+async def exchange(reader, writer, request):
+    writer.write(json.dumps(request).encode() + b'\n')
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+
+def test_submit_reconstructs_when_group_complete():
+    for algorithm, structures in [('Roy-Adhikari', access_structures),
+                                  ('Lin-Yeh', access_structures),
+                                  ('Herranz-Ruiz-Saez', hrs_access_structures)]:
+        dealer, public_info = split(algorithm, structures)
+        service = combinerservice.CombinerService(public_info)
+
+        async def run():
+            shares = dealer.get_pseudo_shares_for_participant
+            first = await service.submit('s', 1, dealer.get_id_int(1), shares(1))
+            second = await service.submit('s', 3, dealer.get_id_int(3), shares(3))
+            third = await service.submit('s', 2, dealer.get_id_int(2), shares(2))
+            return first, second, third
+
+        first, second, third = asyncio.run(run())
+        assert_equal(first, {})
+        # users 1 and 3 complete a group of the first secret
+        assert_equal(second, {0: secrets[0]})
+        assert_equal(third, {1: secrets[1], 2: secrets[2]})
+
+
+def test_tcp_sessions_are_independent():
+    dealer, public_info = split('Roy-Adhikari', access_structures)
+    service = combinerservice.CombinerService(public_info)
+
+    async def run():
+        server = await service.start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            a = await exchange(reader, writer, submit_request(dealer, 'a', 1))
+            b = await exchange(reader, writer, submit_request(dealer, 'b', 2))
+            a = await exchange(reader, writer, submit_request(dealer, 'a', 2))
+            status = await exchange(reader, writer,
+                                    {'op': 'status', 'session': 'a'})
+            closed = await exchange(reader, writer,
+                                    {'op': 'close', 'session': 'a'})
+            error = await exchange(reader, writer,
+                                   {'op': 'status', 'session': 'a'})
+            writer.close()
+            await writer.wait_closed()
+        return a, b, status, closed, error
+
+    a, b, status, closed, error = asyncio.run(run())
+    assert_equal(b['reconstructed'], {})
+    assert_equal(a['reconstructed'], {'1': secrets[1]})
+    assert_equal(status['users'], [1, 2])
+    assert_equal(status['reconstructed'], {'1': secrets[1]})
+    assert_true(closed['closed'])
+    assert_true('error' in error)
+
+
+def test_unix_socket():
+    dealer, public_info = split('Lin-Yeh', access_structures)
+    service = combinerservice.CombinerService(public_info)
+
+    async def run(path):
+        server = await service.start(path=path)
+        async with server:
+            reader, writer = await asyncio.open_unix_connection(path)
+            responses = [await exchange(reader, writer,
+                                        submit_request(dealer, 's', user))
+                         for user in (1, 2, 3)]
+            writer.close()
+            await writer.wait_closed()
+        return responses
+
+    with tempfile.TemporaryDirectory() as directory:
+        responses = asyncio.run(run(os.path.join(directory, 'combiner.sock')))
+
+    reconstructed = {}
+    for response in responses:
+        reconstructed.update(response['reconstructed'])
+    assert_equal(reconstructed, {str(i): s for i, s in enumerate(secrets)})
+
+
+def test_submit_master_shares():
+    dealer = planner.DEALER_CLASSES['Roy-Adhikari'](
+        p256, n_participants, secrets, access_structures)
+    dealer.split_secrets()
+    public_file = io.BytesIO()
+    sharefile.write_public_info(public_file, dealer.p, 'Roy-Adhikari',
+                                dealer.access_structures,
+                                dealer.public_shares_M, dealer.hash_aes_nonce)
+    public_file.seek(0)
+    service = combinerservice.CombinerService(
+        sharefile.read_public_info(public_file))
+
+    async def run():
+        responses = []
+        for user in [1, 2, 3]:
+            responses.append(await service.handle_request(
+                {'op': 'submit', 'session': 's', 'user': user,
+                 'id': dealer.get_id_int(user),
+                 'master_share': dealer.get_master_share_for_participant(user)}))
+        return responses
+
+    responses = asyncio.run(run())
+    assert_equal(responses[1]['reconstructed'], {'1': secrets[1]})
+    assert_equal(responses[2]['reconstructed'],
+                 {'0': secrets[0], '2': secrets[2]})
+
+
+def test_invalid_master_share():
+    dealer = planner.DEALER_CLASSES['Roy-Adhikari'](
+        p256, n_participants, secrets, access_structures)
+    dealer.split_secrets()
+    public_file = io.BytesIO()
+    sharefile.write_public_info(public_file, dealer.p, 'Roy-Adhikari',
+                                dealer.access_structures,
+                                dealer.public_shares_M, dealer.hash_aes_nonce)
+    public_file.seek(0)
+    service = combinerservice.CombinerService(
+        sharefile.read_public_info(public_file))
+
+    async def run(master_share):
+        return await service.handle_request(
+            {'op': 'submit', 'session': 's', 'user': 1,
+             'id': dealer.get_id_int(1), 'master_share': master_share})
+
+    for master_share in [-1, 2 ** 300, 'abc']:
+        with assert_raises(ValueError):
+            asyncio.run(run(master_share))
+    assert_equal(service.sessions, {})
+
+
+def test_invalid_submit_leaves_session_unchanged():
+    dealer, public_info = split('Roy-Adhikari', access_structures)
+    service = combinerservice.CombinerService(public_info)
+    shares = dealer.get_pseudo_shares_for_participant
+
+    async def run():
+        await service.submit('s', 1, dealer.get_id_int(1), shares(1))
+
+        malformed = dict(shares(3))
+        malformed[(0, 1)] = 'not a share'
+        with assert_raises(ValueError):
+            await service.submit('s', 3, dealer.get_id_int(3), malformed)
+        with assert_raises(ValueError):
+            await service.submit('s', 3, p256 + 1, shares(3))
+        # the same ID as user 1
+        with assert_raises(ValueError):
+            await service.submit('s', 3, dealer.get_id_int(1), shares(3))
+
+        session = service.sessions['s']
+        assert_equal(session.users, {1})
+        assert_equal([len(accumulator)
+                      for accumulator in session.accumulators.values()],
+                     [1, 1, 1, 1])
+
+        # user 3 is not locked out
+        second = await service.submit('s', 3, dealer.get_id_int(3), shares(3))
+        third = await service.submit('s', 2, dealer.get_id_int(2), shares(2))
+        return second, third
+
+    second, third = asyncio.run(run())
+    assert_equal(second, {0: secrets[0]})
+    assert_equal(third, {1: secrets[1], 2: secrets[2]})
+
+
+def test_failed_combine_does_not_block_other_secrets():
+    dealer, public_info = split('Roy-Adhikari', access_structures)
+    service = combinerservice.CombinerService(public_info)
+    combiner = service.session('s').combiner
+    combine_accumulated = combiner.combine_accumulated
+
+    def failing_combine(i_secret, accumulator):
+        if i_secret == 1:
+            raise ValueError('Participant IDs in a group must be distinct!')
+        return combine_accumulated(i_secret, accumulator)
+
+    combiner.combine_accumulated = failing_combine
+
+    async def run():
+        responses = []
+        for user in [1, 3, 2]:
+            responses.append(await service.handle_request(
+                submit_request(dealer, 's', user)))
+        return responses
+
+    responses = asyncio.run(run())
+    # secrets combined together with the failing one are returned
+    assert_equal(responses[2]['reconstructed'], {'2': secrets[2]})
+    assert_equal(responses[2]['failed'],
+                 {'1': 'Participant IDs in a group must be distinct!'})
+    session = service.sessions['s']
+    assert_equal(session.pending, set())
+    assert_equal(session.accumulators, {})
+
+    # members of the failed group can fill it again
+    del combiner.combine_accumulated
+
+    async def resubmit():
+        responses = []
+        for user in [1, 2]:
+            responses.append(await service.handle_request(
+                submit_request(dealer, 's', user)))
+        return responses
+
+    responses = asyncio.run(resubmit())
+    assert_equal(responses[0]['reconstructed'], {})
+    assert_equal(responses[1]['reconstructed'], {'1': secrets[1]})
+    assert_equal(responses[1]['failed'], {})
+    with assert_raises(ValueError):
+        asyncio.run(service.handle_request(submit_request(dealer, 's', 3)))
+
+
+def test_idle_sessions_are_closed():
+    dealer, public_info = split('Lin-Yeh', access_structures)
+    service = combinerservice.CombinerService(public_info, session_ttl=60)
+
+    async def run(request):
+        return await service.handle_request(request)
+
+    asyncio.run(run(submit_request(dealer, 'a', 1)))
+    asyncio.run(run(submit_request(dealer, 'b', 1)))
+    service.sessions['a'].last_used -= 120
+    assert_equal(asyncio.run(run({'op': 'status', 'session': 'b'}))['users'],
+                 [1])
+    assert_equal(list(service.sessions), ['b'])
+    with assert_raises(ValueError):
+        asyncio.run(run({'op': 'status', 'session': 'a'}))
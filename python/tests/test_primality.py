@@ -1,8 +1,11 @@
 from nose.tools import assert_equal
-from multisecret.primality import is_probable_prime, is_prime
+from multisecret.primality import is_probable_prime, is_prime, SMALL_PRIMES
 
 # large prime
 p256 = 2**256 - 2**224 + 2**192 + 2**96 - 1
+# Mersenne primes
+m127 = 2**127 - 1
+m521 = 2**521 - 1
 
 def test_is_probable_prime():
     assert_equal(is_probable_prime(2), True)
@@ -10,11 +13,39 @@ def test_is_probable_prime():
     assert_equal(is_probable_prime(39), False)
     assert_equal(is_probable_prime(41), True)
     assert_equal(is_probable_prime(p256), True)
-    
+
+def test_is_probable_prime_matches_slow_check():
+    # crosses the limit of trial division (1000^2)
+    for n in range(2, 20000):
+        assert_equal(is_probable_prime(n), is_prime(n), n)
+    for n in range(10**6 - 1000, 10**6 + 1000):
+        assert_equal(is_probable_prime(n), is_prime(n), n)
+
+def test_strong_pseudoprimes():
+    # strong pseudoprimes to bases 2, 3, 5, 7 and to bases up to 37
+    assert_equal(is_probable_prime(3215031751), False)
+    assert_equal(is_probable_prime(318665857834031151167461), False)
+    # composite of two Carmichael numbers, found by trial division
+    assert_equal(is_probable_prime(561 * 1105), False)
+    # Carmichael number without small factors, a Fermat pseudoprime
+    # to all coprime bases, Miller-Rabin still finds a witness
+    assert_equal(is_probable_prime(1171 * 2341 * 3511), False)
+
+def test_baillie_psw():
+    assert_equal(is_probable_prime(m521, baillie_psw=True), True)
+    assert_equal(is_probable_prime(p256, baillie_psw=True), True)
+    assert_equal(is_probable_prime(m127 * m127, baillie_psw=True), False)
+    assert_equal(is_probable_prime(m127 * (2**89 - 1), baillie_psw=True), False)
+    assert_equal(is_probable_prime(m521 + 2, baillie_psw=True), False)
+
+def test_small_primes():
+    assert_equal(len(SMALL_PRIMES), 168)
+    assert_equal(SMALL_PRIMES[:5], (2, 3, 5, 7, 11))
+
 def test_is_prime():
     assert_equal(is_prime(2), True)
     assert_equal(is_prime(3), True)
     assert_equal(is_prime(39), False)
     assert_equal(is_prime(41), True)
+    assert_equal(is_prime(121), False)
     # don't test large primes with this slow (but accurate) method
-    
\ No newline at end of file
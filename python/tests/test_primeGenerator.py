@@ -0,0 +1,61 @@
+from nose.tools import assert_equal
+from nose.tools import assert_raises
+from nose.tools import assert_true
+
+from multisecret.primality import is_prime, is_probable_prime
+import multisecret.primeGenerator as primegenerator
+from multisecret.MultiSecretRoyAdhikari import Dealer
+
+
+def test_next_prime():
+    assert_equal(primegenerator.next_prime(0), 2)
+    assert_equal(primegenerator.next_prime(3), 3)
+    assert_equal(primegenerator.next_prime(4), 5)
+    assert_equal(primegenerator.next_prime(1000), 1009)
+    assert_equal(primegenerator.next_prime(2 ** 64), 2 ** 64 + 13)
+    assert_equal(primegenerator.next_prime(2 ** 128), 2 ** 128 + 51)
+
+    for n in range(2, 3000):
+        p = primegenerator.next_prime(n)
+        assert_true(is_prime(p))
+        assert_true(not any(is_prime(k) for k in range(n, p)))
+
+
+def test_random_prime():
+    for bits in (2, 8, 12, 64, 256):
+        p = primegenerator.random_prime(bits)
+        assert_equal(p.bit_length(), bits)
+        assert_true(is_probable_prime(p))
+
+    with assert_raises(ValueError):
+        primegenerator.random_prime(1)
+
+
+def test_random_prime_parallel():
+    p = primegenerator.random_prime(128, max_workers=2)
+    assert_equal(p.bit_length(), 128)
+    assert_true(is_probable_prime(p))
+
+
+def test_field_prime():
+    secrets = [15002900, 313, 501]
+    # security floor by default
+    p = primegenerator.field_prime(secrets, 3)
+    assert_equal(p, primegenerator.next_prime(2 ** 128 + 1))
+
+    # without the floor: 3^2 / 2p <= 2^-40
+    small_p = primegenerator.field_prime(secrets, 3, minimum=0)
+    assert_true(small_p > 9 * 2 ** 39)
+    assert_equal(small_p, primegenerator.next_prime(9 * 2 ** 39 + 1))
+
+    # large secret decides
+    assert_equal(primegenerator.field_prime([2 ** 200], 3),
+                 primegenerator.next_prime(2 ** 200 + 1))
+    assert_equal(primegenerator.field_prime([2 ** 80], 3, minimum=0),
+                 primegenerator.next_prime(2 ** 80 + 1))
+
+    # split and combine in the chosen field
+    dealer = Dealer(p, 3, secrets, [[[1, 2, 3]], [[1, 2]], [[2, 3]]])
+    pseudo_shares = dealer.split_secrets()
+    for i, secret in enumerate(secrets):
+        assert_equal(dealer.combine_secret(i, 0, pseudo_shares[i][0]), secret)
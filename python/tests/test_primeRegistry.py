@@ -0,0 +1,41 @@
+from nose.tools import assert_equal
+from nose.tools import assert_raises
+
+import multisecret.primeRegistry as primeregistry
+from multisecret.primality import is_probable_prime
+
+
+def test_known_primes_are_prime():
+    for name, p in primeregistry.KNOWN_PRIMES.items():
+        assert_equal(is_probable_prime(p), True, name)
+
+
+def test_known_prime_sizes():
+    assert_equal(primeregistry.P256.bit_length(), 256)
+    assert_equal(primeregistry.P384.bit_length(), 384)
+    assert_equal(primeregistry.P521.bit_length(), 521)
+    assert_equal(primeregistry.P64_PLUS.bit_length(), 65)
+    assert_equal(primeregistry.P128_PLUS.bit_length(), 129)
+
+
+def test_is_verified_prime_cached():
+    primeregistry.verification_cache_clear()
+
+    # catalog primes are not tested at all
+    assert_equal(primeregistry.is_verified_prime(primeregistry.P256), True)
+    assert_equal(primeregistry.verification_cache_info().currsize, 0)
+
+    assert_equal(primeregistry.is_verified_prime(15487469), True)
+    assert_equal(primeregistry.is_verified_prime(15487469), True)
+    assert_equal(primeregistry.is_verified_prime(24), False)
+    info = primeregistry.verification_cache_info()
+    assert_equal(info.misses, 2)
+    assert_equal(info.hits, 1)
+
+
+def test_smallest_known_prime():
+    assert_equal(primeregistry.smallest_known_prime(8), primeregistry.M61)
+    assert_equal(primeregistry.smallest_known_prime(65), primeregistry.P64_PLUS)
+    assert_equal(primeregistry.smallest_known_prime(200), primeregistry.P224)
+    with assert_raises(ValueError):
+        primeregistry.smallest_known_prime(1024)
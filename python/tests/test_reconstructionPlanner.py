@@ -0,0 +1,150 @@
+# Tests for reconstruction from participants who are present
+# Filip Kubicz 2017
+
+import io
+
+from nose.tools import assert_equal
+from nose.tools import assert_raises
+
+import multisecret.reconstructionPlanner as planner
+import multisecret.shareFile as sharefile
+from multisecret.accessPlan import ThresholdGroup
+
+p256 = 2 ** 256 - 2 ** 224 + 2 ** 192 + 2 ** 96 - 1
+secrets = [7, 313, 671]
+n_participants = 4
+access_structures = [[[1, 2, 3], [1, 3]], [[1, 2, 4], [2, 3]], [[1, 2, 3, 4]]]
+
+
+def test_qualified_groups():
+    assert_equal(planner.qualified_groups(access_structures, 0, [1, 2, 3]),
+                 [0, 1])
+    assert_equal(planner.qualified_groups(access_structures, 1, [1, 3]), [])
+
+
+def test_plan_picks_smallest_group():
+    plan = planner.plan_reconstruction(access_structures, [1, 2, 3])
+    # secret 2 needs user 4
+    assert_equal(plan, {0: 1, 1: 1})
+    assert_equal(planner.participants_needed(access_structures, plan),
+                 [1, 2, 3])
+
+    plan = planner.plan_reconstruction(access_structures, [1, 2, 4],
+                                       secrets=[1])
+    assert_equal(plan, {1: 0})
+
+
+def user_data_from_files(dealer, algorithm, users):
+    """ public info and user files as written by the GUI, read back """
+    public_file = io.BytesIO()
+    sharefile.write_public_info(public_file, dealer.p, algorithm,
+                                dealer.access_structures,
+                                dealer.public_shares_M)
+    public_file.seek(0)
+    user_data = {}
+    for user in users:
+        user_file = io.BytesIO()
+        sharefile.write_user_shares(
+            user_file, dealer.p, algorithm, user, dealer.random_id[user - 1],
+            dealer.get_pseudo_shares_for_participant(user))
+        user_file.seek(0)
+        user_data[user] = sharefile.read_user_shares(user_file)
+    return sharefile.read_public_info(public_file), user_data
+
+
+def test_combine_present():
+    for algorithm in ['Roy-Adhikari', 'Lin-Yeh']:
+        dealer = planner.DEALER_CLASSES[algorithm](
+            p256, n_participants, secrets, access_structures)
+        dealer.split_secrets()
+        # user 1 is missing
+        public_info, user_data = user_data_from_files(dealer, algorithm,
+                                                      [2, 3, 4])
+        combiner = planner.create_combiner(public_info)
+
+        assert_equal(planner.combine_present(combiner, user_data),
+                     {1: secrets[1]})
+        # only members of the chosen group are used
+        assert_equal(combiner.random_id, [None, dealer.random_id[1],
+                                          dealer.random_id[2], None])
+
+
+def test_combine_present_herranz_ruiz_saez():
+    algorithm = 'Herranz-Ruiz-Saez'
+    structures = [[[1, 3]], [[2, 4]], [[1, 2, 3]]]
+    dealer = planner.DEALER_CLASSES[algorithm](
+        p256, n_participants, secrets, structures)
+    dealer.split_secrets()
+    public_info, user_data = user_data_from_files(dealer, algorithm, [1, 3])
+    combiner = planner.create_combiner(public_info)
+
+    assert_equal(planner.combine_present(combiner, user_data),
+                 {0: secrets[0]})
+
+    with assert_raises(ValueError):
+        planner.combine_planned(combiner, 1, 0, user_data)
+
+
+def test_obtained_shares_combine_all():
+    algorithm = 'Roy-Adhikari'
+    dealer = planner.DEALER_CLASSES[algorithm](
+        p256, n_participants, secrets, access_structures)
+    dealer.split_secrets()
+    public_info, user_data = user_data_from_files(dealer, algorithm,
+                                                  [1, 2, 3])
+    combiner = planner.create_combiner(public_info)
+
+    obtained = planner.obtained_shares(combiner, user_data)
+    assert_equal(obtained[2][0][3], None)
+    assert_equal(combiner.combine_all_secrets(obtained),
+                 {0: secrets[0], 1: secrets[1]})
+
+
+def test_threshold_group():
+    algorithm = 'Roy-Adhikari'
+    structures = [[ThresholdGroup(range(1, 6), 3), [1, 2]]]
+    assert_equal(planner.plan_reconstruction(structures, [2, 4, 5]), {0: 0})
+    assert_equal(planner.plan_reconstruction(structures, [1, 2, 5]), {0: 1})
+    assert_equal(planner.plan_reconstruction(structures, [3, 4]), {})
+    assert_equal(planner.participants_needed(structures, {0: 0}, [1, 3, 4, 5]),
+                 [1, 3, 4])
+
+    dealer = planner.DEALER_CLASSES[algorithm](p256, 5, [7], structures)
+    dealer.split_secrets()
+    public_info, user_data = user_data_from_files(dealer, algorithm,
+                                                  [2, 3, 4, 5])
+    combiner = planner.create_combiner(public_info)
+    assert_equal(planner.combine_present(combiner, user_data), {0: 7})
+    # shares of the first 3 present members are used
+    assert_equal(combiner.random_id[4], None)
+
+    del user_data[3], user_data[4]
+    with assert_raises(ValueError):
+        planner.combine_planned(combiner, 0, 0, user_data)
+
+
+def test_combine_from_master_shares():
+    algorithm = 'Roy-Adhikari'
+    dealer = planner.DEALER_CLASSES[algorithm](
+        p256, n_participants, secrets, access_structures)
+    dealer.split_secrets()
+    public_file = io.BytesIO()
+    sharefile.write_public_info(public_file, dealer.p, algorithm,
+                                dealer.access_structures,
+                                dealer.public_shares_M, dealer.hash_aes_nonce)
+    public_file.seek(0)
+    user_data = {}
+    for user in [1, 2, 3]:
+        user_file = io.BytesIO()
+        sharefile.write_master_share(
+            user_file, dealer.p, algorithm, user, dealer.random_id[user - 1],
+            dealer.get_master_share_for_participant(user))
+        user_file.seek(0)
+        user_data[user] = sharefile.read_user_shares(user_file)
+
+    combiner = planner.create_combiner(sharefile.read_public_info(public_file))
+    assert_equal(planner.combine_present(combiner, user_data),
+                 {0: secrets[0], 1: secrets[1]})
+    obtained = planner.obtained_shares(combiner, user_data)
+    assert_equal(combiner.combine_all_secrets(obtained),
+                 {0: secrets[0], 1: secrets[1]})
@@ -0,0 +1,209 @@
+# Tests for binary share files
+# Filip Kubicz 2017
+
+import io
+import json
+from copy import deepcopy
+
+from nose.tools import assert_equal
+from nose.tools import assert_raises
+from nose.tools import assert_true
+
+import multisecret.shareFile as sharefile
+from multisecret.accessPlan import ThresholdGroup
+import multisecret.MultiSecretRoyAdhikari
+import multisecret.MultiSecretLinYeh
+import multisecret.MultiSecretHerranzRuizSaez
+
+p256 = 2 ** 256 - 2 ** 224 + 2 ** 192 + 2 ** 96 - 1
+secrets = [7, 313, 671]
+n_participants = 3
+access_structures = [[[1, 2, 3], [1, 3]], [[1, 2]], [[1, 2, 3]]]
+hrs_access_structures = [[[1, 3]], [[1, 2]], [[1, 2, 3]]]
+
+algorithms = {
+    'Roy-Adhikari': multisecret.MultiSecretRoyAdhikari.Dealer,
+    'Lin-Yeh': multisecret.MultiSecretLinYeh.Dealer,
+    'Herranz-Ruiz-Saez': multisecret.MultiSecretHerranzRuizSaez.Dealer,
+}
+
+
+def save(dealer, algorithm):
+    """ write public info and all user files to memory """
+    public_file = io.BytesIO()
+    sharefile.write_public_info(public_file, dealer.p, algorithm,
+                                dealer.access_structures,
+                                dealer.public_shares_M)
+    user_files = []
+    for user in range(1, dealer.n + 1):
+        user_file = io.BytesIO()
+        sharefile.write_user_shares(
+            user_file, dealer.p, algorithm, user, dealer.random_id[user - 1],
+            dealer.get_pseudo_shares_for_participant(user))
+        user_files.append(user_file.getvalue())
+    return public_file.getvalue(), user_files
+
+
+def combine_all_from_files(algorithm, public_bytes, user_files):
+    public_info = sharefile.read_public_info(io.BytesIO(public_bytes))
+    assert_equal(public_info['algorithm'], algorithm)
+
+    structures = public_info['access_structures']
+    combiner = algorithms[algorithm](public_info['prime'], n_participants,
+                                     [0] * len(structures), structures)
+    combiner.public_shares_M = public_info['public_shares_M']
+    combiner.random_id = [None] * combiner.n
+    combiner.pseudo_shares = combiner.new_share_store()
+    combiner.key_shares = combiner.new_share_store()
+
+    for user_bytes in user_files:
+        user_data = sharefile.read_user_shares(io.BytesIO(user_bytes))
+        user = user_data['user']
+        combiner.random_id[user - 1] = user_data['id']
+        combiner.set_pseudo_shares_from_participant(user, user_data['shares'])
+
+    if algorithm == 'Herranz-Ruiz-Saez':
+        return [combiner.combine_secret(i, 0, combiner.key_shares)
+                for i in range(len(structures))]
+    return [combiner.combine_secret(i, q, combiner.pseudo_shares[i][q])
+            for i, gamma in enumerate(structures)
+            for q, _ in enumerate(gamma)]
+
+
+def test_round_trip_all_algorithms():
+    for algorithm, dealer_class in algorithms.items():
+        if algorithm == 'Herranz-Ruiz-Saez':
+            structures = hrs_access_structures
+            expected = secrets
+        else:
+            structures = access_structures
+            expected = [secrets[i] for i, gamma in enumerate(structures)
+                        for _ in gamma]
+        dealer = dealer_class(p256, n_participants, secrets,
+                              deepcopy(structures))
+        dealer.split_secrets()
+
+        public_bytes, user_files = save(dealer, algorithm)
+        assert_equal(combine_all_from_files(algorithm, public_bytes,
+                                            user_files), expected)
+
+
+def test_public_info_round_trip():
+    dealer = multisecret.MultiSecretRoyAdhikari.Dealer(
+        p256, n_participants, secrets, deepcopy(access_structures))
+    dealer.split_secrets()
+    public_bytes, _ = save(dealer, 'Roy-Adhikari')
+
+    public_info = sharefile.read_public_info(io.BytesIO(public_bytes))
+    assert_equal(public_info['prime'], p256)
+    assert_equal(public_info['access_structures'], access_structures)
+    assert_equal(public_info['public_shares_M'], dealer.public_shares_M)
+
+
+def test_user_shares_round_trip():
+    shares = {(0, 0): b'\x00\x01', (2, 1): b'\xff\xfe'}
+    user_file = io.BytesIO()
+    sharefile.write_user_shares(user_file, 65537, 'Lin-Yeh', 2, b'\x03\x04',
+                                shares)
+    user_data = sharefile.read_user_shares(io.BytesIO(user_file.getvalue()))
+
+    assert_equal(user_data['user'], 2)
+    assert_equal(user_data['prime'], 65537)
+    # fixed width of 3 bytes for p = 2^16 + 1
+    assert_equal(user_data['id'], b'\x00\x03\x04')
+    assert_equal(user_data['shares'], {(0, 0): b'\x00\x00\x01',
+                                       (2, 1): b'\x00\xff\xfe'})
+
+
+def test_user_file_smaller_than_json():
+    dealer = multisecret.MultiSecretRoyAdhikari.Dealer(
+        p256, n_participants, secrets, deepcopy(access_structures))
+    dealer.split_secrets()
+    _, user_files = save(dealer, 'Roy-Adhikari')
+
+    # the same data as JSON
+    shares = dealer.get_pseudo_shares_for_participant(1)
+    json_string = json.dumps(
+        {'user': 1,
+         'id': dealer.random_id[0],
+         'shares': {str(key): share for key, share in shares.items()}})
+    assert_true(len(user_files[0]) < len(json_string))
+
+
+def test_wrong_file_errors():
+    dealer = multisecret.MultiSecretRoyAdhikari.Dealer(
+        p256, n_participants, secrets, deepcopy(access_structures))
+    dealer.split_secrets()
+    public_bytes, user_files = save(dealer, 'Roy-Adhikari')
+
+    with assert_raises(ValueError):
+        sharefile.read_public_info(io.BytesIO(b'JSON' + public_bytes[4:]))
+    with assert_raises(ValueError):
+        sharefile.read_public_info(io.BytesIO(public_bytes[:-1]))
+    # user file is not public info
+    with assert_raises(ValueError):
+        sharefile.read_public_info(io.BytesIO(user_files[0]))
+    # unknown algorithm byte
+    with assert_raises(ValueError):
+        sharefile.read_public_info(
+            io.BytesIO(public_bytes[:6] + bytes([3]) + public_bytes[7:]))
+    with assert_raises(ValueError):
+        sharefile.read_user_shares(
+            io.BytesIO(user_files[0][:6] + bytes([255]) + user_files[0][7:]))
+
+
+def test_threshold_groups():
+    structures = [[ThresholdGroup([1, 2, 3], 2)], [[1, 2]]]
+    dealer = multisecret.MultiSecretLinYeh.Dealer(p256, n_participants,
+                                                  secrets[:2], structures)
+    dealer.split_secrets()
+    public_bytes, user_files = save(dealer, 'Lin-Yeh')
+
+    public_info = sharefile.read_public_info(io.BytesIO(public_bytes))
+    assert_equal(public_info['access_structures'], structures)
+    assert_equal(public_info['access_structures'][0][0].threshold, 2)
+    assert_equal(public_info['access_structures'][1][0].__class__, list)
+
+
+def test_master_share_file():
+    dealer = multisecret.MultiSecretRoyAdhikari.Dealer(
+        p256, n_participants, secrets, deepcopy(access_structures))
+    dealer.split_secrets()
+    public_file = io.BytesIO()
+    sharefile.write_public_info(public_file, dealer.p, 'Roy-Adhikari',
+                                dealer.access_structures,
+                                dealer.public_shares_M, dealer.hash_aes_nonce)
+    public_info = sharefile.read_public_info(
+        io.BytesIO(public_file.getvalue()))
+    assert_equal(public_info['hash_nonce'], dealer.hash_aes_nonce)
+    assert_equal(public_info['public_shares_M'], dealer.public_shares_M)
+
+    user_file = io.BytesIO()
+    sharefile.write_master_share(user_file, dealer.p, 'Roy-Adhikari', 1,
+                                 dealer.random_id[0],
+                                 dealer.get_master_share_for_participant(1))
+    user_data = sharefile.read_user_shares(io.BytesIO(user_file.getvalue()))
+    assert_equal(user_data['master_share'],
+                 dealer.get_master_share_for_participant(1))
+    assert_equal(user_data['id'], dealer.random_id[0])
+    assert_equal(user_data['shares'], None)
+
+    # size does not depend on the number of shares of the user
+    _, user_files = save(dealer, 'Roy-Adhikari')
+    assert_true(len(user_file.getvalue()) < len(user_files[0]))
+    with assert_raises(ValueError):
+        sharefile.read_public_info(io.BytesIO(user_file.getvalue()))
+
+
+def test_master_share_small_field():
+    # 61-bit field, a master share alone would be easy to brute-force
+    p61 = 2 ** 61 - 1
+    dealer = multisecret.MultiSecretRoyAdhikari.Dealer(
+        p61, n_participants, secrets, deepcopy(access_structures))
+    dealer.split_secrets()
+    with assert_raises(ValueError):
+        dealer.get_master_share_for_participant(1)
+    with assert_raises(ValueError):
+        sharefile.write_master_share(io.BytesIO(), p61, 'Roy-Adhikari', 1,
+                                     dealer.random_id[0],
+                                     dealer.master_shares_x[0])
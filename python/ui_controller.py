@@ -1,9 +1,6 @@
 #! /usr/bin/env python3
 
 import sys
-import json
-import jsonpickle
-from copy import deepcopy
 import functools
 import time
 
@@ -14,10 +11,19 @@ import multisecret.MultiSecretRoyAdhikari
 import multisecret.MultiSecretLinYeh
 import multisecret.MultiSecretHerranzRuizSaez
 import multisecret.byteHelper as bytehelper
+import multisecret.reconstructionPlanner as planner
+import multisecret.shareFile as sharefile
+import multisecret.primeGenerator as primegenerator
 
 INITIAL_USER_COUNT = 3
 INITIAL_SECRET_COUNT = 3
 
+PUBLIC_INFO_FILE = 'public_info.mss'
+
+
+def user_share_file(user):
+    return 'user' + str(user) + '.mss'
+
 
 def clear_layout(layout):
     for i in reversed(range(layout.count())):
@@ -169,6 +175,10 @@ class MultiSecretController(MultiSecretGui):
         self.spinbox_secret.setRange(0, secrets - 1)
         self.spinbox_secret.valueChanged.connect(self.choose_secret_to_combine)
 
+        # Checkbox to reconstruct all secrets which loaded shares allow
+        self.checkbox_reconstr_all = QtWidgets.QCheckBox(parent_widget)
+        layout.addWidget(self.checkbox_reconstr_all, 0, 3, 1, 1)
+
         self.textBrowser_dyn = QtWidgets.QTextBrowser(
             parent_widget)
         self.gridLayout_dyn_reconstr.addWidget(self.textBrowser_dyn, 1, 1,
@@ -179,6 +189,7 @@ class MultiSecretController(MultiSecretGui):
             self.user_data_reconstr_buttons[user].setText(
                 'Load pseudo share from user ' + str(user + 1) + '...')
         self.button_reconstr_dyn.setText('Reconstruct secret')
+        self.checkbox_reconstr_all.setText('Reconstruct all at once')
         self.button_load_public_info_dyn.setText('Load public info')
 
     def choose_secret_to_combine(self):
@@ -213,7 +224,13 @@ class MultiSecretController(MultiSecretGui):
             self.showdialog()
             return
 
-        prime = 2 ** 256 - 2 ** 224 + 2 ** 192 + 2 ** 96 - 1
+        # the smallest secure field in which all secrets (and AES keys) fit
+        minimum = primegenerator.SECURITY_MINIMUM
+        if self.algorithm == 'Herranz-Ruiz-Saez':
+            key_len = multisecret.MultiSecretHerranzRuizSaez.Dealer.AES_KEY_LEN
+            minimum = max(minimum, 2 ** (8 * key_len))
+        prime = primegenerator.field_prime(secrets, users_count,
+                                           minimum=minimum)
 
         # Using list comprehension, with [[]]*secrets_count we would obtain copies of the same list
         access_structures = [[] for _ in range(secrets_count)]
@@ -256,7 +273,7 @@ class MultiSecretController(MultiSecretGui):
         print('Split secret using', self.algorithm)
 
     def load_public_info_dynamic(self):
-        # read public info from json
+        # read public info from file
         self.load_public_reconstruction_info()
         # Show information about secrets and privileged users
         access_structure = self.public_info['access_structures']
@@ -280,9 +297,11 @@ class MultiSecretController(MultiSecretGui):
                 'Secret {} can be obtained by {}.'.format(secret, str(group)))
 
     def combine_secret_dynamic(self):
-        # if checkbox "reconstruct all at once" is checked, run loop
         print('combine_secret_dynamic')
-        self.combine_secret()
+        if self.checkbox_reconstr_all.isChecked():
+            self.combine_all_secrets()
+        else:
+            self.combine_secret()
 
     def showdialog(self, text='Please specify all secrets.'):
         msg = QtWidgets.QMessageBox()
@@ -294,48 +313,54 @@ class MultiSecretController(MultiSecretGui):
         msg.exec_()
 
     def save_pseudo_shares_to_file(self, dealer):
-        """ Save python dictionary with data needed for secret reconstruction.
-            jsonpickle is used for encoding because data contains bytes objects,
-            not recognized by json encoder """
+        """ Save data needed for secret reconstruction to binary share files:
+            public information and a separate file for each user """
 
-        # Save public data to public_info.json
-        # TODO: add timestamps and FileChooser dialogs
-        public_info = {'prime': dealer.p,
-                       'access_structures': dealer.access_structures,
-                       'public_shares_M': dealer.public_shares_M,
-                       'algorithm': self.algorithm}
+        # Roy-Adhikari pseudo shares are derived from the master share
+        # with the hash nonce, so a user file holds just the master share
+        master_shares = self.algorithm == 'Roy-Adhikari'
 
-        public_info_json_string = jsonpickle.encode(public_info)
-        with open('public_info.json', 'w') as public_info_file:
-            json.dump(public_info_json_string, public_info_file)
+        # Save public data to public_info.mss
+        # TODO: add timestamps and FileChooser dialogs
+        with open(PUBLIC_INFO_FILE, 'wb') as public_info_file:
+            sharefile.write_public_info(public_info_file, dealer.p,
+                                        self.algorithm,
+                                        dealer.access_structures,
+                                        dealer.public_shares_M,
+                                        dealer.hash_aes_nonce
+                                        if master_shares else None)
+
+        if master_shares:
+            for user in range(1, dealer.n + 1):
+                with open(user_share_file(user), 'wb') as file:
+                    sharefile.write_master_share(
+                        file, dealer.p, self.algorithm, user,
+                        dealer.random_id[user - 1],
+                        dealer.get_master_share_for_participant(user))
+            return
 
-        # Save user shares (for each secret and group) and user ID to json file
+        # Save user shares (for each secret and group) and user ID to user file
         for user in range(1, dealer.n + 1):
             user_shares = dealer.get_pseudo_shares_for_participant(user)
-            user_data = {'user': user,
-                         'id': dealer.random_id[user - 1],
-                         'shares': user_shares}
-
-            user_json_string = jsonpickle.encode(user_data)
-            filename = 'user' + str(user) + '.json'
-            with open(filename, 'w') as file:
-                json.dump(user_json_string, file)
+            with open(user_share_file(user), 'wb') as file:
+                sharefile.write_user_shares(file, dealer.p, self.algorithm,
+                                            user, dealer.random_id[user - 1],
+                                            user_shares)
 
     def load_public_reconstruction_info(self):
         """ Load prime, access structures and public shares
             to controller's internal public_info dictionary.
         """
         try:
-            with open('public_info.json', 'r') as file:
-                json_string = json.load(file)
+            with open(PUBLIC_INFO_FILE, 'rb') as file:
+                self.public_info = sharefile.read_public_info(file)
         except FileNotFoundError as e:
             self.textBrowser.append(
-                'Cannot open file {}'.format('public_info.json'))
+                'Cannot open file {}'.format(PUBLIC_INFO_FILE))
             return
 
-        self.public_info = jsonpickle.decode(json_string)
         self.algorithm = self.public_info['algorithm']
-        print('loaded data from JSON', self.public_info)
+        print('loaded public info', self.public_info)
 
     def load_pseudo_shares_from_user(self, participant):
         """ Load user ID and user's pseudo shares for each secret.
@@ -343,107 +368,85 @@ class MultiSecretController(MultiSecretGui):
         self.textBrowser_dyn.append(
             'Load pseudo shares from user {}...'.format(participant))
 
-        userfile = 'user' + str(participant) + '.json'
+        userfile = user_share_file(participant)
         try:
-            with open(userfile, 'r') as file:
-                json_string = json.load(file)
+            with open(userfile, 'rb') as file:
+                self.user_data[participant - 1] = sharefile.read_user_shares(file)
         except FileNotFoundError as e:
             print('caught error %r' % e)
             self.textBrowser_dyn.append('Cannot open file {}'.format(userfile))
             return
 
-        self.user_data[participant - 1] = jsonpickle.decode(json_string)
-        print('loaded data from JSON', self.user_data[participant - 1])
+        print('loaded user data', self.user_data[participant - 1])
 
     def combine_secret(self):
-        """ Combine secret from JSON loaded information.
-            TODO: Validate all pieces needed to reconstruct.
+        """ Combine secret from shares of users whose files were loaded.
+            The smallest access group of loaded users is used,
+            shares of other users are not needed.
         """
-        try:
-            if self.algorithm == 'Roy-Adhikari':
-                combiner = multisecret.MultiSecretRoyAdhikari.Dealer(
-                    self.public_info['prime'],
-                    self.user_count,
-                    [0] * self.secret_count,
-                    self.public_info['access_structures'])
-            elif self.algorithm == 'Lin-Yeh':
-                combiner = multisecret.MultiSecretLinYeh.Dealer(
-                    self.public_info['prime'],
-                    self.user_count,
-                    [0] * self.secret_count,
-                    self.public_info['access_structures'])
-            elif self.algorithm == 'Herranz-Ruiz-Saez':
-                combiner = multisecret.MultiSecretHerranzRuizSaez.Dealer(
-                    self.public_info['prime'],
-                    self.user_count,
-                    [0] * self.secret_count,
-                    self.public_info['access_structures'])
-            else:
-                print('Wrong algorithm, cannot combine.')
-                return
+        combiner = self.create_combiner()
+        if combiner is None:
+            return
 
-            self.textBrowser_dyn.append('Combine secret using {} algorithm.'.format(self.algorithm))
-            combiner.public_shares_M = self.public_info['public_shares_M']
-        except AttributeError as e:
-            print('caught error %r' % e)
+        user_data = self.loaded_user_data()
+        q_group = planner.cheapest_group(combiner.access_structures,
+                                         self.secret_to_combine, user_data)
+        if q_group is None:
             self.textBrowser_dyn.append(
-                'There is not enough information to reconstruct!')
+                'Loaded shares do not satisfy any access group of secret {}. '
+                'Cannot reconstruct!'.format(self.secret_to_combine))
             return
+        print('Combine secret', self.secret_to_combine, 'using group',
+              combiner.access_structures[self.secret_to_combine][q_group])
 
-        combiner.random_id = [None] * combiner.n
+        secret = planner.combine_planned(combiner, self.secret_to_combine,
+                                         q_group, user_data)
+        self.show_combined_secret(self.secret_to_combine, secret)
 
-        # create a structure for pseudo shares
-        combiner.pseudo_shares = deepcopy(combiner.access_structures)
-        combiner.key_shares = deepcopy(combiner.access_structures)
-
-        #try:
-        for user in range(1, combiner.n + 1):
-            # ID from user
-            print('\nID from user', self.user_data[user - 1]['id'])
-            combiner.random_id[user - 1] = self.user_data[user - 1]['id']
-
-            # pseudo shares from user
-            print(self.user_data[user - 1])
-            user_shares = self.user_data[user - 1]['shares']
-            assert isinstance(user_shares, dict)
-            combiner.set_pseudo_shares_from_participant(user, user_shares)
-
-        #except TypeError as e:
-        #    print('caught error %r' % e)
-        #    self.textBrowser_dyn.append(
-        #        'You have not loaded all shares. Cannot reconstruct!')
-        #    return
-
-        if self.algorithm == 'Herranz-Ruiz-Saez':
-            print('In HRS algorithm, key shares:', combiner.key_shares)
-
-            print('HRS, combine secret', self.secret_to_combine)
-
-            obtained_shares = combiner.key_shares
-            del combiner.pseudo_shares
-        else:
-            obtained_shares = combiner.pseudo_shares
-
-        # in GUI it's only possible to create 1 access group for secret
-        access_group = 0
+    def combine_all_secrets(self):
+        """ Combine all secrets which shares of loaded users allow """
+        combiner = self.create_combiner()
+        if combiner is None:
+            return
 
-        if self.algorithm == 'Herranz-Ruiz-Saez':
-            secret = combiner.combine_secret(
-                self.secret_to_combine, access_group,
-                obtained_shares) # Herranz scheme don't use access groups
-        else:
-            secret = combiner.combine_secret(
-                self.secret_to_combine, access_group,
-                obtained_shares[self.secret_to_combine][access_group])
+        obtained_shares = planner.obtained_shares(combiner,
+                                                  self.loaded_user_data())
+        secrets = combiner.combine_all_secrets(obtained_shares)
+        if not secrets:
+            self.textBrowser_dyn.append(
+                'Loaded shares do not satisfy any access group. '
+                'Cannot reconstruct!')
+        for i_secret, secret in sorted(secrets.items()):
+            self.show_combined_secret(i_secret, secret)
 
+    def create_combiner(self):
+        """ Dealer for reconstruction from loaded public info, or None """
+        try:
+            combiner = planner.create_combiner(self.public_info)
+        except AttributeError as e:
+            print('caught error %r' % e)
+            self.textBrowser_dyn.append(
+                'There is not enough information to reconstruct!')
+            return None
+        except KeyError:
+            print('Wrong algorithm, cannot combine.')
+            return None
+        self.textBrowser_dyn.append('Combine secret using {} algorithm.'.format(self.algorithm))
+        return combiner
+
+    def loaded_user_data(self):
+        """ {user: data} of users who loaded their share files """
+        return {user: data for user, data in enumerate(self.user_data, 1)
+                if data is not None}
+
+    def show_combined_secret(self, i_secret, secret):
         # decode secret
         secret_bytes = secret.to_bytes(bytehelper.bytelen(secret),
                                        byteorder='big')
         secret_text = ''.join([chr(num) for num in secret_bytes])
 
         self.textBrowser_dyn.append('Combined a secret: s{} = {}'.format(
-            self.secret_to_combine, secret_text))
-
+            i_secret, secret_text))
 
 if __name__ == "__main__":
     app = QtWidgets.QApplication(sys.argv)